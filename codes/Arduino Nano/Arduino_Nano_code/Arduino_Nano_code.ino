@@ -61,6 +61,26 @@ struct toRPi
     uint8_t error;
 } t_data;
 
+// Frames on the RPi link: SOF, payload length, message type, payload, CRC-8 (poly 0x07)
+// over length, type and payload
+#define FRAME_SOF 0xA5
+#define FRAME_MAX_PAYLOAD 16
+#define MSG_COMMAND 0x01
+#define MSG_STATUS 0x81
+#define MSG_ADDRESS 0x82
+#define STATUS_PERIOD 1000
+
+uint8_t rxBuffer[FRAME_MAX_PAYLOAD + 4];
+uint8_t rxCount = 0;
+uint32_t statustimer;
+toRPi lastStatus;
+
+uint8_t crc8(const uint8_t *data, uint8_t len, uint8_t crc);
+void sendFrame(uint8_t type, const uint8_t *payload, uint8_t len);
+uint8_t receiveCommand();
+void sendStatus();
+void streamStatus();
+
 #define NO_ERROR 0x00
 #define FINGERPRINT_SENSOR_FALIED 0x01
 #define FINGERPRINT_VERIFY 0x02
@@ -156,12 +176,11 @@ void loop()
                 t_data.fingerprintVerified = verifyFingerprint();
 
             RPi.listen();
-            if (RPi.available() >= sizeof(fromRPi))
+            if (receiveCommand())
             {
 #ifdef DEBUG
                 Serial.println("\nReceived from rpi ");
 #endif
-                RPi.readBytes((byte *)&r_data, sizeof(fromRPi));
                 if (t_data.ignitionState != r_data.ignitionState)
                 {
 #ifdef DEBUG
@@ -171,7 +190,7 @@ void loop()
                     t_data.ignitionState = data;
                     digitalWrite(IGNITION, t_data.ignitionState);
                 }
-                RPi.write((byte *)&t_data, sizeof(toRPi));
+                sendStatus();
 #ifdef DEBUG
                 Serial.println("\nSent to rpi ");
 #endif
@@ -180,6 +199,8 @@ void loop()
         getFuelLevel();
         getalcoholState();
         statusLEDControl();
+        if (systemInitialized)
+            streamStatus();
     }
 
 #ifdef DEBUG_SERIAL
@@ -194,13 +215,12 @@ void loop()
 
 uint8_t initializeSystem()
 {
-    if (RPi.available() >= sizeof(fromRPi))
+    if (receiveCommand())
     {
 #ifdef DEBUG
         Serial.println("Received from rpi ");
 #endif
 
-        RPi.readBytes((byte *)&r_data, sizeof(fromRPi));
         systemInitialized = r_data.initializedSystem;
         validFingerprintID = r_data.validFingerprintID;
 
@@ -217,7 +237,7 @@ uint8_t initializeSystem()
         Serial.println(fingerprintSensorAddress, HEX);
 #endif
         RPi.listen();
-        RPi.write((byte *)&fingerprintSensorAddress, sizeof(fingerprintSensorAddress));
+        sendFrame(MSG_ADDRESS, (uint8_t *)&fingerprintSensorAddress, sizeof(fingerprintSensorAddress));
     }
 }
 
@@ -291,10 +311,9 @@ uint8_t verifyFingerprint()
         Serial.println("Finger detected, trying to capture...");
 #endif
         RPi.listen();
-        if (RPi.available() >= sizeof(fromRPi))
+        if (receiveCommand())
         {
-            RPi.readBytes((byte *)&r_data, sizeof(fromRPi));
-            RPi.write((byte *)&t_data, sizeof(toRPi));
+            sendStatus();
 #ifdef DEBUG
             Serial.println("Received from rpi ");
 #endif
@@ -372,4 +391,76 @@ void statusLEDControl()
         digitalWrite(STATUSLED, HIGH);
         LEDState = HIGH;
     }
-}
\ No newline at end of file
+}
+
+uint8_t crc8(const uint8_t *data, uint8_t len, uint8_t crc)
+{
+    while (len--)
+    {
+        crc ^= *data++;
+        for (uint8_t i = 0; i < 8; i++)
+            crc = crc & 0x80 ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+    return crc;
+}
+
+void sendFrame(uint8_t type, const uint8_t *payload, uint8_t len)
+{
+    uint8_t header[3] = {FRAME_SOF, len, type};
+    uint8_t crc = crc8(payload, len, crc8(header + 1, 2, 0));
+    RPi.write(header, sizeof(header));
+    RPi.write(payload, len);
+    RPi.write(crc);
+}
+
+// Collects bytes from the RPi link, returns true once a valid command frame was copied to r_data.
+// Bytes before a start byte and frames with a bad length or checksum are dropped.
+uint8_t receiveCommand()
+{
+    while (RPi.available())
+    {
+        uint8_t c = RPi.read();
+        if (rxCount == 0 && c != FRAME_SOF)
+            continue;
+        rxBuffer[rxCount++] = c;
+        if (rxCount == 2 && rxBuffer[1] > FRAME_MAX_PAYLOAD)
+        {
+            rxCount = 0;
+            continue;
+        }
+        if (rxCount > 2 && rxCount == rxBuffer[1] + 4)
+        {
+            uint8_t len = rxBuffer[1];
+            rxCount = 0;
+            if (crc8(rxBuffer + 1, len + 2, 0) != rxBuffer[len + 3])
+                continue;
+            if (rxBuffer[2] == MSG_COMMAND && len == sizeof(fromRPi))
+            {
+                memcpy(&r_data, rxBuffer + 3, sizeof(fromRPi));
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
+void sendStatus()
+{
+    sendFrame(MSG_STATUS, (uint8_t *)&t_data, sizeof(toRPi));
+    lastStatus = t_data;
+    statustimer = millis();
+}
+
+// Streams the status when anything but the raw alcohol reading changed, and every STATUS_PERIOD ms
+void streamStatus()
+{
+    if (t_data.alcoholDetected != lastStatus.alcoholDetected ||
+        t_data.ignitionState != lastStatus.ignitionState ||
+        t_data.validFingerprintFound != lastStatus.validFingerprintFound ||
+        t_data.fingerprintVerified != lastStatus.fingerprintVerified ||
+        t_data.fuelLevel != lastStatus.fuelLevel ||
+        t_data.keyState != lastStatus.keyState ||
+        t_data.error != lastStatus.error ||
+        millis() - statustimer > STATUS_PERIOD)
+        sendStatus();
+}
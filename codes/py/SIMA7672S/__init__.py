@@ -1,19 +1,31 @@
 import serial
+import threading
 import time
+from .fix import GnssFix, FixHistory
 from .gnss import GNSS
 from .http import HTTP
+from .log import debugPrint
+from .metrics import Metrics, MetricsExporter
+from .reader import SerialReader
+from .aio import AsyncSIMA7672S
 
 class SIMA7672S:
-    def __init__(self, port="/dev/ttyS0", baudrate=115200):
+    def __init__(self, port="/dev/ttyS0", baudrate=115200, rtscts=False):
         """
         Initialize the SIMA7672S class and serial connection.
 
         :param port: Serial port for communication
         :param baudrate: Baudrate for serial communication
+        :param rtscts: Enable RTS/CTS hardware flow control (needs AT+IFC=2,2 on the modem)
         """
         self.port = port
         self.baudrate = baudrate
-        self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
+        self.rtscts = rtscts
+        self.ser = serial.Serial(self.port, self.baudrate, timeout=0.1, rtscts=rtscts)
+        self.lock = threading.RLock()
+        self.metrics = Metrics()
+        self.reader = SerialReader(self.ser, metrics=self.metrics)
+        self.reader.start()
         self.GNSS = GNSS(self)
         self.HTTP = HTTP(self)
 
@@ -21,38 +33,92 @@ class SIMA7672S:
         """
         Send an AT command and read the response.
 
+        Returns as soon as the expected response or, without one, the final
+        result code (OK/ERROR) arrives.
+
         :param command: AT command to send
         :param timeout: Timeout for waiting for response
         :param response: Expected response string
         :param debug: Enable debug output
         :return: Response from the modem
+        :raises ConnectionError: If the serial port failed
         """
-        self.ser.write(f"{command}\r".encode())
-        time.sleep(0.2)
-        return self.ReadSerial(timeout, response, debug)
+        with self.lock:
+            stale = self.reader.discard()
+            if debug and stale:
+                debugPrint(stale, end="")
+            data = f"{command}\r".encode()
+            start = time.perf_counter()
+            self.ser.write(data)
+            self.metrics.bytes_out += len(data)
+            temp = self.__read(timeout, response, response is None, debug)
+            self.__observe(command.split("=")[0].rstrip("?"), start, temp, response, response is None)
+            return temp
 
     def ReadSerial(self, timeout: int | float, response: str = None, debug=False):
         """
         Read data from the serial port.
 
+        Returns as soon as a line containing the expected response arrives,
+        without it all data received within the timeout is returned.
+
         :param timeout: Timeout for reading
         :param response: Expected response string
         :param debug: Enable debug output
         :return: Data read from the serial port
+        :raises ConnectionError: If the serial port failed
         """
-        temp = ""
-        start = time.time()
-        while time.time() - start < timeout:
-            if self.ser.in_waiting > 0:
-                c = self.ser.read(self.ser.in_waiting).decode()
-                if debug:
-                    print(c, end="")
-                temp += c
-            if response and response in temp:
-                temp += "\n"
-                break
+        with self.lock:
+            start = time.perf_counter()
+            temp = self.__read(timeout, response, False, debug)
+            if response:
+                self.__observe(f"read {response}", start, temp, response, False)
+            return temp
+
+    def __observe(self, name: str, start: float, temp: str, response: str, final: bool):
+        lines = [line.strip() for line in temp.splitlines()]
+        error = any(line.startswith(("ERROR", "+CME ERROR", "+CMS ERROR")) for line in lines)
+        if response:
+            timeout = not error and response not in temp
+        else:
+            timeout = final and not error and not any(line.startswith(("OK", "NO CARRIER")) for line in lines)
+        self.metrics.observe(name, time.perf_counter() - start, timeout, error, start)
+
+    def __read(self, timeout: int | float, response: str, final: bool, debug: bool):
+        temp = self.reader.read(timeout, response, final)
+        if debug:
+            debugPrint(temp, end="")
+        if response and response in temp:
+            temp += "\n"
         return temp
-    
+
+    def Subscribe(self, prefix: str, callback, consume: bool = False):
+        """
+        Route unsolicited result codes to a callback.
+
+        :param prefix: Line prefix to match, e.g. "+HTTPACTION:"
+        :param callback: Called with the line from the reader thread
+        :param consume: Keep matching lines out of SendAT/ReadSerial results
+        """
+        self.reader.subscribe(prefix, callback, consume)
+
+    def Unsubscribe(self, prefix: str, callback):
+        """
+        Remove a callback registered with Subscribe.
+
+        :param prefix: Line prefix the callback was registered for
+        :param callback: The registered callback
+        """
+        self.reader.unsubscribe(prefix, callback)
+
+    def Close(self):
+        """
+        Stop the reader thread and close the serial port.
+        """
+        self.reader.stop()
+        self.reader.join(1)
+        self.ser.close()
+
     def WakeUp(self, debug=False):
         self.SendAT("AT", 10, "OK", debug)
         self.SendAT("AT+CSCLK=0", 5, "OK", debug)
\ No newline at end of file
@@ -0,0 +1,403 @@
+import asyncio
+import os
+import time
+import serial
+from .fix import FixHistory, GnssFix
+from .gnss import GNSS
+from .http import HTTP
+from .log import debugPrint
+from .reader import LineFramer
+
+class AsyncSerialTransport:
+    """
+    Non-blocking serial port driven by the asyncio event loop.
+
+    Received bytes are framed into lines with the same LineFramer the
+    threaded driver uses, so response matching and URC routing behave the same.
+    """
+
+    def __init__(self, port: str, baudrate: int):
+        """
+        Initialize the transport. The port is opened by open().
+
+        :param port: Serial port for communication
+        :param baudrate: Baudrate for serial communication
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.ser = None
+        self.loop = None
+        self.buffer = bytearray()
+        self.framer = LineFramer()
+        self.changed = None
+
+    def open(self):
+        """
+        Open the serial port and start watching it for incoming data.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.ser = serial.Serial(self.port, self.baudrate, timeout=0)
+        self.loop.add_reader(self.ser.fileno(), self.__onReadable)
+
+    def close(self):
+        """
+        Stop watching the port and close it.
+        """
+        if self.ser:
+            self.loop.remove_reader(self.ser.fileno())
+            self.ser.close()
+            self.ser = None
+
+    def __onReadable(self):
+        try:
+            data = os.read(self.ser.fileno(), 4096)
+        except BlockingIOError:
+            return
+        keep = self.framer.frame(data)
+        if keep:
+            self.buffer += keep
+            self.changed.set()
+
+    async def write(self, data: bytes):
+        """
+        Write data without blocking the event loop.
+
+        :param data: Bytes to send
+        """
+        fd = self.ser.fileno()
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(fd, view)
+                view = view[written:]
+            except BlockingIOError:
+                writable = self.loop.create_future()
+                self.loop.add_writer(fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self.loop.remove_writer(fd)
+
+    def discard(self):
+        """
+        Drop everything received but not yet consumed.
+
+        :return: The discarded data
+        """
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data.decode(errors="replace")
+
+    async def read(self, timeout: int | float, response: str = None, final: bool = False):
+        """
+        Wait for data from the modem, see SerialReader.read.
+
+        :param timeout: Maximum time to wait in seconds
+        :param response: Expected response string
+        :param final: Stop at the final result code (OK/ERROR)
+        :return: Data up to and including the terminating line
+        """
+        deadline = time.monotonic() + timeout
+        pos = 0
+        while True:
+            end, pos = LineFramer.match(self.buffer, pos, response, final)
+            if end is not None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.buffer += self.framer.flush()
+                end = len(self.buffer)
+                break
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data.decode(errors="replace")
+
+class AsyncSIMA7672S:
+    def __init__(self, port="/dev/ttyS0", baudrate=115200):
+        """
+        Initialize the asyncio SIMA7672S driver. Use it as an async context
+        manager or call open() from a running event loop.
+
+        :param port: Serial port for communication
+        :param baudrate: Baudrate for serial communication
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.transport = AsyncSerialTransport(port, baudrate)
+        self.queue = None
+        self.worker = None
+        self.GNSS = AsyncGNSS(self)
+        self.HTTP = AsyncHTTP(self)
+
+    async def open(self):
+        """
+        Open the serial port and start the command queue.
+        """
+        self.transport.open()
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self.__runQueue())
+
+    async def close(self):
+        """
+        Stop the command queue and close the serial port.
+        """
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        self.transport.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def __runQueue(self):
+        while True:
+            job, future = await self.queue.get()
+            if future.cancelled():
+                continue
+            try:
+                result = await job()
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+
+    async def submit(self, job):
+        """
+        Run a coroutine function with exclusive access to the AT channel.
+
+        Jobs are executed one at a time in submission order. Inside a job use
+        the unqueued send()/read() helpers, calling send_at() would deadlock.
+
+        :param job: Coroutine function without arguments
+        :return: Whatever the job returns
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((job, future))
+        return await future
+
+    async def send_at(self, command: str, timeout: int | float, response: str = None, debug=False):
+        """
+        Send an AT command through the command queue and read the response.
+
+        :param command: AT command to send
+        :param timeout: Timeout for waiting for response
+        :param response: Expected response string
+        :param debug: Enable debug output
+        :return: Response from the modem
+        """
+        return await self.submit(lambda: self.send(command, timeout, response, debug))
+
+    async def send(self, command: str, timeout: int | float, response: str = None, debug=False):
+        """
+        Send an AT command without going through the queue, for use inside jobs.
+        """
+        stale = self.transport.discard()
+        if debug and stale:
+            debugPrint(stale, end="")
+        await self.transport.write(f"{command}\r".encode())
+        return await self.read(timeout, response, response is None, debug)
+
+    async def read(self, timeout: int | float, response: str = None, final: bool = False, debug=False):
+        """
+        Read from the modem without going through the queue, for use inside jobs.
+        """
+        temp = await self.transport.read(timeout, response, final)
+        if debug:
+            debugPrint(temp, end="")
+        return temp
+
+    def subscribe(self, prefix: str, callback, consume: bool = False):
+        """
+        Route unsolicited result codes to a callback run on the event loop.
+
+        :param prefix: Line prefix to match, e.g. "+HTTPACTION:"
+        :param callback: Called with the line
+        :param consume: Keep matching lines out of send_at results
+        """
+        self.transport.framer.subscribe(prefix, callback, consume)
+
+    def unsubscribe(self, prefix: str, callback):
+        """
+        Remove a callback registered with subscribe().
+        """
+        self.transport.framer.unsubscribe(prefix, callback)
+
+    def expect(self, prefix: str):
+        """
+        Create a future resolved with the next line starting with prefix.
+
+        Register it before sending the command that triggers the URC.
+
+        :param prefix: Line prefix to wait for
+        :return: asyncio.Future resolving to the line
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def resolve(line):
+            self.unsubscribe(prefix, resolve)
+            if not future.done():
+                future.set_result(line)
+
+        future.add_done_callback(lambda _: self.unsubscribe(prefix, resolve))
+        self.subscribe(prefix, resolve, consume=True)
+        return future
+
+    async def wake_up(self, debug=False):
+        await self.send_at("AT", 10, "OK", debug)
+        await self.send_at("AT+CSCLK=0", 5, "OK", debug)
+
+class AsyncGNSS:
+    StartMode = GNSS.StartMode
+
+    def __init__(self, outer: AsyncSIMA7672S, history_size: int = 1024):
+        """
+        Initialize the asyncio GNSS object.
+
+        :param outer: Reference to the AsyncSIMA7672S driver
+        :param history_size: Number of recent fixes kept in history
+        """
+        self.outer = outer
+        self.history = FixHistory(history_size)
+
+    async def initialize(self, mode = StartMode.COLD, debug: bool = False):
+        """
+        Initialize GNSS module.
+
+        :param mode: Start mode, one of StartMode
+        :param debug: Enable debug output
+        """
+        async def job():
+            await self.outer.send("AT+CGNSSPWR=1", 10, "READY!", debug)
+            await self.outer.send(mode, 10, "OK", debug)
+            await self.outer.send("AT+CGNSSPORTSWITCH=1,1", 1, debug=debug)
+        await self.outer.submit(job)
+
+    async def shutdown(self, debug: bool = False):
+        """
+        Shutdown GNSS module.
+
+        :param debug: Enable debug output
+        """
+        await self.outer.send_at("AT+CGNSSPWR=0", 2, debug=debug)
+
+    async def get_data(self, debug: bool = False):
+        """
+        Retrieve GNSS data.
+
+        :param debug: Enable debug output
+        :return: Dictionary containing GNSS data or None if data is incomplete
+        """
+        gnss_info = await self.outer.send_at("AT+CGNSSINFO", 3, "OK", debug=debug)
+        return GNSS.parseGNSSInfo(gnss_info)
+
+    async def get_fix(self, debug: bool = False):
+        """
+        Retrieve the current position as a GnssFix and add it to history.
+
+        :param debug: Enable debug output
+        :return: GnssFix or None if the receiver has no fix
+        """
+        fix = GnssFix.parse(await self.outer.send_at("AT+CGNSSINFO", 3, "OK", debug=debug))
+        if fix:
+            self.history.append(fix)
+        return fix
+
+    get_formatted_lat_lon = staticmethod(GNSS.getFormattedLatLon)
+
+class AsyncHTTP:
+    HTTPRequest = HTTP.HTTPRequest
+
+    def __init__(self, outer: AsyncSIMA7672S):
+        """
+        Initialize the asyncio HTTP object.
+
+        :param outer: Reference to the AsyncSIMA7672S driver
+        """
+        self.outer = outer
+        self.lock = asyncio.Lock()
+
+    async def request(self, URL: str, method: str = HTTPRequest.GET, data: str = None, timeout: int | float = 120, debug=False):
+        """
+        Send an HTTP request, read the response body and terminate the HTTP service.
+
+        The AT channel is only held while commands are exchanged, other
+        coroutines can use the modem while the request is in flight.
+
+        :param URL: The URL to send the request to
+        :param method: HTTP method to use (default is GET)
+        :param data: Data to send with the request (for POST/PUT)
+        :param timeout: Time to wait for +HTTPACTION in seconds
+        :param debug: Enable debug output
+        :return: Tuple of ([method, status code, data length], body) or (None, None) if the request failed
+        """
+        async with self.lock:
+            async def start():
+                if "ERROR" in await self.outer.send("AT+HTTPINIT", 1, debug=debug):
+                    print("Error initializing HTTP server")
+                    return None
+                await self.outer.send(f'AT+HTTPPARA="URL","{URL}"', 1, debug=debug)
+                if data:
+                    body = data.encode()
+                    await self.outer.send(f"AT+HTTPDATA={len(body)},5000", 5, "DOWNLOAD", debug)
+                    await self.outer.transport.write(body)
+                    await self.outer.read(5, "OK", debug=debug)
+                action = self.outer.expect("+HTTPACTION:")
+                if "ERROR" in await self.outer.send("AT+HTTPACTION=" + method, 1, "OK", debug):
+                    print("HTTPACTION Error")
+                    action.cancel()
+                    return None
+                return action
+
+            try:
+                action = await self.outer.submit(start)
+                if action is None:
+                    return None, None
+                try:
+                    line = await asyncio.wait_for(action, timeout)
+                except asyncio.TimeoutError:
+                    print("Error Sending Request to the server")
+                    return None, None
+                if debug:
+                    debugPrint(line)
+                HTTPResponse = HTTP.parseHTTPAction(line)
+                body = None
+                if HTTPResponse[2]:
+                    body = await self.read_response(HTTPResponse[2], debug=debug)
+                return HTTPResponse, body
+            finally:
+                await self.terminate(debug)
+
+    async def read_response(self, length: int, waittime: int = 1, debug: bool = False):
+        """
+        Reads the HTTP body/content from the server response.
+
+        :param length: Number of bytes to read.
+        :param waittime: Time to wait for the response in seconds. Default is 1.
+        :param debug: Enables debug mode if True. Default is False.
+        :return: The HTTP body from the response.
+        """
+        return await self.outer.send_at(f"AT+HTTPREAD=0,{length}", waittime, "+HTTPREAD: 0", debug=debug)
+
+    async def terminate(self, debug = False):
+        """
+        Terminate the HTTP connection.
+
+        :param debug: Enable debug output
+        """
+        await self.outer.send_at("AT+HTTPTERM", 1, debug=debug)
@@ -0,0 +1,169 @@
+import calendar
+import math
+from array import array
+
+KNOTS_TO_KMH = 1.852
+
+class GnssFix:
+    """
+    One parsed GNSS fix.
+
+    Coordinates are signed decimal degrees, speed is in km/h, course in
+    degrees and timestamp in seconds since the epoch (UTC).
+    """
+
+    __slots__ = ("mode", "gpsSVs", "glonassSVs", "beidouSVs", "galileoSVs",
+                 "latitude", "longitude", "timestamp", "altitude", "speed",
+                 "course", "pdop", "hdop", "vdop")
+
+    def __init__(self, mode: int = 0, gpsSVs: int = 0, glonassSVs: int = 0, beidouSVs: int = 0, galileoSVs: int = 0,
+                 latitude: float = 0.0, longitude: float = 0.0, timestamp: float = 0.0, altitude: float = 0.0,
+                 speed: float = 0.0, course: float = 0.0, pdop: float = 0.0, hdop: float = 0.0, vdop: float = 0.0):
+        self.mode = mode
+        self.gpsSVs = gpsSVs
+        self.glonassSVs = glonassSVs
+        self.beidouSVs = beidouSVs
+        self.galileoSVs = galileoSVs
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timestamp = timestamp
+        self.altitude = altitude
+        self.speed = speed
+        self.course = course
+        self.pdop = pdop
+        self.hdop = hdop
+        self.vdop = vdop
+
+    def __repr__(self):
+        return (f"GnssFix(latitude={self.latitude}, longitude={self.longitude}, speed={self.speed}, "
+                f"course={self.course}, timestamp={self.timestamp})")
+
+    @classmethod
+    def parse(cls, gnss_info: str):
+        """
+        Parse the +CGNSSINFO line of an AT+CGNSSINFO response in a single pass.
+
+        :param gnss_info: Raw response text from the modem
+        :return: GnssFix or None if the receiver has no fix
+        """
+        start = gnss_info.find("+CGNSSINFO:")
+        if start < 0:
+            return None
+        start += 11
+        end = gnss_info.find("\n", start)
+        fields = gnss_info[start:end if end >= 0 else len(gnss_info)].strip().split(",")
+        if len(fields) < 17 or not fields[5] or not fields[7]:
+            return None
+        try:
+            latitude = float(fields[5])
+            longitude = float(fields[7])
+            if fields[6] == "S":
+                latitude = -latitude
+            if fields[8] == "W":
+                longitude = -longitude
+            return cls(_int(fields[0]), _int(fields[1]), _int(fields[2]), _int(fields[3]), _int(fields[4]),
+                       latitude, longitude, parseDateTime(fields[9], fields[10]), _float(fields[11]),
+                       _float(fields[12]) * KNOTS_TO_KMH, _float(fields[13]),
+                       _float(fields[14]), _float(fields[15]), _float(fields[16]))
+        except ValueError:
+            return None
+
+def _int(field: str):
+    return int(field) if field else 0
+
+def _float(field: str):
+    return float(field) if field else 0.0
+
+def parseDateTime(date: str, utc: str):
+    """
+    Convert the ddmmyy date and hhmmss.s time fields to seconds since the epoch.
+
+    :return: Timestamp or 0.0 if the fields are empty
+    """
+    if len(date) < 6 or len(utc) < 6:
+        return 0.0
+    seconds = calendar.timegm((2000 + int(date[4:6]), int(date[2:4]), int(date[0:2]),
+                               int(utc[0:2]), int(utc[2:4]), 0))
+    return seconds + float(utc[4:])
+
+class FixHistory:
+    """
+    Preallocated ring buffer of recent fixes stored as contiguous columns.
+
+    Each field of GnssFix listed in COLUMNS lives in its own array of
+    doubles, so batching, compression and analytics can work on whole
+    columns without walking a list of objects.
+    """
+
+    COLUMNS = ("timestamp", "latitude", "longitude", "altitude", "speed", "course", "hdop")
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initialize the ring buffer.
+
+        :param capacity: Number of fixes kept, older ones are overwritten
+        """
+        self.capacity = capacity
+        self.columns = {name: array("d", bytes(8 * capacity)) for name in self.COLUMNS}
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, fix: GnssFix):
+        """
+        Store a fix, overwriting the oldest one when the buffer is full.
+
+        :param fix: Fix to store
+        """
+        for name, column in self.columns.items():
+            column[self.head] = getattr(fix, name)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        """
+        :return: The most recent fix or None if the buffer is empty
+        """
+        if not self.count:
+            return None
+        index = (self.head - 1) % self.capacity
+        return GnssFix(**{name: column[index] for name, column in self.columns.items()})
+
+    def column(self, name: str):
+        """
+        Get one field of all stored fixes, oldest first.
+
+        :param name: One of COLUMNS
+        :return: array of doubles
+        """
+        column = self.columns[name]
+        if self.count < self.capacity:
+            return column[:self.count]
+        return column[self.head:] + column[:self.head]
+
+    def toNumpy(self):
+        """
+        Copy the stored fixes into a NumPy structured array, oldest first.
+
+        Requires NumPy, which is otherwise not needed on the device.
+
+        :return: numpy.ndarray with one float64 field per column
+        """
+        import numpy as np
+        out = np.empty(self.count, dtype=[(name, "f8") for name in self.COLUMNS])
+        for name in self.COLUMNS:
+            out[name] = np.frombuffer(self.column(name), dtype="f8")
+        return out
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float):
+    """
+    Great-circle distance between two points in metres.
+    """
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 12742000 * math.asin(math.sqrt(min(1.0, a)))
@@ -1,41 +1,130 @@
+import threading
 import time
+from .fix import GnssFix, FixHistory
+from .metrics import timed
+from .nmea import NMEAParser, NMEAReader
 
 class GNSS:
-    def __init__(self, outer):
+    # Streamed fixes older than this many seconds count as no fix
+    STREAM_MAX_AGE = 3
+    # Last fix ages up to which the ephemeris (HOT) and the almanac (WARM) are still usable
+    HOT_AGE = 2 * 3600
+    WARM_AGE = 7 * 86400
+
+    def __init__(self, outer, history_size: int = 1024):
         """
         Initialize GNSS object.
 
         :param outer: Reference to outer class (likely modem controller)
+        :param history_size: Number of recent fixes kept in history
         """
         self.outer = outer
+        self.history = FixHistory(history_size)
+        self.parser = None
+        self.nmeaReader = None
+        # Optional callback, called with every new fix (from the reader thread while streaming)
+        self.onFix = None
 
     class StartMode:
         COLD = "AT+CGPSCOLD"
         WARM = "AT+CGPSWARM"
         HOT = "AT+CGPSHOT"
 
+    @classmethod
+    def chooseStartMode(cls, age: float = None):
+        """
+        Choose the start mode from the age of the last fix.
+
+        :param age: Seconds since the last fix, None if unknown
+        :return: StartMode command
+        """
+        if age is None or age < 0 or age >= cls.WARM_AGE:
+            return cls.StartMode.COLD
+        return cls.StartMode.HOT if age < cls.HOT_AGE else cls.StartMode.WARM
+
+    @timed("gnss.initialize", check_result=False)
     def Initialize(self, mode = StartMode.COLD, debug: bool = False):
         """
         Initialize GNSS module.
 
+        The AT port isn't held while the receiver powers up, other threads
+        can use the modem until +CGNSSPWR: READY! arrives.
+
+        :param mode: Start mode, see chooseStartMode()
         :param debug: Enable debug output
+        :return: True if the receiver reported ready
         """
-        self.outer.SendAT("AT+CGNSSPWR=1", 10, "READY!", debug)
+        ready = threading.Event()
+
+        def onPower(line: str):
+            if "READY!" in line:
+                ready.set()
+
+        self.outer.Subscribe("+CGNSSPWR:", onPower, consume=True)
+        try:
+            self.outer.SendAT("AT+CGNSSPWR=1", 2, debug=debug)
+            ready.wait(10)
+        finally:
+            self.outer.Unsubscribe("+CGNSSPWR:", onPower)
         time.sleep(0.2)
         self.outer.SendAT(mode, 10, "OK", debug)
         time.sleep(0.2)
         self.outer.SendAT("AT+CGNSSPORTSWITCH=1,1", 1, debug=debug)
         time.sleep(0.2)
+        return ready.is_set()
 
+    @timed("gnss.shutdown", check_result=False)
     def Shutdown(self, debug: bool = False):
         """
         Shutdown GNSS module.
 
         :param debug: Enable debug output
         """
+        self.StopStreaming(debug)
         self.outer.SendAT("AT+CGNSSPWR=0", 2, debug=debug)
         time.sleep(3)
 
+    def StartStreaming(self, port: str = None, baudrate: int = 115200, debug: bool = False):
+        """
+        Parse the NMEA output of the receiver continuously instead of polling AT+CGNSSINFO.
+
+        Every fix is added to history at the receiver's output rate and
+        getFix() returns the latest one without a round trip to the modem.
+        With a port the NMEA port of the module is read on its own thread,
+        without one the sentences are routed to the AT port (AT+CGNSSTST=1)
+        and taken out of the AT responses by the reader thread.
+
+        :param port: NMEA serial port, None to use the AT port
+        :param baudrate: Baudrate of the NMEA port
+        :param debug: Enable debug output
+        """
+        if self.parser:
+            return
+        self.parser = NMEAParser(self.__addFix)
+        if port:
+            self.nmeaReader = NMEAReader(port, self.parser, baudrate)
+            self.nmeaReader.start()
+        else:
+            self.outer.Subscribe("$", self.parser.parseSentence, consume=True)
+            self.outer.SendAT("AT+CGNSSTST=1", 1, "OK", debug)
+
+    def StopStreaming(self, debug: bool = False):
+        """
+        Stop parsing NMEA output, getFix() polls AT+CGNSSINFO again.
+
+        :param debug: Enable debug output
+        """
+        if not self.parser:
+            return
+        if self.nmeaReader:
+            self.nmeaReader.stop()
+            self.nmeaReader = None
+        else:
+            self.outer.SendAT("AT+CGNSSTST=0", 1, "OK", debug)
+            self.outer.Unsubscribe("$", self.parser.parseSentence)
+        self.parser = None
+
+    @timed("gnss.data")
     def getGNSSData(self, debug: bool = False):
         """
         Retrieve GNSS data.
@@ -44,6 +133,42 @@ class GNSS:
         :return: Dictionary containing GNSS data or None if data is incomplete
         """
         gnss_info = self.outer.SendAT("AT+CGNSSINFO", 3, "OK", debug=debug)
+        return self.parseGNSSInfo(gnss_info)
+
+    @timed("gnss.fix")
+    def getFix(self, debug: bool = False):
+        """
+        Retrieve the current position as a GnssFix and add it to history.
+
+        While streaming, the latest streamed fix is returned instead, it is
+        already in history.
+
+        :param debug: Enable debug output
+        :return: GnssFix or None if the receiver has no fix
+        """
+        parser = self.parser
+        if parser:
+            if parser.fix and time.monotonic() - parser.fixTime <= self.STREAM_MAX_AGE:
+                return parser.fix
+            return None
+        fix = GnssFix.parse(self.outer.SendAT("AT+CGNSSINFO", 3, "OK", debug=debug))
+        if fix:
+            self.__addFix(fix)
+        return fix
+
+    def __addFix(self, fix: GnssFix):
+        self.history.append(fix)
+        if self.onFix:
+            self.onFix(fix)
+
+    @staticmethod
+    def parseGNSSInfo(gnss_info: str):
+        """
+        Parse the response of AT+CGNSSINFO.
+
+        :param gnss_info: Raw response text from the modem
+        :return: Dictionary containing GNSS data or None if data is incomplete
+        """
         info_list = gnss_info.split(",")
 
         if len(info_list) > 16:
@@ -70,13 +195,16 @@ class GNSS:
         else:
             return None
 
-    def getFormattedLatLon(self, gnss: dict):
+    @staticmethod
+    def getFormattedLatLon(gnss: dict | GnssFix):
         """
         Get formatted latitude and longitude from GNSS data.
 
-        :param gnss: Dictionary containing GNSS data
+        :param gnss: Dictionary containing GNSS data or a GnssFix
         :return: Tuple of (latitude, longitude) as float values
         """
+        if isinstance(gnss, GnssFix):
+            return gnss.latitude, gnss.longitude
         if gnss and gnss["Latitude"] != "" and gnss["Longitude"] != "":
             latitude = float(gnss["Latitude"])
             longitude = float(gnss["Longitude"])
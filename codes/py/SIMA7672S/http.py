@@ -1,7 +1,21 @@
+import io
 import time
 import re
+import threading
+from .link import CircuitBreaker, LinkMonitor
+from .log import debugPrint
+from .metrics import timed
+from .reader import BinaryBlock
 
 class HTTP:
+    UPLOAD_BLOCK_TIME = 0.05
+    # Bytes requested per AT+HTTPREAD
+    READ_CHUNK = 1024
+    # Failed requests in a row after which requests are refused, and the backoff before the next try
+    BREAKER_THRESHOLD = 3
+    BREAKER_DELAY = 5
+    BREAKER_MAX_DELAY = 300
+
     def __init__(self, outer):
         """
         Initialize HTTP object.
@@ -9,6 +23,12 @@ class HTTP:
         :param outer: Reference to outer class (likely modem controller)
         """
         self.outer = outer
+        self.session = None
+        # Held for a whole request, the AT port lock only for each command, so other
+        # commands (e.g. GNSS) get through while the modem waits for the server
+        self.lock = threading.RLock()
+        self.breaker = CircuitBreaker(self.BREAKER_THRESHOLD, self.BREAKER_DELAY, self.BREAKER_MAX_DELAY)
+        self.link = None
 
     class HTTPRequest:
         """
@@ -33,66 +53,145 @@ class HTTP:
         except Exception:
             return False
 
-    def __startHTTPRequest(self, method: str, debug=False):
+    def Available(self):
+        """
+        Check without touching the modem whether a request should be made now.
+
+        :return: False while the link monitor reports the link down or the breaker is open
+        """
+        if self.link and not self.link.up:
+            return False
+        return self.breaker.allow()
+
+    def Record(self, response):
+        """
+        Feed the result of a request to the breaker. Failures are requests
+        that got no +HTTPACTION and the modem's network errors (7xx).
+
+        :param response: Result of SendHTTPRequest or HTTPSession.SendRequest
+        """
+        if response and response[1] < 700:
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+            if not self.breaker.allow():
+                print(f"HTTP requests suspended for {self.breaker.retryIn():.0f} s")
+
+    def StartMonitor(self, interval: float = 30, min_signal: int = 5, debug: bool = False):
+        """
+        Check the PDP context and the signal in the background and recover
+        the PDP context when it drops, see LinkMonitor. Requests fail fast
+        while the link is down.
+
+        :param interval: Seconds between checks
+        :param min_signal: Lowest usable AT+CSQ RSSI (0-31)
+        :param debug: Enable debug output
+        """
+        if self.link:
+            return
+        self.link = LinkMonitor(self.outer, interval, min_signal, debug)
+        self.link.start()
+
+    def StopMonitor(self):
+        """
+        Stop the link monitor.
+        """
+        if not self.link:
+            return
+        self.link.stop()
+        self.link.join(5)
+        self.link = None
+
+    @timed("http.attach")
+    def Attach(self, timeout: int | float = 15, debug: bool = False):
+        """
+        Make sure the PDP context is active, activate it if it isn't.
+
+        :param timeout: Time to wait for the activation in seconds
+        :param debug: Enable debug output
+        :return: True if the PDP context is active
+        """
+        if self.InternetConnection(debug):
+            return True
+        self.outer.SendAT("AT+CGACT=1,1", timeout, debug=debug)
+        return self.InternetConnection(debug)
+
+    @timed("http.action")
+    def startHTTPRequest(self, method: str, debug=False):
         """
         Start an HTTP request.
 
         :param method: HTTP method to use
         :return: List of response parameters or None if failed
         """
-        temp = self.outer.SendAT("AT+HTTPACTION=" + method, 1, "OK", debug=debug)
-        if "ERROR" in temp:
-            print("HTTPACTION Error")
-            time.sleep(0.2)
-            return None
-        
-        temp = ""
-        for _ in range(121):
-            temp += self.outer.ReadSerial(1, debug=debug)
-            if "ACTION:" in temp and temp.endswith("\n"):
+        result = []
+        done = threading.Event()
+
+        def onAction(line: str):
+            result.append(line)
+            done.set()
+
+        # Subscribed before sending, the result code can't be missed or discarded by other commands
+        self.outer.Subscribe("+HTTPACTION:", onAction, consume=True)
+        try:
+            temp = self.outer.SendAT("AT+HTTPACTION=" + method, 1, "OK", debug=debug)
+            if "ERROR" in temp:
+                print("HTTPACTION Error")
                 time.sleep(0.2)
-                return list(map(int, re.findall(r"\d+", temp)))
+                return None
+            if not done.wait(121):
+                return None
+        finally:
+            self.outer.Unsubscribe("+HTTPACTION:", onAction)
+        if debug:
+            debugPrint(result[0])
+        return self.parseHTTPAction(result[0])
+
+    @staticmethod
+    def parseHTTPAction(temp: str):
+        """
+        Parse the +HTTPACTION: result code.
+
+        :param temp: Text containing the +HTTPACTION: line
+        :return: List of [method, status code, data length] or None if not found
+        """
+        for line in temp.splitlines():
+            if line.startswith("+HTTPACTION:"):
+                return list(map(int, re.findall(r"\d+", line)))
         return None
 
-    def SendHTTPRequest(self, URL: str, method: str = HTTPRequest.GET, data: str = None, chunk_size:int = 256, debug=False):
+    @timed("http.request")
+    def SendHTTPRequest(self, URL: str, method: str = HTTPRequest.GET, data: str = None, chunk_size:int = None, debug=False):
         """
         Send an HTTP request.
 
         :param URL: The URL to send the request to
         :param method: HTTP method to use (default is GET)
         :param data: Data to send with the request (for POST/PUT)
+        :param chunk_size: Bytes written at a time, derived from the baudrate if not set
         :param debug: Enable debug output
         :return: HTTP response code or False if request failed
         """
+        if self.session and self.session.active:
+            self.session.Close(debug)
+        if not self.Available():
+            return False
+
         try:
-            if "ERROR" in self.outer.SendAT("AT+HTTPINIT", 1, debug=debug):
-                print("Error initializing HTTP server")
-                time.sleep(0.2)
-                self.terminateHTTP(debug)
-                return False
+            with self.lock:
+                if "ERROR" in self.outer.SendAT("AT+HTTPINIT", 1, debug=debug):
+                    print("Error initializing HTTP server")
+                    self.terminateHTTP(debug)
+                    return False
 
-            time.sleep(0.2)
-            self.outer.SendAT(f'AT+HTTPPARA="URL","{URL}"', 1, debug=debug)
-            time.sleep(0.2)
+                self.outer.SendAT(f'AT+HTTPPARA="URL","{URL}"', 1, debug=debug)
 
-            if data:
-                time.sleep(0.2)
-                self.outer.SendAT(f"AT+HTTPDATA={len(data)},5000", 5, "DOWNLOAD", debug)
-                
-                if debug:
-                    print(data)
-                
-                time.sleep(0.2)
-                for i in range(0, len(data), chunk_size):
-                    chunk = data[i:i+chunk_size]
-                    if debug:
-                        print(f"\n\nSent chunk: {chunk} \n\n")
-                    self.outer.ser.write(chunk.encode())
-                    time.sleep(0.2)
-                self.outer.ReadSerial(5, "OK", debug)
-                time.sleep(3)
-
-            HTTPResponse = self.__startHTTPRequest(method, debug=debug)
+                if data and not self.uploadData(data, chunk_size, debug):
+                    self.terminateHTTP(debug)
+                    return False
+
+                HTTPResponse = self.startHTTPRequest(method, debug=debug)
+            self.Record(HTTPResponse)
             if not HTTPResponse:
                 print("Error Sending Request to the server")
                 #self.terminateHTTP(debug)
@@ -101,11 +200,66 @@ class HTTP:
             return HTTPResponse
         except Exception as e:
             print(f"Exception occurred: {str(e)}")
-            import traceback
-            traceback.print_exc()
             self.terminateHTTP(debug)
-            raise KeyboardInterrupt
-    
+            raise
+
+    @timed("http.upload")
+    def uploadData(self, data: str | bytes, chunk_size: int = None, debug=False):
+        """
+        Upload the request body with AT+HTTPDATA.
+
+        The body is written straight from a memoryview in blocks sized for
+        UPLOAD_BLOCK_TIME seconds of line time. With RTS/CTS flow control the
+        UART paces the transfer, otherwise every block is drained to the wire
+        before the next one. Completion is taken from the modem's OK instead
+        of fixed delays.
+
+        :param data: Data to send with the request
+        :param chunk_size: Bytes written at a time, derived from the baudrate if not set
+        :param debug: Enable debug output
+        :return: True if the modem accepted the body
+        """
+        body = data.encode() if isinstance(data, str) else data
+        view = memoryview(body)
+        byte_rate = self.outer.baudrate / 10
+        if chunk_size is None:
+            chunk_size = len(view) if self.outer.rtscts else max(64, int(byte_rate * self.UPLOAD_BLOCK_TIME))
+        input_time = 2 * len(view) / byte_rate + 5
+
+        with self.outer.lock:
+            temp = self.outer.SendAT(f"AT+HTTPDATA={len(view)},{int(input_time * 1000)}", 5, "DOWNLOAD", debug)
+            if "DOWNLOAD" not in temp:
+                print("HTTPDATA Error")
+                return False
+
+            if debug:
+                debugPrint(bytes(view).decode(errors="replace"))
+
+            for i in range(0, len(view), chunk_size):
+                self.outer.metrics.bytes_out += self.outer.ser.write(view[i:i + chunk_size]) or 0
+                if not self.outer.rtscts:
+                    self.outer.ser.flush()
+            temp = self.outer.ReadSerial(input_time, "OK", debug)
+            return "OK" in temp
+
+    def Session(self, idle_timeout: int | float = 30, debug: bool = False):
+        """
+        Get the persistent HTTP session of the modem.
+
+        The modem runs a single HTTP service, so the session is shared and
+        reused across calls.
+
+        :param idle_timeout: Seconds without requests before the HTTP service is terminated
+        :param debug: Enable debug output
+        :return: HTTPSession object, usable as a context manager
+        """
+        if self.session is None:
+            self.session = HTTPSession(self, idle_timeout, debug)
+        else:
+            self.session.idle_timeout = idle_timeout
+            self.session.debug = debug
+        return self.session
+
     def ReadHTTPHeader(self, waittime: int = 1, debug: bool = False):
         """
         Reads the HTTP headers from the server response.
@@ -114,19 +268,63 @@ class HTTP:
         :param debug: Enables debug mode if True. Default is False.
         :return: The HTTP headers from the response.
         """
-        return self.outer.SendAT("AT+HTTPHEAD", waittime, debug=debug)
+        temp = self.outer.SendAT("AT+HTTPHEAD", waittime, "+HTTPHEAD:", debug=debug)
+        return temp + self.outer.ReadSerial(waittime, debug=debug)
 
+    @timed("http.read", check_result=False)
     def ReadHTTPResponse(self, length: int, waittime: int = 1, debug: bool = False):
         """
         Reads the HTTP body/content from the server response.
 
         :param length: Number of bytes to read.
-        :param waittime: Time to wait for the response in seconds. Default is 1.
+        :param waittime: Time to wait for each chunk in seconds, on top of its transfer time. Default is 1.
         :param debug: Enables debug mode if True. Default is False.
-        :return: The HTTP body from the response.
+        :return: The HTTP body from the response, without the modem's framing.
+        """
+        return self.OpenResponse(length, waittime=waittime, debug=debug).read().decode(errors="replace")
+
+    def OpenResponse(self, length: int, chunk_size: int = None, waittime: int | float = 1, debug: bool = False):
         """
-        return self.outer.SendAT(f"AT+HTTPREAD=0,{length}", waittime, debug=debug)
+        Open the body of the last response as a binary file, read from the
+        modem chunk by chunk as it is consumed, e.g. json.load(http.OpenResponse(length)).
 
+        :param length: Body length reported by +HTTPACTION
+        :param chunk_size: Bytes per AT+HTTPREAD, defaults to READ_CHUNK
+        :param waittime: Time to wait for each chunk in seconds, on top of its transfer time
+        :param debug: Enable debug output
+        :return: io.BufferedReader over an HTTPResponseReader
+        """
+        chunk_size = chunk_size or self.READ_CHUNK
+        return io.BufferedReader(HTTPResponseReader(self, length, chunk_size, waittime, debug), chunk_size)
+
+    @timed("http.read.chunk")
+    def ReadHTTPChunk(self, offset: int, buffer, waittime: int | float = 1, debug: bool = False):
+        """
+        Read part of the body of the last response straight into a buffer.
+
+        The +HTTPREAD framing, the echo and the result codes are left out,
+        the call returns as soon as the modem has sent the chunk.
+
+        :param offset: Offset of the chunk in the body
+        :param buffer: Writable buffer, its length is the number of bytes requested
+        :param waittime: Time to wait in seconds, on top of the transfer time of the chunk
+        :param debug: Enable debug output
+        :return: Number of bytes received
+        """
+        block = BinaryBlock("+HTTPREAD:", buffer)
+        size = len(block.view)
+        with self.outer.lock:
+            self.outer.reader.expectBlock(block)
+            try:
+                self.outer.SendAT(f"AT+HTTPREAD={offset},{size}", waittime + size * 10 / self.outer.baudrate,
+                                  "+HTTPREAD: 0", debug=debug)
+            finally:
+                self.outer.reader.expectBlock(None)
+        if debug:
+            debugPrint(bytes(block.view[:block.received]).decode(errors="replace"))
+        return block.received
+
+    @timed("http.terminate", check_result=False)
     def terminateHTTP(self, debug = False):
         """
         Terminate the HTTP connection.
@@ -135,4 +333,232 @@ class HTTP:
         """
         print("Terminating the HTTP connection")
         self.outer.SendAT("AT+HTTPTERM", 1, debug=debug)
-        time.sleep(3)
\ No newline at end of file
+        if self.session:
+            self.session.Reset()
+
+class HTTPResponseReader(io.RawIOBase):
+    """
+    Body of the last HTTP response as a raw binary stream.
+
+    Every readinto() issues one AT+HTTPREAD for the next offset and the
+    payload lands directly in the caller's buffer, so memory use is bound
+    by the buffer and not by the size of the response. Use
+    HTTP.OpenResponse() to get it wrapped in a BufferedReader.
+    """
+
+    def __init__(self, http: HTTP, length: int, chunk_size: int = HTTP.READ_CHUNK,
+                 waittime: int | float = 1, debug: bool = False):
+        """
+        :param http: HTTP object of the modem
+        :param length: Body length reported by +HTTPACTION
+        :param chunk_size: Maximum bytes per AT+HTTPREAD
+        :param waittime: Time to wait for each chunk in seconds, on top of its transfer time
+        :param debug: Enable debug output
+        """
+        self.http = http
+        self.length = length
+        self.chunk_size = chunk_size
+        self.waittime = waittime
+        self.debug = debug
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """
+        Read the next chunk of the body into buffer.
+
+        :return: Number of bytes read, 0 at the end of the body
+        :raises TimeoutError: If the modem sent nothing
+        """
+        size = min(len(buffer), self.chunk_size, self.length - self.offset)
+        if size <= 0:
+            return 0
+        received = self.http.ReadHTTPChunk(self.offset, memoryview(buffer)[:size], self.waittime, self.debug)
+        if not received:
+            raise TimeoutError(f"No data from AT+HTTPREAD at offset {self.offset} of {self.length}")
+        self.offset += received
+        return received
+
+    def readall(self):
+        # The remaining length is known, so the body is read into one preallocated buffer
+        buffer = bytearray(self.length - self.offset)
+        view = memoryview(buffer)
+        position = 0
+        while position < len(buffer):
+            position += self.readinto(view[position:])
+        return bytes(buffer)
+
+class HTTPSession:
+    """
+    Persistent HTTP service of the modem.
+
+    AT+HTTPINIT is issued once and AT+HTTPPARA only for parameters that
+    changed since the previous request. The service is terminated when a
+    request fails, when an exception leaves the with block or after
+    idle_timeout seconds without requests.
+    """
+
+    def __init__(self, http: HTTP, idle_timeout: int | float = 30, debug: bool = False):
+        """
+        Initialize the session. Use HTTP.Session() instead of creating it directly.
+
+        :param http: HTTP object of the modem
+        :param idle_timeout: Seconds without requests before the HTTP service is terminated
+        :param debug: Enable debug output
+        """
+        self.http = http
+        self.outer = http.outer
+        self.idle_timeout = idle_timeout
+        self.debug = debug
+        self.active = False
+        self.params = {}
+        self.timer = None
+
+    def __enter__(self):
+        self.Open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            self.Close()
+        else:
+            self.__armIdleTimer()
+
+    def Open(self):
+        """
+        Initialize the HTTP service if it isn't running.
+
+        :return: True if the HTTP service is running
+        """
+        with self.http.lock:
+            self.__cancelIdleTimer()
+            if self.active:
+                return True
+            if "ERROR" in self.outer.SendAT("AT+HTTPINIT", 1, debug=self.debug):
+                # A service left over from an earlier run, restart it.
+                self.http.terminateHTTP(self.debug)
+                if "ERROR" in self.outer.SendAT("AT+HTTPINIT", 1, debug=self.debug):
+                    print("Error initializing HTTP server")
+                    return False
+            self.active = True
+            self.params = {}
+            return True
+
+    def Close(self, debug: bool = None):
+        """
+        Terminate the HTTP service.
+
+        :param debug: Enable debug output, defaults to the session setting
+        """
+        with self.http.lock:
+            if self.active:
+                self.http.terminateHTTP(self.debug if debug is None else debug)
+            self.Reset()
+
+    def Reset(self):
+        """
+        Forget the state of the HTTP service after it was terminated.
+        """
+        self.__cancelIdleTimer()
+        self.active = False
+        self.params = {}
+
+    def SetParameter(self, name: str, value: str):
+        """
+        Set an HTTP parameter if it differs from the value already on the modem.
+
+        :param name: Parameter name, e.g. "URL" or "CONTENT"
+        :param value: Parameter value
+        :return: False if the modem rejected the parameter
+        """
+        if self.params.get(name) == value:
+            return True
+        temp = self.outer.SendAT(f'AT+HTTPPARA="{name}","{value}"', 1, debug=self.debug)
+        if "ERROR" in temp:
+            self.params.pop(name, None)
+            return False
+        self.params[name] = value
+        return True
+
+    @timed("http.session.request")
+    def SendRequest(self, URL: str, method: str = HTTP.HTTPRequest.GET, data: str | bytes = None, content_type: str = "application/json"):
+        """
+        Send an HTTP request on the persistent service.
+
+        :param URL: The URL to send the request to
+        :param method: HTTP method to use (default is GET)
+        :param data: Data to send with the request (for POST/PUT)
+        :param content_type: Content type of data
+        :return: List of [method, status code, data length] or False if request failed
+        """
+        with self.http.lock:
+            # Fails in microseconds while the link is down instead of waiting for the modem
+            if not self.http.Available():
+                return False
+            if not self.Open():
+                self.http.Record(None)
+                return False
+            try:
+                if not self.SetParameter("URL", URL):
+                    self.Close()
+                    return False
+                if data:
+                    self.SetParameter("CONTENT", content_type)
+                    if not self.http.uploadData(data, debug=self.debug):
+                        self.Close()
+                        return False
+                HTTPResponse = self.http.startHTTPRequest(method, debug=self.debug)
+            except Exception:
+                self.Close()
+                raise
+            self.http.Record(HTTPResponse)
+            if not HTTPResponse:
+                print("Error Sending Request to the server")
+                self.Close()
+                return False
+            return HTTPResponse
+
+    def ReadResponse(self, length: int, waittime: int = 1):
+        """
+        Reads the HTTP body/content of the last response.
+
+        :param length: Number of bytes to read.
+        :param waittime: Time to wait for the response in seconds. Default is 1.
+        :return: The HTTP body from the response.
+        """
+        return self.http.ReadHTTPResponse(length, waittime, self.debug)
+
+    def OpenResponse(self, length: int, chunk_size: int = None, waittime: int | float = 1):
+        """
+        Open the body of the last response as a binary file, see HTTP.OpenResponse().
+
+        :param length: Body length reported by +HTTPACTION
+        :param chunk_size: Bytes per AT+HTTPREAD, defaults to HTTP.READ_CHUNK
+        :param waittime: Time to wait for each chunk in seconds, on top of its transfer time
+        :return: io.BufferedReader
+        """
+        return self.http.OpenResponse(length, chunk_size, waittime, self.debug)
+
+    def __armIdleTimer(self):
+        self.__cancelIdleTimer()
+        if self.active:
+            self.timer = threading.Timer(self.idle_timeout, self.__idleClose)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def __cancelIdleTimer(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+    def __idleClose(self):
+        with self.http.lock:
+            if self.timer is not threading.current_thread():
+                # Re-armed or cancelled while waiting for the lock
+                return
+            self.timer = None
+            if self.active:
+                print("HTTP session idle")
+                self.Close()
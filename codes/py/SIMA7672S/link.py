@@ -0,0 +1,167 @@
+import random
+import re
+import threading
+import time
+
+class CircuitBreaker:
+    """
+    Stop calling a failing service for a while.
+
+    After threshold consecutive failures the breaker opens and allow()
+    returns False until the backoff delay has passed. The next call is a
+    trial: its success closes the breaker, its failure opens it again with
+    twice the delay, up to max_delay. Every delay is shortened by a random
+    fraction of up to jitter so that many devices losing coverage together
+    don't retry in step. Thread safe.
+    """
+
+    def __init__(self, threshold: int = 3, delay: float = 5, max_delay: float = 300, jitter: float = 0.5,
+                 rng: random.Random = None):
+        """
+        :param threshold: Consecutive failures that open the breaker
+        :param delay: First backoff delay in seconds
+        :param max_delay: Longest backoff delay in seconds
+        :param jitter: Largest fraction taken off a delay at random
+        :param rng: Random number generator, for reproducible delays
+        """
+        self.threshold = threshold
+        self.delay = delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.random = rng or random.Random()
+        self.failures = 0
+        self.trips = 0
+        self.retryAt = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def open(self):
+        return self.failures >= self.threshold
+
+    def allow(self):
+        """
+        :return: True if a call may be made now
+        """
+        with self.lock:
+            return not self.open or time.monotonic() >= self.retryAt
+
+    def retryIn(self):
+        """
+        :return: Seconds until the next call is allowed, 0 if allowed now
+        """
+        with self.lock:
+            return max(0.0, self.retryAt - time.monotonic()) if self.open else 0.0
+
+    def success(self):
+        """
+        Record a successful call, the breaker closes.
+        """
+        with self.lock:
+            self.failures = 0
+            self.trips = 0
+            self.retryAt = 0.0
+
+    def failure(self):
+        """
+        Record a failed call, the breaker opens after threshold failures in a row.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            delay = min(self.max_delay, self.delay * 2 ** self.trips)
+            self.trips += 1
+            self.retryAt = time.monotonic() + delay * (1 - self.jitter * self.random.random())
+
+class LinkMonitor(threading.Thread):
+    """
+    Background check of the cellular link of a modem.
+
+    Every interval seconds the PDP context (AT+CGACT?) and the signal
+    quality (AT+CSQ) are read. A deactivated context is activated again
+    (HTTP.Attach) with its own exponential backoff, and once it is back
+    the upload breaker of the HTTP service is closed so uploads resume
+    without waiting for its backoff. The AT port is only held for the
+    single commands.
+    """
+
+    def __init__(self, outer, interval: float = 30, min_signal: int = 5, debug: bool = False):
+        """
+        :param outer: SIMA7672S object
+        :param interval: Seconds between checks
+        :param min_signal: Lowest usable AT+CSQ RSSI (0-31)
+        :param debug: Enable debug output
+        """
+        super().__init__(name="SIMA7672S-link", daemon=True)
+        self.outer = outer
+        self.interval = interval
+        self.min_signal = min_signal
+        self.debug = debug
+        self.pdp = None
+        self.rssi = None
+        self.checked = None
+        self.recovery = CircuitBreaker(1, interval, 600)
+        self.stopped = threading.Event()
+
+    @property
+    def up(self):
+        """
+        True unless the last check found no PDP context or no usable signal.
+        Before the first check the link counts as up.
+        """
+        if self.checked is None:
+            return True
+        return bool(self.pdp) and self.rssi is not None and self.rssi >= self.min_signal
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                if self.stopped.is_set():
+                    break
+                print(f"Link check failed: {e}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """
+        Stop checking, the current check is finished first.
+        """
+        self.stopped.set()
+
+    def check(self):
+        """
+        Read the link state now and reactivate the PDP context if it is down.
+
+        :return: True if the link is up
+        """
+        was_up = self.up
+        self.pdp = self.outer.HTTP.InternetConnection(self.debug)
+        self.rssi = self.parseSignal(self.outer.SendAT("AT+CSQ", 2, "OK", self.debug))
+        self.checked = time.monotonic()
+        if not self.pdp and self.rssi is not None and self.recovery.allow():
+            print("PDP context down, activating it again")
+            if self.outer.HTTP.Attach(debug=self.debug):
+                self.recovery.success()
+                self.pdp = True
+            else:
+                self.recovery.failure()
+        if self.up and not was_up:
+            print(f"Link up again, signal {self.rssi}")
+            self.outer.HTTP.breaker.success()
+        elif was_up and not self.up:
+            print(f"Link down, PDP context {'active' if self.pdp else 'inactive'}, signal {self.rssi}")
+        return self.up
+
+    @staticmethod
+    def parseSignal(csq: str):
+        """
+        Parse the response of AT+CSQ.
+
+        :param csq: Raw response text from the modem
+        :return: RSSI from 0 to 31, None if unknown or not detectable (99)
+        """
+        match = re.search(r"\+CSQ:\s*(\d+)", csq)
+        if not match or int(match.group(1)) == 99:
+            return None
+        return int(match.group(1))
@@ -0,0 +1,18 @@
+import sys
+
+def debugPrint(text: str, end: str = "\n"):
+    """
+    Print debug output of the driver.
+
+    If sys.stdout offers a debug() method (e.g. tracker.BufferedLog), the
+    text goes there, so a log that falls behind can drop it instead of
+    stalling the modem traffic.
+
+    :param text: Text to print
+    :param end: Appended to the text
+    """
+    debug = getattr(sys.stdout, "debug", None)
+    if debug:
+        debug(text + end)
+    else:
+        print(text, end=end)
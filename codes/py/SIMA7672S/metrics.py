@@ -0,0 +1,237 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+class Histogram:
+    """
+    Latency histogram with fixed bucket bounds in seconds.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float):
+        """
+        Estimate a quantile as the upper bound of the bucket holding it.
+
+        :param q: Quantile between 0 and 1
+        :return: Seconds, max for the overflow bucket, 0.0 if empty
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.max
+
+class Metrics:
+    """
+    Latency, error and traffic counters of the modem driver.
+
+    Every timed operation (AT commands by name, HTTP and GNSS calls) gets
+    a latency histogram plus timeout and error counters. Serial bytes are
+    counted per direction. Between startCycle() and endCycle() timed
+    operations are also recorded as a timeline of (name, start offset,
+    duration) for profiling one tracking cycle.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.timeouts = {}
+        self.errors = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.started = time.time()
+        self.timeline = None
+        self.cycle_start = 0.0
+        self.onCycle = None
+
+    def observe(self, name: str, seconds: float, timeout: bool = False, error: bool = False, start: float = None):
+        """
+        Record one operation.
+
+        :param name: Operation name, e.g. "AT+HTTPACTION" or "gnss.fix"
+        :param seconds: Duration
+        :param timeout: The operation timed out
+        :param error: The operation failed
+        :param start: perf_counter() value at the start, for the cycle timeline
+        """
+        with self.lock:
+            histogram = self.latency.get(name)
+            if histogram is None:
+                histogram = self.latency[name] = Histogram()
+            histogram.observe(seconds)
+            if timeout:
+                self.timeouts[name] = self.timeouts.get(name, 0) + 1
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            if self.timeline is not None:
+                begin = (time.perf_counter() - seconds if start is None else start) - self.cycle_start
+                self.timeline.append((name, begin, seconds))
+
+    def startCycle(self):
+        """
+        Start recording the timeline of a tracking cycle.
+        """
+        with self.lock:
+            self.timeline = []
+            self.cycle_start = time.perf_counter()
+
+    def endCycle(self):
+        """
+        Stop recording and pass the timeline to onCycle if set.
+
+        :return: List of (name, start offset, duration) tuples in start order, None if no cycle was started
+        """
+        with self.lock:
+            timeline, self.timeline = self.timeline, None
+            if timeline is not None:
+                timeline.append(("cycle", 0.0, time.perf_counter() - self.cycle_start))
+                timeline.sort(key=lambda event: event[1])
+        if timeline is not None and self.onCycle:
+            self.onCycle(timeline)
+        return timeline
+
+    def snapshot(self):
+        """
+        :return: Dictionary with all counters, usable with json.dumps
+        """
+        with self.lock:
+            return {
+                "timestamp": time.time(),
+                "uptime": time.time() - self.started,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "operations": {
+                    name: {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "max": histogram.max,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "buckets": dict(zip([str(bound) for bound in Histogram.BUCKETS] + ["+Inf"], histogram.counts)),
+                        "timeouts": self.timeouts.get(name, 0),
+                        "errors": self.errors.get(name, 0),
+                    } for name, histogram in self.latency.items()
+                },
+            }
+
+    def toPrometheus(self, prefix: str = "sima7672s"):
+        """
+        :return: All counters in the Prometheus text exposition format
+        """
+        with self.lock:
+            lines = [f"# TYPE {prefix}_serial_bytes_total counter",
+                     f'{prefix}_serial_bytes_total{{direction="in"}} {self.bytes_in}',
+                     f'{prefix}_serial_bytes_total{{direction="out"}} {self.bytes_out}',
+                     f"# TYPE {prefix}_operation_seconds histogram"]
+            for name, histogram in sorted(self.latency.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                total = 0
+                for bound, count in zip(Histogram.BUCKETS, histogram.counts):
+                    total += count
+                    lines.append(f'{prefix}_operation_seconds_bucket{{operation="{label}",le="{bound}"}} {total}')
+                lines.append(f'{prefix}_operation_seconds_bucket{{operation="{label}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_operation_seconds_sum{{operation="{label}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_operation_seconds_count{{operation="{label}"}} {histogram.count}')
+            for metric, counters in (("timeouts", self.timeouts), ("errors", self.errors)):
+                lines.append(f"# TYPE {prefix}_operation_{metric}_total counter")
+                for name, count in sorted(counters.items()):
+                    label = name.replace("\\", "\\\\").replace('"', '\\"')
+                    lines.append(f'{prefix}_operation_{metric}_total{{operation="{label}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Replace path with the current metrics. Files ending in .json get the
+        JSON snapshot, all others the Prometheus text format.
+
+        :param path: Output file, written atomically
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        text = json.dumps(self.snapshot()) if path.endswith(".json") else self.toPrometheus()
+        temp = path + ".tmp"
+        with open(temp, "w") as file:
+            file.write(text)
+        os.replace(temp, path)
+
+class MetricsExporter(threading.Thread):
+    """
+    Background thread rewriting a metrics file every interval seconds,
+    e.g. for the node_exporter textfile collector.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 60):
+        """
+        :param metrics: Metrics to export
+        :param path: Output file, .json for a JSON snapshot, otherwise Prometheus text
+        :param interval: Seconds between writes
+        """
+        super().__init__(name="SIMA7672S-metrics", daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            self.metrics.write(self.path)
+        except OSError as e:
+            print(f"Writing metrics failed: {e}")
+
+    def stop(self):
+        """
+        Stop the thread after writing the metrics a last time.
+        """
+        self.stopped.set()
+        self.export()
+
+def timed(name: str, check_result: bool = True):
+    """
+    Decorator recording the duration of a GNSS or HTTP method in
+    self.outer.metrics. A raised exception counts as an error, with
+    check_result a None or False result as well.
+
+    :param name: Operation name
+    :param check_result: Count None and False results as errors
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = function(self, *args, **kwargs)
+                failed = check_result and (result is None or result is False)
+                return result
+            finally:
+                self.outer.metrics.observe(name, time.perf_counter() - start, error=failed, start=start)
+        return wrapper
+    return decorator
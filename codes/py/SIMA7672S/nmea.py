@@ -0,0 +1,235 @@
+import threading
+import time
+import serial
+from .fix import GnssFix, KNOTS_TO_KMH, parseDateTime
+
+def checksum(body: bytes):
+    """
+    XOR of all bytes between "$" and "*".
+
+    :param body: Sentence without "$" and "*hh"
+    :return: Checksum as int
+    """
+    value = 0
+    for byte in body:
+        value ^= byte
+    return value
+
+def _degrees(value: bytes, hemisphere: bytes):
+    # ddmm.mmmm / dddmm.mmmm to signed decimal degrees
+    point = value.find(b".")
+    if point < 0:
+        point = len(value)
+    degrees = int(value[:point - 2]) + float(value[point - 2:]) / 60
+    return -degrees if hemisphere in (b"S", b"W") else degrees
+
+def _float(field: bytes):
+    return float(field) if field else 0.0
+
+class NMEAParser:
+    """
+    Incremental NMEA 0183 parser for GGA, RMC, GSA and VTG sentences.
+
+    Bytes can be fed in chunks of any size. Sentences with a missing or
+    wrong checksum are counted and ignored. The sentences of one epoch
+    (same UTC time) are merged into a GnssFix, which is published as soon
+    as both RMC and GGA of the epoch arrived, or when the next epoch starts
+    with only one of them: fix is updated and on_fix called with it.
+    Every epoch starts with an empty fix, a field its sentences don't
+    carry (e.g. an empty RMC course) is 0. Only the fields of GSA (DOP,
+    fix mode, satellites per system), which has no time of its own, are
+    taken over from the latest such sentence. VTG refines speed and course
+    of the current epoch.
+    """
+
+    MAX_LINE = 120
+    GSA_SYSTEMS = {b"GP": "gpsSVs", b"GL": "glonassSVs", b"GA": "galileoSVs", b"GB": "beidouSVs", b"BD": "beidouSVs"}
+    GSA_SYSTEM_IDS = {b"1": "gpsSVs", b"2": "glonassSVs", b"3": "galileoSVs", b"4": "beidouSVs"}
+
+    def __init__(self, on_fix=None):
+        """
+        :param on_fix: Optional callback, called with every published GnssFix
+        """
+        self.on_fix = on_fix
+        self.partial = bytearray()
+        self.fix = None
+        self.fixTime = 0.0
+        self.sentences = 0
+        self.checksum_errors = 0
+        self.epoch = None
+        self.seen = 0
+        self.published = True
+        self.current = GnssFix()
+        self.valid = False
+        self.date = b""
+        self.svs = {}
+
+    def feed(self, data: bytes):
+        """
+        Parse received bytes.
+
+        :param data: Raw NMEA output, may contain partial sentences
+        """
+        self.partial += data
+        start = 0
+        while True:
+            end = self.partial.find(b"\n", start)
+            if end < 0:
+                break
+            self.parseSentence(self.partial[start:end])
+            start = end + 1
+        del self.partial[:start]
+        if len(self.partial) > self.MAX_LINE:
+            self.partial.clear()
+
+    def parseSentence(self, line: bytes | str):
+        """
+        Parse one sentence.
+
+        :param line: Sentence, starting with "$", line terminator optional
+        :return: True if the sentence was valid and understood
+        """
+        if isinstance(line, str):
+            line = line.encode()
+        line = bytes(line).strip()
+        star = line.rfind(b"*")
+        if not line.startswith(b"$") or star < 0:
+            return False
+        try:
+            if checksum(line[1:star]) != int(line[star + 1:star + 3], 16):
+                self.checksum_errors += 1
+                return False
+        except ValueError:
+            self.checksum_errors += 1
+            return False
+        fields = line[1:star].split(b",")
+        kind = fields[0][-3:]
+        try:
+            if kind == b"RMC":
+                self.__rmc(fields)
+            elif kind == b"GGA":
+                self.__gga(fields)
+            elif kind == b"GSA":
+                self.__gsa(fields)
+            elif kind == b"VTG":
+                self.__vtg(fields)
+            else:
+                return False
+        except (ValueError, IndexError):
+            return False
+        self.sentences += 1
+        return True
+
+    def __startEpoch(self, utc: bytes):
+        if utc == self.epoch:
+            return
+        if not self.published:
+            self.__publish()
+        previous = self.current
+        self.current = GnssFix(previous.mode, previous.gpsSVs, previous.glonassSVs, previous.beidouSVs,
+                               previous.galileoSVs, pdop=previous.pdop, hdop=previous.hdop, vdop=previous.vdop)
+        self.epoch = utc
+        self.seen = 0
+        self.published = False
+
+    def __rmc(self, fields: list):
+        # $xxRMC,time,status,lat,N/S,lon,E/W,speed knots,course,date,...
+        self.__startEpoch(fields[1])
+        self.valid = fields[2] == b"A"
+        if self.valid:
+            self.current.latitude = _degrees(fields[3], fields[4])
+            self.current.longitude = _degrees(fields[5], fields[6])
+            self.current.speed = _float(fields[7]) * KNOTS_TO_KMH
+            if fields[8]:
+                self.current.course = float(fields[8])
+        self.date = fields[9]
+        self.__seen(1)
+
+    def __gga(self, fields: list):
+        # $xxGGA,time,lat,N/S,lon,E/W,quality,satellites,hdop,altitude,M,...
+        self.__startEpoch(fields[1])
+        self.valid = fields[6] not in (b"", b"0")
+        if self.valid:
+            self.current.latitude = _degrees(fields[2], fields[3])
+            self.current.longitude = _degrees(fields[4], fields[5])
+            self.current.hdop = _float(fields[8])
+            self.current.altitude = _float(fields[9])
+        self.__seen(2)
+
+    def __gsa(self, fields: list):
+        # $xxGSA,mode,fix type,12 satellite IDs,pdop,hdop,vdop[,system ID]
+        self.current.mode = int(fields[2]) if fields[2] else 0
+        self.current.pdop = _float(fields[15])
+        self.current.hdop = _float(fields[16])
+        self.current.vdop = _float(fields[17])
+        system = self.GSA_SYSTEM_IDS.get(fields[18]) if len(fields) > 18 else None
+        system = system or self.GSA_SYSTEMS.get(fields[0][:2], "gpsSVs")
+        self.svs[system] = sum(1 for field in fields[3:15] if field)
+        for name in ("gpsSVs", "glonassSVs", "galileoSVs", "beidouSVs"):
+            setattr(self.current, name, self.svs.get(name, 0))
+
+    def __vtg(self, fields: list):
+        # $xxVTG,course true,T,course magnetic,M,speed knots,N,speed km/h,K,...
+        if fields[1]:
+            self.current.course = float(fields[1])
+        if fields[7]:
+            self.current.speed = float(fields[7])
+
+    def __seen(self, sentence: int):
+        self.seen |= sentence
+        if self.seen == 3 and not self.published:
+            self.__publish()
+
+    def __publish(self):
+        self.published = True
+        if not self.valid or not self.epoch:
+            return
+        current = self.current
+        fix = GnssFix(current.mode, current.gpsSVs, current.glonassSVs, current.beidouSVs, current.galileoSVs,
+                      current.latitude, current.longitude,
+                      parseDateTime(self.date.decode(), self.epoch.decode()) if self.date else 0.0,
+                      current.altitude, current.speed, current.course, current.pdop, current.hdop, current.vdop)
+        self.fix = fix
+        self.fixTime = time.monotonic()
+        if self.on_fix:
+            self.on_fix(fix)
+
+class NMEAReader(threading.Thread):
+    """
+    Background thread feeding a dedicated NMEA serial port into a parser.
+    """
+
+    def __init__(self, port: str, parser: NMEAParser, baudrate: int = 115200):
+        """
+        :param port: NMEA serial port of the module
+        :param parser: Parser to feed
+        :param baudrate: Baudrate of the NMEA port
+        """
+        super().__init__(name="SIMA7672S-nmea", daemon=True)
+        self.ser = serial.Serial(port, baudrate, timeout=0.5)
+        self.parser = parser
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                data = self.ser.read(max(self.ser.in_waiting, 1))
+            except Exception:
+                if not self.running:
+                    break
+                raise
+            if not data:
+                continue
+            try:
+                self.parser.feed(data)
+            except Exception as e:
+                # A failing on_fix callback must not end the stream, the next fix is published as usual
+                print(f"NMEA fix callback failed: {e}")
+
+    def stop(self):
+        """
+        Stop the thread and close the port.
+        """
+        self.running = False
+        self.join(1)
+        self.ser.close()
@@ -0,0 +1,320 @@
+import threading
+import time
+
+class BinaryBlock:
+    """
+    Destination of the binary payload of a response such as
+    "+HTTPREAD: <length>", which is followed by exactly <length> raw bytes.
+
+    While the block is armed on a LineFramer, every header line starting
+    with prefix and announcing a non-zero length is consumed and the
+    payload is copied into the caller's buffer instead of being split into
+    lines, so the payload can contain anything, also line breaks and text
+    that looks like a result code. Several payloads are written one after
+    the other.
+    """
+
+    def __init__(self, prefix: str, buffer):
+        """
+        :param prefix: Prefix of the header line, e.g. "+HTTPREAD:"
+        :param buffer: Writable buffer (bytearray or memoryview) receiving the payload
+        """
+        self.prefix = prefix.encode()
+        self.view = memoryview(buffer).cast("B")
+        self.received = 0
+        self.overflow = 0
+
+    def header(self, line: bytes):
+        """
+        :param line: Complete line received from the modem
+        :return: Payload length announced by line, 0 if it isn't a header
+        """
+        line = line.strip()
+        if not line.startswith(self.prefix):
+            return 0
+        try:
+            return max(int(line[len(self.prefix):]), 0)
+        except ValueError:
+            return 0
+
+    def write(self, data: bytes):
+        """
+        Copy payload bytes into the buffer, bytes beyond its end are counted in overflow.
+        """
+        count = min(len(data), len(self.view) - self.received)
+        self.view[self.received:self.received + count] = data[:count]
+        self.received += count
+        self.overflow += len(data) - count
+
+class LineFramer:
+    """
+    Split modem output into lines and route unsolicited result codes.
+
+    Shared by the threaded SerialReader and the asyncio driver, the owner
+    takes care of locking and of waking up waiting callers.
+    """
+
+    FINAL_RESULTS = (b"OK", b"ERROR", b"+CME ERROR", b"+CMS ERROR", b"NO CARRIER")
+    ERROR_RESULTS = (b"ERROR", b"+CME ERROR", b"+CMS ERROR")
+
+    def __init__(self):
+        self.partial = bytearray()
+        self.subscribers = {}
+        self.block = None
+        self.remaining = 0
+
+    def frame(self, data: bytes):
+        """
+        Add received bytes and return the complete lines not consumed by a subscriber.
+
+        :param data: Raw bytes received from the modem
+        :return: bytearray with the kept lines, line terminators included
+        """
+        self.partial += data
+        keep = bytearray()
+        start = 0
+        block = self.block
+        while True:
+            if self.remaining and block:
+                count = min(self.remaining, len(self.partial) - start)
+                if not count:
+                    break
+                block.write(self.partial[start:start + count])
+                self.remaining -= count
+                start += count
+                continue
+            end = self.partial.find(b"\n", start)
+            if end < 0:
+                break
+            line = bytes(self.partial[start:end + 1])
+            start = end + 1
+            if block and (length := block.header(line)):
+                self.remaining = length
+            elif not self.__dispatch(line):
+                keep += line
+        del self.partial[:start]
+        return keep
+
+    def expectBlock(self, block: BinaryBlock | None):
+        """
+        Arm a binary block for the next payloads, None to disarm it.
+
+        :param block: BinaryBlock receiving the payloads
+        """
+        self.remaining = 0
+        self.block = block
+
+    def flush(self):
+        """
+        Take the incomplete trailing line ("> " prompts, raw bodies).
+
+        :return: The pending bytes
+        """
+        data = bytes(self.partial)
+        self.partial.clear()
+        return data
+
+    def __dispatch(self, line: bytes):
+        """
+        Hand a complete line to the subscribers of its prefix.
+
+        :return: True if the line was consumed by a subscriber
+        """
+        if not self.subscribers:
+            return False
+        text = line.decode(errors="replace").strip()
+        consumed = False
+        for prefix, callbacks in list(self.subscribers.items()):
+            if text.startswith(prefix):
+                for callback, consume in list(callbacks):
+                    try:
+                        callback(text)
+                    except Exception as e:
+                        print(f"URC handler for {prefix} failed: {e}")
+                    consumed = consumed or consume
+        return consumed
+
+    def subscribe(self, prefix: str, callback, consume: bool = False):
+        """
+        Register a callback for lines starting with prefix.
+
+        :param prefix: Line prefix to match, e.g. "+HTTPACTION:"
+        :param callback: Called with the stripped line
+        :param consume: Do not keep matching lines in the response buffer
+        """
+        self.subscribers.setdefault(prefix, []).append((callback, consume))
+
+    def unsubscribe(self, prefix: str, callback):
+        """
+        Remove a callback registered with subscribe().
+        """
+        callbacks = [c for c in self.subscribers.get(prefix, []) if c[0] != callback]
+        if callbacks:
+            self.subscribers[prefix] = callbacks
+        else:
+            self.subscribers.pop(prefix, None)
+
+    @classmethod
+    def match(cls, buffer: bytearray, pos: int, response: str, final: bool):
+        """
+        Scan complete lines of buffer from pos for a terminating line.
+
+        A line terminates the read if it contains response or is an error
+        result code. Without response the final result code terminates it
+        when final is set.
+
+        :return: Tuple (end offset of the matching line or None, next scan position)
+        """
+        token = response.encode() if response else None
+        while True:
+            end = buffer.find(b"\n", pos)
+            if end < 0:
+                return None, pos
+            line = buffer[pos:end].strip()
+            pos = end + 1
+            if token and token in line:
+                return pos, pos
+            if (token or final) and line.startswith(cls.ERROR_RESULTS):
+                return pos, pos
+            if final and not token and line.startswith(cls.FINAL_RESULTS):
+                return pos, pos
+
+class SerialReader(threading.Thread):
+    """
+    Background thread that owns the receive side of the modem UART.
+
+    Incoming bytes are split into lines. Lines starting with a subscribed
+    prefix (unsolicited result codes such as "+HTTPACTION:") are handed to
+    their subscribers, everything else is kept in a buffer until a caller
+    consumes it with read().
+
+    If reading the port fails (e.g. the USB adapter is unplugged) the
+    thread logs the error and ends, and every later read() raises instead
+    of waiting out its timeout.
+    """
+
+    def __init__(self, ser, chunk_size: int = 1024, metrics=None):
+        """
+        Initialize the reader thread.
+
+        :param ser: Open serial.Serial instance (a read timeout must be set)
+        :param chunk_size: Maximum number of bytes pulled per read call
+        :param metrics: Optional Metrics object counting received bytes
+        """
+        super().__init__(name="SIMA7672S-reader", daemon=True)
+        self.ser = ser
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.cond = threading.Condition()
+        self.framer = LineFramer()
+        self.metrics = metrics
+        self.running = True
+        self.error = None
+
+    def run(self):
+        while self.running:
+            try:
+                data = self.ser.read(min(max(self.ser.in_waiting, 1), self.chunk_size))
+            except Exception as e:
+                if not self.running:
+                    break
+                print(f"Serial reader stopped: {e}")
+                with self.cond:
+                    self.error = e
+                    self.cond.notify_all()
+                break
+            if data:
+                if self.metrics:
+                    self.metrics.bytes_in += len(data)
+                self.feed(data)
+            elif self.framer.partial:
+                # The line stayed incomplete for a whole read timeout,
+                # make it visible to callers anyway.
+                self.__append(self.framer.flush())
+
+    def stop(self):
+        """
+        Stop the reader thread. The serial port is left open.
+        """
+        self.running = False
+
+    def feed(self, data: bytes):
+        """
+        Split received bytes into lines, route URCs and wake up waiting callers.
+
+        :param data: Raw bytes received from the modem
+        """
+        keep = self.framer.frame(data)
+        if keep:
+            self.__append(keep)
+
+    def __append(self, data: bytes):
+        with self.cond:
+            self.buffer += data
+            self.cond.notify_all()
+
+    def subscribe(self, prefix: str, callback, consume: bool = False):
+        """
+        Register a callback for lines starting with prefix.
+
+        :param prefix: Line prefix to match, e.g. "+HTTPACTION:"
+        :param callback: Called with the stripped line from the reader thread
+        :param consume: Do not keep matching lines in the response buffer
+        """
+        self.framer.subscribe(prefix, callback, consume)
+
+    def unsubscribe(self, prefix: str, callback):
+        """
+        Remove a callback registered with subscribe().
+        """
+        self.framer.unsubscribe(prefix, callback)
+
+    def expectBlock(self, block: BinaryBlock | None):
+        """
+        Receive the following binary payloads into block instead of the
+        response buffer, None to go back to lines. See BinaryBlock.
+        """
+        self.framer.expectBlock(block)
+
+    def discard(self):
+        """
+        Drop everything received but not yet consumed.
+
+        :return: The discarded data
+        """
+        with self.cond:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        return data.decode(errors="replace")
+
+    def read(self, timeout: int | float, response: str = None, final: bool = False):
+        """
+        Wait for data from the modem.
+
+        Returns as soon as a line containing response (or an error result code)
+        arrives. Without response the call returns on the final result code if
+        final is set, otherwise it collects data for the whole timeout.
+
+        :param timeout: Maximum time to wait in seconds
+        :param response: Expected response string
+        :param final: Stop at the final result code (OK/ERROR)
+        :return: Data up to and including the terminating line
+        :raises ConnectionError: If the reader thread ended on a serial error
+        """
+        deadline = time.monotonic() + timeout
+        pos = 0
+        with self.cond:
+            while True:
+                end, pos = LineFramer.match(self.buffer, pos, response, final)
+                if end is not None:
+                    break
+                if self.error is not None:
+                    raise ConnectionError(f"Serial port failed: {self.error}") from self.error
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    end = len(self.buffer)
+                    break
+                self.cond.wait(remaining)
+            data = bytes(self.buffer[:end])
+            del self.buffer[:end]
+        return data.decode(errors="replace")
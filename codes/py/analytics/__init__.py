@@ -0,0 +1,2 @@
+from .fleet import EPISODE_DTYPE, Fleet, haversine, runs
+from .logs import SAMPLE_DTYPE, loadDay, loadSegment, loadVehicle, logFiles, parseLog, parseSegment, segmentFiles
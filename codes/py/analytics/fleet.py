@@ -0,0 +1,215 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .logs import loadVehicle
+
+EPISODE_DTYPE = np.dtype([("vehicle", "i4"), ("start", "i8"), ("end", "i8"), ("duration", "f8"),
+                          ("distance", "f8"), ("peak", "f8")])
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Element-wise great-circle distance in metres.
+    """
+    p1 = np.radians(lat1)
+    p2 = np.radians(lat2)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 12742000 * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+def runs(mask, linked):
+    """
+    Find maximal runs of consecutive samples.
+
+    :param mask: Per sample, True if it belongs to a run
+    :param linked: Per neighbour pair (one shorter than mask), False where a run must break
+    :return: Tuple of (first, last) sample index arrays, one entry per run
+    """
+    joined = np.zeros(len(mask) + 1, dtype=bool)
+    joined[1:-1] = mask[:-1] & mask[1:] & linked
+    return np.flatnonzero(mask & ~joined[:-1]), np.flatnonzero(mask & ~joined[1:])
+
+def _peak(values, first, last):
+    # Maximum of values[first[i]:last[i] + 1] for every run
+    if not len(first):
+        return np.empty(0)
+    bounds = np.column_stack((first, last + 1)).ravel()
+    return np.fmax.reduceat(np.append(values, np.nan), bounds)[::2]
+
+class Fleet:
+    """
+    Tracking history of one or more vehicles as NumPy columns.
+
+    The samples of all vehicles are kept in one array sorted by vehicle
+    and time, so every statistic is computed for the whole fleet in a few
+    vectorized passes and split per vehicle with bincount. Consecutive
+    samples of a vehicle more than MAX_GAP seconds apart are not linked:
+    runs (trips, episodes) end there and no distance or time is counted
+    across the gap. Positions at 0, 0 (no fix) and jumps faster than
+    MAX_JUMP_SPEED are not counted as distance.
+
+    The thresholds below are class attributes and can be overridden per
+    instance through keyword arguments, e.g. Fleet(..., SPEED_LIMIT=60).
+    """
+
+    SPEED_LIMIT = 80
+    MOVING_SPEED = 3
+    MAX_GAP = 600
+    MAX_JUMP_SPEED = 250
+    FUEL_WINDOW = 9
+    REFUEL_JUMP = 5
+
+    def __init__(self, samples, vehicles, names: list, days: list = None, malformed: list = None, **settings):
+        """
+        :param samples: SAMPLE_DTYPE array
+        :param vehicles: Vehicle index of every sample
+        :param names: Vehicle names, indexed by vehicle index
+        :param days: Number of log days per vehicle
+        :param malformed: Number of malformed log lines per vehicle
+        :param settings: Overrides for the class attribute thresholds
+        """
+        for name, value in settings.items():
+            if not name.isupper() or not hasattr(type(self), name):
+                raise TypeError(f"Unknown setting {name}")
+            setattr(self, name, value)
+        order = np.lexsort((samples["timestamp"], vehicles))
+        self.samples = samples[order]
+        self.vehicles = np.asarray(vehicles, dtype=np.int32)[order]
+        self.names = list(names)
+        self.days = days or [0] * len(names)
+        self.malformed = malformed or [0] * len(names)
+
+        t = self.samples["timestamp"].astype(np.float64)
+        self.dt = np.diff(t)
+        self.linked = (self.vehicles[1:] == self.vehicles[:-1]) & (self.dt <= self.MAX_GAP)
+        latitude = self.samples["latitude"]
+        longitude = self.samples["longitude"]
+        fixed = np.isfinite(latitude) & np.isfinite(longitude) & ((latitude != 0) | (longitude != 0))
+        distance = haversine(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            plausible = distance / self.dt * 3.6 <= self.MAX_JUMP_SPEED
+        self.steps = np.where(self.linked & fixed[:-1] & fixed[1:] & plausible, distance, 0.0)
+        self.travelled = np.concatenate(([0.0], np.cumsum(self.steps)))
+
+    @classmethod
+    def load(cls, directories: dict, cache: bool = True, **settings):
+        """
+        Load the logs of a fleet.
+
+        :param directories: Log directory per vehicle name
+        :param cache: Use the columnar cache of the daily logs
+        :param settings: Overrides for the class attribute thresholds
+        :return: Fleet
+        """
+        loaded = [loadVehicle(directory, cache) for directory in directories.values()]
+        samples = np.concatenate([vehicle[0] for vehicle in loaded])
+        vehicles = np.repeat(np.arange(len(loaded), dtype=np.int32), [len(vehicle[0]) for vehicle in loaded])
+        return cls(samples, vehicles, list(directories), [vehicle[1] for vehicle in loaded],
+                   [vehicle[2] for vehicle in loaded], **settings)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __perVehicle(self, pairs, weights):
+        # Sum the weights of the selected neighbour pairs per vehicle
+        return np.bincount(self.vehicles[:-1][pairs], weights[pairs], minlength=len(self.names))
+
+    def distance(self):
+        """
+        :return: Metres driven per vehicle
+        """
+        return np.bincount(self.vehicles[:-1], self.steps, minlength=len(self.names))
+
+    def drivingTime(self):
+        """
+        :return: Seconds with the key on and moving, per vehicle
+        """
+        on = self.linked & (self.samples["keyState"][:-1] == 1)
+        return self.__perVehicle(on & (self.samples["speed"][:-1] >= self.MOVING_SPEED), self.dt)
+
+    def idleTime(self):
+        """
+        :return: Seconds with the key on and standing, per vehicle
+        """
+        on = self.linked & (self.samples["keyState"][:-1] == 1)
+        return self.__perVehicle(on & ~(self.samples["speed"][:-1] >= self.MOVING_SPEED), self.dt)
+
+    def episodes(self, mask, values):
+        """
+        Turn a per sample condition into episodes.
+
+        :param mask: Per sample, True while the condition holds
+        :param values: Per sample values, peak is their maximum over the episode
+        :return: EPISODE_DTYPE array, start and end are timestamps
+        """
+        first, last = runs(mask, self.linked)
+        out = np.empty(len(first), dtype=EPISODE_DTYPE)
+        out["vehicle"] = self.vehicles[first]
+        out["start"] = self.samples["timestamp"][first]
+        out["end"] = self.samples["timestamp"][last]
+        out["duration"] = out["end"] - out["start"]
+        out["distance"] = self.travelled[last] - self.travelled[first]
+        out["peak"] = _peak(values, first, last)
+        return out
+
+    def trips(self):
+        """
+        :return: Episodes with the key on, peak is the top speed
+        """
+        return self.episodes(self.samples["keyState"] == 1, self.samples["speed"])
+
+    def speeding(self):
+        """
+        :return: Episodes above SPEED_LIMIT, peak is the top speed
+        """
+        return self.episodes(self.samples["speed"] > self.SPEED_LIMIT, self.samples["speed"])
+
+    def alcoholAlarms(self):
+        """
+        :return: Episodes with alcohol detected, peak is the highest sensor value
+        """
+        return self.episodes(self.samples["alcoholDetected"] >= 1, self.samples["alcoholValue"])
+
+    def fuelCurve(self, vehicle: int):
+        """
+        Fuel level of one vehicle over time.
+
+        The level is median filtered over FUEL_WINDOW samples to remove
+        sensor noise and slosh. Every drop counts as consumption, rises of
+        more than REFUEL_JUMP are refuels and smaller ones are ignored.
+
+        :param vehicle: Vehicle index
+        :return: Tuple of (timestamps, filtered level, cumulative consumption, refuel count)
+        """
+        samples = self.samples[self.vehicles == vehicle]
+        samples = samples[np.isfinite(samples["fuelLevel"])]
+        if not len(samples):
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), 0
+        half = self.FUEL_WINDOW // 2
+        padded = np.pad(samples["fuelLevel"], half, mode="edge")
+        level = np.median(sliding_window_view(padded, 2 * half + 1), axis=1)
+        change = np.diff(level)
+        consumed = np.concatenate(([0.0], np.cumsum(np.where(change < 0, -change, 0.0))))
+        return samples["timestamp"], level, consumed, int(np.count_nonzero(change > self.REFUEL_JUMP))
+
+    def summary(self):
+        """
+        :return: One dictionary of statistics per vehicle
+        """
+        count = len(self.names)
+        distance = self.distance()
+        driving = self.drivingTime()
+        idle = self.idleTime()
+        samples = np.bincount(self.vehicles, minlength=count)
+        trips = np.bincount(self.trips()["vehicle"], minlength=count)
+        speeding = np.bincount(self.speeding()["vehicle"], minlength=count)
+        alcohol = np.bincount(self.alcoholAlarms()["vehicle"], minlength=count)
+        out = []
+        for vehicle, name in enumerate(self.names):
+            _, _, consumed, refuels = self.fuelCurve(vehicle)
+            fuel = float(consumed[-1]) if len(consumed) else 0.0
+            km = distance[vehicle] / 1000
+            out.append({"vehicle": name, "days": self.days[vehicle], "samples": int(samples[vehicle]),
+                        "malformed": self.malformed[vehicle], "distance_km": round(km, 3),
+                        "trips": int(trips[vehicle]), "driving_h": round(driving[vehicle] / 3600, 3),
+                        "idle_h": round(idle[vehicle] / 3600, 3), "speeding": int(speeding[vehicle]),
+                        "alcohol_alarms": int(alcohol[vehicle]), "fuel_used": round(fuel, 2),
+                        "fuel_per_100km": round(fuel / km * 100, 2) if km >= 1 else None, "refuels": refuels})
+        return out
@@ -0,0 +1,201 @@
+import gzip
+import json
+import os
+import re
+import zlib
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype([("timestamp", "i8"), ("latitude", "f8"), ("longitude", "f8"), ("speed", "f8"),
+                         ("alcoholValue", "f8"), ("alcoholDetected", "f8"), ("fuelLevel", "f8"),
+                         ("keyState", "f8"), ("error", "f8")])
+# Layout of tracker.SampleStore.RECORD ("<QdddfHBBBB2xI"), kept in step by hand so the
+# analytics doesn't need the tracker and its serial dependencies
+RECORD_DTYPE = np.dtype([("seq", "<u8"), ("timestamp", "<f8"), ("latitude", "<f8"), ("longitude", "<f8"),
+                         ("speed", "<f4"), ("alcoholValue", "<u2"), ("alcoholDetected", "u1"), ("fuelLevel", "u1"),
+                         ("keyState", "u1"), ("error", "u1"), ("pad", "V2"), ("crc", "<u4")])
+LOG_NAME = re.compile(r"^(\d{2})-(\d{2})-(\d{4})\.txt(\.gz)?$")
+SEGMENT_NAME = re.compile(r"^(\d{16})\.seg$")
+CACHE_DIR = ".cache"
+
+def _value(field):
+    # {"doubleValue": 1.5} -> 1.5, anything unusable -> NaN
+    try:
+        return float(_first(field))
+    except (TypeError, ValueError):
+        return np.nan
+
+def _first(field):
+    try:
+        return next(iter(field.values()))
+    except (AttributeError, StopIteration):
+        return None
+
+def _timestamps(values: list):
+    # "2024-10-03T10:41:16Z" -> seconds, unparsable -> NaT, one vectorized pass in the common case
+    text = [value[:19] if isinstance(value, str) else "NaT" for value in values]
+    try:
+        return np.array(text, dtype="datetime64[s]")
+    except ValueError:
+        out = np.empty(len(text), dtype="datetime64[s]")
+        for i, value in enumerate(text):
+            try:
+                out[i] = np.datetime64(value, "s")
+            except ValueError:
+                out[i] = np.datetime64("NaT")
+        return out
+
+def parseLog(path: str):
+    """
+    Parse one daily log file.
+
+    Each line is the Firestore field map of one sample followed by a
+    comma. The whole file is decoded in one json.loads call, only files
+    with broken lines fall back to decoding line by line. Lines that are
+    no JSON object or have no valid timestamp are skipped and counted;
+    missing or non-numeric fields become NaN.
+
+    :param path: <dd-mm-YYYY>.txt file, optionally gzip compressed
+    :return: Tuple of (samples as SAMPLE_DTYPE array sorted by time, number of malformed lines)
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as file:
+        lines = [line for line in (line.strip().rstrip(",") for line in file) if line]
+    malformed = 0
+    try:
+        records = json.loads("[" + ",".join(lines) + "]")
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                malformed += 1
+    objects = [record for record in records if isinstance(record, dict)]
+    malformed += len(records) - len(objects)
+
+    timestamps = _timestamps([_first(record.get("timestamp")) for record in objects])
+    valid = ~np.isnat(timestamps)
+    malformed += int(np.count_nonzero(~valid))
+    samples = np.empty(len(objects), dtype=SAMPLE_DTYPE)
+    samples["timestamp"] = np.where(valid, timestamps.astype("i8"), 0)
+    for name in SAMPLE_DTYPE.names[1:]:
+        samples[name] = [_value(record.get(name)) for record in objects]
+    samples = samples[valid]
+    return samples[np.argsort(samples["timestamp"], kind="stable")], malformed
+
+def parseSegment(path: str):
+    """
+    Parse one segment file of a vehicle's sample queue (tracker.SampleStore).
+
+    Only records carrying their own sequence number and a matching CRC32
+    are used, unwritten slots are skipped and records torn by a power cut
+    are counted as malformed.
+
+    :param path: <base>.seg file
+    :return: Tuple of (samples as SAMPLE_DTYPE array sorted by time, number of malformed records)
+    """
+    base = int(os.path.basename(path)[:-4])
+    with open(path, "rb") as file:
+        data = file.read()
+    data = data[:len(data) - len(data) % RECORD_DTYPE.itemsize]
+    records = np.frombuffer(data, dtype=RECORD_DTYPE)
+    placed = records["seq"] == base + np.arange(len(records), dtype="u8")
+    size = RECORD_DTYPE.itemsize
+    valid = placed.copy()
+    for index in np.flatnonzero(placed):
+        valid[index] = zlib.crc32(data[index * size:(index + 1) * size - 4]) == records["crc"][index]
+    malformed = int(np.count_nonzero(placed & ~valid))
+    records = records[valid]
+    samples = np.empty(len(records), dtype=SAMPLE_DTYPE)
+    samples["timestamp"] = np.floor(records["timestamp"]).astype("i8")
+    for name in SAMPLE_DTYPE.names[1:]:
+        samples[name] = records[name]
+    return samples[np.argsort(samples["timestamp"], kind="stable")], malformed
+
+def logFiles(directory: str):
+    """
+    :param directory: Log directory of one vehicle
+    :return: Paths of its daily log files, oldest day first
+    """
+    files = []
+    for name in os.listdir(directory):
+        match = LOG_NAME.match(name)
+        if match:
+            day, month, year = match.group(1, 2, 3)
+            files.append((f"{year}{month}{day}", os.path.join(directory, name)))
+    return [path for _, path in sorted(files)]
+
+def segmentFiles(directory: str):
+    """
+    :param directory: Sample queue directory of one vehicle
+    :return: Paths of its segment files, oldest first
+    """
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if SEGMENT_NAME.match(name)]
+
+def loadDay(path: str, cache: bool = True):
+    """
+    Load one daily log file through its columnar cache.
+
+    The parsed columns are kept in <directory>/.cache/<day>.npz and reused
+    as long as the log file is not newer, so a finished day is parsed
+    once and today's file again whenever it grew.
+
+    :param path: Daily log file
+    :param cache: Read and write the cache
+    :return: Tuple of (samples, number of malformed lines)
+    """
+    return _load(path, parseLog, cache)
+
+def loadSegment(path: str, cache: bool = True):
+    """
+    Load one queue segment through the same columnar cache as loadDay().
+
+    :param path: Segment file
+    :param cache: Read and write the cache
+    :return: Tuple of (samples, number of malformed records)
+    """
+    return _load(path, parseSegment, cache)
+
+def _load(path: str, parse, cache: bool):
+    directory, name = os.path.split(path)
+    cachePath = os.path.join(directory, CACHE_DIR, name.split(".")[0] + ".npz")
+    if cache:
+        try:
+            if os.path.getmtime(cachePath) >= os.path.getmtime(path):
+                with np.load(cachePath) as cached:
+                    if cached["samples"].dtype == SAMPLE_DTYPE:
+                        return cached["samples"], int(cached["malformed"])
+        except (OSError, KeyError, ValueError):
+            pass
+    samples, malformed = parse(path)
+    if cache:
+        try:
+            os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+            tmp = cachePath + ".tmp"
+            with open(tmp, "wb") as file:
+                np.savez(file, samples=samples, malformed=malformed)
+            os.replace(tmp, cachePath)
+        except OSError as e:
+            print(f"Could not cache {path}: {e}")
+    return samples, malformed
+
+def loadVehicle(directory: str, cache: bool = True):
+    """
+    Load all samples of one vehicle: the daily logs written before the
+    sample queue and the segments of the queue, from the directory itself
+    or its log/ and queue/ subdirectories.
+
+    :param directory: Log directory, queue directory or working directory of the vehicle
+    :param cache: Use the columnar cache
+    :return: Tuple of (samples sorted by time, days with samples, number of malformed lines and records)
+    """
+    days = []
+    for path in (directory, os.path.join(directory, "log"), os.path.join(directory, "queue")):
+        if os.path.isdir(path):
+            days += [loadDay(file, cache) for file in logFiles(path)]
+            days += [loadSegment(file, cache) for file in segmentFiles(path)]
+    if not days:
+        return np.empty(0, dtype=SAMPLE_DTYPE), 0, 0
+    samples = np.concatenate([day[0] for day in days])
+    samples = samples[np.argsort(samples["timestamp"], kind="stable")]
+    return samples, len(np.unique(samples["timestamp"] // 86400)), sum(day[1] for day in days)
@@ -0,0 +1,79 @@
+"""
+Fleet statistics from the tracking logs and sample queues.
+
+    python3 analyze.py queue
+    python3 analyze.py --vehicle bus-1 logs/bus-1 --vehicle bus-2 logs/bus-2 --episodes
+
+Every directory holds the data of one vehicle: the <dd-mm-YYYY>.txt logs
+of older versions and the segment files of the sample queue, directly or
+in log/ and queue/ subdirectories. Parsed files are cached in
+<directory>/.cache, so only new or grown files are parsed again. Needs
+NumPy.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from analytics import Fleet
+
+def formatTime(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(int(timestamp)))
+
+def printEpisodes(title: str, episodes, names: list, unit: str):
+    print(f"\n{title}: {len(episodes)}")
+    for episode in episodes:
+        print(f"  {names[episode['vehicle']]:12} {formatTime(episode['start'])}  {episode['duration'] / 60:7.1f} min  "
+              f"{episode['distance'] / 1000:8.2f} km  peak {episode['peak']:.1f} {unit}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directories", nargs="*", help="Data directory of a vehicle, named after the directory")
+    parser.add_argument("--vehicle", nargs=2, action="append", default=[], metavar=("ID", "DIRECTORY"),
+                        help="Vehicle ID and its data directory, repeat for every vehicle")
+    parser.add_argument("--speed-limit", type=float, default=Fleet.SPEED_LIMIT, help="Speeding threshold in km/h")
+    parser.add_argument("--max-gap", type=float, default=Fleet.MAX_GAP,
+                        help="Seconds between samples that end a trip")
+    parser.add_argument("--episodes", action="store_true", help="List trips, speeding and alcohol alarms")
+    parser.add_argument("--fuel-csv", metavar="PATH", help="Write the fuel curves of all vehicles to a CSV file")
+    parser.add_argument("--no-cache", action="store_true", help="Parse all logs, don't read or write the cache")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    directories = {os.path.basename(os.path.normpath(path)): path for path in args.directories}
+    directories.update(args.vehicle)
+    if not directories:
+        parser.error("no log directory given")
+
+    start = time.perf_counter()
+    fleet = Fleet.load(directories, cache=not args.no_cache, SPEED_LIMIT=args.speed_limit, MAX_GAP=args.max_gap)
+    loaded = time.perf_counter() - start
+    summary = fleet.summary()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{len(fleet)} samples of {len(directories)} vehicles loaded in {loaded:.2f} s")
+        print(f"{'vehicle':12} {'days':>5} {'samples':>8} {'bad':>5} {'km':>9} {'trips':>6} {'drive h':>8} "
+              f"{'idle h':>7} {'speeding':>8} {'alcohol':>7} {'fuel':>6} {'/100km':>7}")
+        for row in summary:
+            per100 = f"{row['fuel_per_100km']:7.2f}" if row["fuel_per_100km"] is not None else f"{'-':>7}"
+            print(f"{row['vehicle']:12} {row['days']:5} {row['samples']:8} {row['malformed']:5} "
+                  f"{row['distance_km']:9.1f} {row['trips']:6} {row['driving_h']:8.1f} {row['idle_h']:7.1f} "
+                  f"{row['speeding']:8} {row['alcohol_alarms']:7} {row['fuel_used']:6.1f} {per100}")
+    if args.episodes:
+        printEpisodes("Trips", fleet.trips(), fleet.names, "km/h")
+        printEpisodes(f"Speeding above {fleet.SPEED_LIMIT:g} km/h", fleet.speeding(), fleet.names, "km/h")
+        printEpisodes("Alcohol alarms", fleet.alcoholAlarms(), fleet.names, "")
+
+    if args.fuel_csv:
+        with open(args.fuel_csv, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["vehicle", "timestamp", "level", "consumed"])
+            for vehicle, name in enumerate(fleet.names):
+                timestamps, level, consumed, _ = fleet.fuelCurve(vehicle)
+                writer.writerows((name, formatTime(t), f"{l:.2f}", f"{c:.2f}")
+                                 for t, l, c in zip(timestamps, level, consumed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Load and analysis time of the fleet log analytics on generated logs.
+
+Writes daily logs in the format the tracker used to log samples (one
+Firestore field map per line, trailing comma) for a number of vehicles
+and days, with a few broken lines, then times parsing them, loading them
+again from the columnar cache and computing the fleet summary.
+
+    python3 benchmarks/analytics.py --vehicles 5 --days 30 --samples 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import Fleet
+
+def writeDay(path: str, day: float, samples: int, rng: random.Random, broken: float):
+    latitude, longitude, fuel = 12.97, 77.59, 80.0
+    with open(path, "w") as file:
+        for i in range(samples):
+            now = day + i * 30
+            keyState = int(6 * 3600 <= now % 86400 < 20 * 3600)
+            speed = max(0.0, rng.gauss(50, 25)) if keyState else 0.0
+            latitude += speed / 3.6 * 30 / 111320 * rng.choice((-1, 1))
+            fuel = max(0.0, fuel - speed * 0.0005 + rng.gauss(0, 0.3))
+            alcohol = int(rng.random() < 0.002)
+            fields = {"alcoholValue": {"integerValue": 600 if alcohol else 120},
+                      "alcoholDetected": {"integerValue": alcohol},
+                      "latitude": {"doubleValue": latitude}, "longitude": {"doubleValue": longitude},
+                      "speed": {"doubleValue": speed}, "fuelLevel": {"integerValue": int(fuel)},
+                      "keyState": {"integerValue": keyState}, "error": {"integerValue": 0},
+                      "timestamp": {"timestampValue": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))}}
+            line = json.dumps(fields)
+            if rng.random() < broken:
+                line = line[:rng.randrange(len(line))]
+            file.write(line + ",\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--samples", type=int, default=2000, help="Samples per vehicle and day")
+    parser.add_argument("--broken", type=float, default=0.001, help="Fraction of truncated lines")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as root:
+        directories = {}
+        for vehicle in range(args.vehicles):
+            directory = os.path.join(root, f"vehicle-{vehicle + 1}")
+            os.makedirs(directory)
+            directories[os.path.basename(directory)] = directory
+            for day in range(args.days):
+                start = 1704067200 + day * 86400
+                writeDay(os.path.join(directory, time.strftime("%d-%m-%Y.txt", time.gmtime(start))),
+                         start, args.samples, rng, args.broken)
+
+        timings = {}
+        for name, cache in (("parse", False), ("parse + cache", True), ("cached", True)):
+            start = time.perf_counter()
+            fleet = Fleet.load(directories, cache=cache)
+            timings[name] = time.perf_counter() - start
+        start = time.perf_counter()
+        summary = fleet.summary()
+        timings["summary"] = time.perf_counter() - start
+
+    print(f"{len(fleet)} samples, {args.vehicles} vehicles x {args.days} days, "
+          f"{sum(row['malformed'] for row in summary)} malformed lines")
+    for name, seconds in timings.items():
+        print(f"{name:14} {seconds:8.3f} s  {len(fleet) / seconds / 1e6:8.2f} M samples/s")
+    print(json.dumps(summary[0]))
+
+if __name__ == "__main__":
+    main()
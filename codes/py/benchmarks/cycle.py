@@ -0,0 +1,173 @@
+"""
+End-to-end latency of the tracking cycle against the simulated modem and Nano.
+
+Every cycle does what one iteration of the RPi+Arduino.py loop does: read
+a fix, exchange a status with the Nano, push the sample through the
+compressor into the queue, PUT the live location and upload the Firestore
+backlog when the upload policy says so. No waiting between cycles, so the
+numbers are the cost of the work itself.
+
+    python3 benchmarks/cycle.py --cycles 50 --latency 0.02 --action-latency 0.3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SIMA7672S import SIMA7672S
+from simulator import ModemSimulator, NanoSimulator
+from tracker import ArduinoLink, BatchBuilder, Sample, SampleStore, TrajectoryCompressor, UploadPolicy
+
+FIREBASE_URL = "https://example-rtdb.firebaseio.com/VehicleLocation/bench.json"
+FIRESTORE_URL = "https://firestore.googleapis.com/v1/projects/bench/databases/(default)/documents:commit"
+DOCUMENT_ROOT = "projects/bench/databases/(default)/documents/vehicles/bench/tracking"
+
+def runCycle(sim, arduino, store, compressor, batcher, policy):
+    """
+    One tracking cycle.
+
+    :return: True if the Firestore backlog was uploaded in this cycle
+    """
+    fix = sim.GNSS.getFix()
+    latitude, longitude = sim.GNSS.getFormattedLatLon(fix)
+    status = arduino.request(1, 1, 0)
+    sample = Sample(time.time(), latitude, longitude, fix.speed if fix else 0.0,
+                    *(getattr(status, name) if status else 0
+                      for name in ("alcoholValue", "alcoholDetected", "fuelLevel", "keyState", "error")))
+    for kept in compressor.push(sample):
+        store.append(kept)
+
+    uploaded = False
+    with sim.HTTP.Session() as session:
+        live = json.dumps({"timestamp": sample.timeStamp(), "latitude": latitude, "longitude": longitude,
+                           "speed": sample.speed, "fuelLevel": sample.fuelLevel, "keyState": sample.keyState})
+        httpResponse = session.SendRequest(FIREBASE_URL, sim.HTTP.HTTPRequest.PUT, live)
+        if httpResponse:
+            session.ReadResponse(httpResponse[2])
+
+        oldest = store.peek(1)
+        if policy.due(len(store), oldest[0].timestamp if oldest else None):
+            for kept in compressor.flush():
+                store.append(kept)
+            uploaded = True
+            for batch in batcher.batches(store.peek(500)):
+                httpResponse = session.SendRequest(FIRESTORE_URL, sim.HTTP.HTTPRequest.POST, batch.body)
+                if not httpResponse or httpResponse[1] != 200:
+                    uploaded = False
+                    break
+                session.ReadResponse(httpResponse[2])
+                store.commit(batch.lastSeq)
+                batcher.record(batch)
+            if uploaded:
+                policy.uploaded()
+    return uploaded
+
+def summarize(name: str, cycles: list):
+    """
+    :param cycles: List of (seconds, round trips, bytes out, bytes in) per cycle
+    :return: Dictionary of statistics
+    """
+    latency = sorted(cycle[0] for cycle in cycles)
+    return {
+        "name": name,
+        "cycles": len(cycles),
+        "mean_s": statistics.fmean(latency),
+        "p50_s": latency[len(latency) // 2],
+        "p95_s": latency[min(len(latency) - 1, int(len(latency) * 0.95))],
+        "max_s": latency[-1],
+        "round_trips": statistics.fmean(cycle[1] for cycle in cycles),
+        "bytes_out": statistics.fmean(cycle[2] for cycle in cycles),
+        "bytes_in": statistics.fmean(cycle[3] for cycle in cycles),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=50)
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay before each AT answer in seconds")
+    parser.add_argument("--action-latency", type=float, default=0.1, help="Server round trip in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an ERROR answer")
+    parser.add_argument("--speed", type=float, default=40.0, help="Simulated speed in km/h")
+    parser.add_argument("--time-scale", type=float, default=30.0, help="Simulated seconds per real second")
+    parser.add_argument("--upload-depth", type=int, default=10, help="Pending samples that trigger an upload")
+    parser.add_argument("--upload-age", type=float, default=2.0, help="Backlog age in seconds that triggers an upload")
+    parser.add_argument("--nmea", action="store_true", help="Stream NMEA instead of polling AT+CGNSSINFO")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--metrics", help="Write the driver metrics to this file (.json or Prometheus text)")
+    parser.add_argument("--timeline", action="store_true", help="Print the timeline of the slowest cycle")
+    args = parser.parse_args()
+
+    modem = ModemSimulator(args.baudrate, args.latency, args.action_latency, args.error_rate,
+                           speed=args.speed, time_scale=args.time_scale, seed=args.seed)
+    nano = NanoSimulator(stream_period=0)
+    sim = SIMA7672S(modem.port, args.baudrate)
+    arduino = ArduinoLink(nano.port)
+    arduino.request(1, 1, 1, ArduinoLink.ADDRESS)
+    if args.nmea:
+        sim.GNSS.StartStreaming()
+        while not sim.GNSS.getFix():
+            time.sleep(0.1)
+
+    results = []
+    with tempfile.TemporaryDirectory() as path:
+        store = SampleStore(path)
+        compressor = TrajectoryCompressor()
+        batcher = BatchBuilder(DOCUMENT_ROOT)
+        policy = UploadPolicy(args.upload_depth, args.upload_age)
+        cycles = {False: [], True: []}
+        slowest = (0.0, None)
+        for _ in range(args.cycles):
+            before = modem.stats()
+            nano_before = nano.stats()
+            start = time.perf_counter()
+            sim.metrics.startCycle()
+            uploaded = runCycle(sim, arduino, store, compressor, batcher, policy)
+            timeline = sim.metrics.endCycle()
+            elapsed = time.perf_counter() - start
+            slowest = max(slowest, (elapsed, timeline), key=lambda item: item[0])
+            after = modem.stats()
+            nano_after = nano.stats()
+            # Bytes out and in as seen from the Raspberry Pi
+            cycles[uploaded].append((elapsed, after["round_trips"] - before["round_trips"],
+                                     after["bytes_in"] - before["bytes_in"] + nano_after["bytes_in"] - nano_before["bytes_in"],
+                                     after["bytes_out"] - before["bytes_out"] + nano_after["bytes_out"] - nano_before["bytes_out"]))
+        sim.HTTP.Session().Close()
+        store.close()
+        results.append(summarize("all", cycles[False] + cycles[True]))
+        for name, uploaded in (("live only", False), ("with upload", True)):
+            if cycles[uploaded]:
+                results.append(summarize(name, cycles[uploaded]))
+
+    if args.metrics:
+        sim.metrics.write(args.metrics)
+    sim.Close()
+    arduino.close()
+    modem.close()
+    nano.close()
+
+    if args.json:
+        print(json.dumps({"results": results, "commands": modem.stats()["commands"],
+                          "compression": compressor.ratio(), "bytes_per_sample": batcher.bytesPerSample()}, indent=2))
+        return
+    print(f"{'cycles':<12} {'n':>4} {'mean s':>8} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'AT/cycle':>9} "
+          f"{'tx B':>8} {'rx B':>8}")
+    for result in results:
+        print(f"{result['name']:<12} {result['cycles']:>4} {result['mean_s']:>8.3f} {result['p50_s']:>8.3f} "
+              f"{result['p95_s']:>8.3f} {result['max_s']:>8.3f} {result['round_trips']:>9.1f} "
+              f"{result['bytes_out']:>8.0f} {result['bytes_in']:>8.0f}")
+    print(f"AT commands: {', '.join(f'{name} {count}' for name, count in sorted(modem.stats()['commands'].items()))}")
+    if args.timeline and slowest[1]:
+        print(f"Slowest cycle, {slowest[0]:.3f} s:")
+        for name, start, duration in slowest[1]:
+            print(f"{start:8.3f} {duration:8.3f}  {name}")
+    print(f"Track compression {compressor.ratio():.2f}, {batcher.bytesPerSample():.1f} bytes/sample uploaded, "
+          f"{modem.stats()['errors']} injected errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Time per fix of the geofence check with many zones.
+
+Places random circle and polygon zones around a city, drives random fixes
+through Geofence.update() and compares the grid index with testing every
+zone, including a check that both find the same zones.
+
+    python3 benchmarks/geofence.py --zones 500 --fixes 20000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker import CircleZone, Geofence, PolygonZone
+
+CENTRE = (12.9716, 77.5946)
+
+def randomZones(count: int, spread: float, rng: random.Random):
+    zones = []
+    for i in range(count):
+        latitude = CENTRE[0] + rng.uniform(-spread, spread)
+        longitude = CENTRE[1] + rng.uniform(-spread, spread)
+        size = rng.uniform(100, 1500)
+        if i % 2:
+            zones.append(CircleZone(f"circle-{i}", latitude, longitude, size))
+        else:
+            corners = rng.randint(4, 12)
+            radius = size / 111320
+            points = [(latitude + radius * rng.uniform(0.5, 1) * math.cos(2 * math.pi * k / corners),
+                       longitude + radius * rng.uniform(0.5, 1) * math.sin(2 * math.pi * k / corners))
+                      for k in range(corners)]
+            zones.append(PolygonZone(f"polygon-{i}", points))
+    return zones
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--zones", type=int, default=500)
+    parser.add_argument("--fixes", type=int, default=20000)
+    parser.add_argument("--spread", type=float, default=0.2, help="Half width of the area in degrees")
+    parser.add_argument("--cell-size", type=float, default=0.01, help="Grid cell size in degrees")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    zones = randomZones(args.zones, args.spread, rng)
+    start = time.perf_counter()
+    geofence = Geofence(zones, args.cell_size)
+    build = time.perf_counter() - start
+    fixes = [(CENTRE[0] + rng.uniform(-args.spread, args.spread), CENTRE[1] + rng.uniform(-args.spread, args.spread))
+             for _ in range(args.fixes)]
+
+    events = 0
+    start = time.perf_counter()
+    for latitude, longitude in fixes:
+        events += len(geofence.update(latitude, longitude))
+    indexed = (time.perf_counter() - start) / len(fixes)
+
+    start = time.perf_counter()
+    expected = [{zone.name for zone in zones if zone.contains(latitude, longitude)} for latitude, longitude in fixes]
+    scan = (time.perf_counter() - start) / len(fixes)
+    mismatches = sum({zone.name for zone in geofence.zonesAt(*fix)} != names for fix, names in zip(fixes, expected))
+
+    print(f"{len(geofence)} zones in {len(geofence.grid)} cells, index built in {build * 1000:.1f} ms")
+    print(f"grid index  {indexed * 1e6:8.1f} us/fix  ({events} events)")
+    print(f"full scan   {scan * 1e6:8.1f} us/fix")
+    print(f"mismatches  {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Sampling and Arduino cadence of a VehicleSession while the server is slow.
+
+Runs the session's pipeline against the simulated modem and Nano with a
+long HTTP round trip and reports how far apart the samples and the
+status exchanges with the Nano were, next to the intervals they should
+keep. With the stages decoupled both stay on time however slow the
+uploads are.
+
+    python3 benchmarks/pipeline.py --seconds 30 --action-latency 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import ModemSimulator, NanoSimulator
+from tracker import VehicleSession
+
+ADDRESS = 123
+DOCUMENT = {"fields": {"VehicleDetails": {"mapValue": {"fields": {
+    "assignedTo": {"integerValue": "1"}, "FingerprintSensorAddress": {"integerValue": str(ADDRESS)}}}}}}
+
+def timed(function, stamps: list):
+    def wrapper(*args, **kwargs):
+        stamps.append(time.monotonic())
+        return function(*args, **kwargs)
+    return wrapper
+
+def gaps(stamps: list):
+    return [b - a for a, b in zip(stamps, stamps[1:])] or [0.0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--action-latency", type=float, default=5.0, help="Server round trip in seconds")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between samples")
+    parser.add_argument("--upload-depth", type=int, default=5, help="Pending samples that trigger an upload")
+    args = parser.parse_args()
+
+    modem = ModemSimulator(action_latency=args.action_latency, response_body=json.dumps(DOCUMENT).encode())
+    nano = NanoSimulator(address=ADDRESS, stream_period=0)
+    with tempfile.TemporaryDirectory() as path:
+        vehicle = VehicleSession("bench", "bench", modem.port, nano.port, queue_path=os.path.join(path, "queue"),
+                                 debug=False, CONFIG_FILE=os.path.join(path, "config.json"),
+                                 LAST_FIX_FILE=os.path.join(path, "lastfix.json"),
+                                 MIN_SAMPLE_INTERVAL=args.sample_interval, MAX_SAMPLE_INTERVAL=args.sample_interval,
+                                 UPLOAD_DEPTH=args.upload_depth)
+        vehicle.start()
+        samples, exchanges, uploads = [], [], []
+        vehicle.updateDATA = timed(vehicle.updateDATA, samples)
+        vehicle.readArduino = timed(vehicle.readArduino, exchanges)
+        vehicle.upload = timed(vehicle.upload, uploads)
+        timer = threading.Timer(args.seconds, vehicle.stop)
+        timer.start()
+        sys.stdout = open(os.devnull, "w")
+        try:
+            vehicle.run()
+        finally:
+            sys.stdout.close()
+            sys.stdout = sys.__stdout__
+            vehicle.close()
+    modem.close()
+    nano.close()
+
+    print(f"{'stage':<10} {'n':>5} {'target s':>9} {'mean s':>8} {'max s':>8}")
+    for name, stamps, target in (("sample", samples, args.sample_interval),
+                                 ("arduino", exchanges, VehicleSession.ARDUINO_PERIOD)):
+        print(f"{name:<10} {len(stamps):>5} {target:>9.2f} {statistics.fmean(gaps(stamps)):>8.2f} "
+              f"{max(gaps(stamps)):>8.2f}")
+    print(f"{len(uploads)} upload passes, {vehicle.dropped} samples dropped, "
+          f"HTTP round trip {args.action_latency:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Upload time against body size for the legacy and the flow-controlled
+AT+HTTPDATA paths.
+
+The modem side is the simulator, it accepts the body at the line rate of
+the configured baudrate, so the numbers reflect the driver's pacing and not
+the cellular link.
+
+    python3 benchmarks/upload.py --sizes 1024 4096 20480 --baudrate 115200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SIMA7672S import SIMA7672S
+from simulator import ModemSimulator
+
+def legacyUpload(sim: SIMA7672S, data: str, chunk_size: int = 256):
+    """
+    Body upload as done before the flow-controlled path: 256 character
+    chunks, 0.2 s between chunks and an unconditional 3 s at the end.
+    """
+    time.sleep(0.2)
+    sim.SendAT(f"AT+HTTPDATA={len(data)},5000", 5, "DOWNLOAD")
+    time.sleep(0.2)
+    for i in range(0, len(data), chunk_size):
+        sim.ser.write(data[i:i+chunk_size].encode())
+        time.sleep(0.2)
+    sim.ReadSerial(5, "OK")
+    time.sleep(3)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4096, 20480])
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only measure the new path")
+    args = parser.parse_args()
+
+    modem = ModemSimulator(args.baudrate)
+    sim = SIMA7672S(modem.port, args.baudrate)
+    sim.SendAT("AT+HTTPINIT", 1)
+    wire = 10 / args.baudrate
+    print(f"{'bytes':>8} {'wire s':>8} {'legacy s':>9} {'new s':>8}")
+    for size in args.sizes:
+        data = "x" * size
+        legacy = float("nan")
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            legacyUpload(sim, data)
+            legacy = time.perf_counter() - start
+        start = time.perf_counter()
+        if not sim.HTTP.uploadData(data):
+            print(f"{size}: upload failed")
+        new = time.perf_counter() - start
+        print(f"{size:>8} {size * wire:>8.3f} {legacy:>9.3f} {new:>8.3f}")
+    sim.SendAT("AT+HTTPTERM", 1)
+    sim.Close()
+    modem.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Run several vehicles, each with its own SIMA7672S and Arduino Nano, from one process.
+
+    python3 gateway.py --project your-firebase-project-id \\
+        --vehicle bench-1 /dev/ttyUSB0 /dev/ttyUSB1 \\
+        --vehicle bench-2 /dev/ttyUSB2 /dev/ttyUSB3
+
+Every vehicle gets its own sample queue (queue/<vehicle>), metrics file
+(metrics/<vehicle>.prom), configuration cache (config/<vehicle>.json) and
+last fix (state/<vehicle>.json), the Firestore uploads of all vehicles are
+batched together.
+"""
+import argparse
+import signal
+import sys
+from tracker import BufferedLog, Gateway, VehicleSession
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--project", required=True, help="Firebase project ID")
+    parser.add_argument("--vehicle", nargs=3, action="append", required=True, metavar=("ID", "MODEM", "ARDUINO"),
+                        help="Vehicle ID, modem port and Arduino port, repeat for every vehicle")
+    parser.add_argument("--upload-interval", type=float, default=30, help="Seconds between shared uploads")
+    parser.add_argument("--quiet", action="store_true", help="Don't echo the modem traffic")
+    args = parser.parse_args()
+
+    sys.stdout = BufferedLog("output")
+    sessions = [VehicleSession(vehicle_id, args.project, modem, arduino, queue_path=f"queue/{vehicle_id}",
+                               metrics_file=f"metrics/{vehicle_id}.prom", shared_upload=True, debug=not args.quiet,
+                               CONFIG_FILE=f"config/{vehicle_id}.json", LAST_FIX_FILE=f"state/{vehicle_id}.json")
+                for vehicle_id, modem, arduino in args.vehicle]
+    gateway = Gateway(sessions, args.upload_interval)
+    signal.signal(signal.SIGTERM, lambda signum, frame: gateway.stop())
+    try:
+        gateway.run()
+    except KeyboardInterrupt:
+        print("Shutting down gracefully...")
+    finally:
+        sys.stdout.close()
+        sys.stdout = sys.__stdout__
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+from .modem import ModemSimulator
+from .nano import NanoSimulator
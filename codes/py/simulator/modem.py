@@ -0,0 +1,290 @@
+import math
+import os
+import random
+import threading
+import time
+import tty
+from collections import Counter
+from SIMA7672S.nmea import checksum
+
+KNOTS_TO_KMH = 1.852
+METRES_PER_DEGREE = 111320.0
+
+class ModemSimulator:
+    """
+    SIMA7672S stand-in on a pty.
+
+    Answers the AT commands the driver uses: GNSS power and start modes,
+    AT+CGNSSINFO with a vehicle driving a straight line, the HTTP service
+    (HTTPINIT/HTTPPARA/HTTPDATA/HTTPACTION/HTTPREAD/HTTPHEAD/HTTPTERM) and
+    the PDP context (AT+CGACT). After AT+CGNSSTST=1 RMC, GGA, GSA and VTG
+    sentences of the same track are sent nmea_rate times a second. Bytes
+    are paced at the line rate of the configured baudrate in both
+    directions, every command waits latency seconds before it is answered
+    and the +HTTPACTION result follows action_latency after the OK.
+
+    Every command is counted by name and all bytes are counted per
+    direction, see stats().
+    """
+
+    def __init__(self, baudrate: int = 115200, latency: float = 0.0, action_latency: float = 0.1,
+                 error_rate: float = 0.0, http_status: int = 200, response_body: bytes = b"{}",
+                 speed: float = 40.0, course: float = 90.0, time_scale: float = 1.0,
+                 nmea_rate: float = 1.0, echo: bool = True, seed: int = None):
+        """
+        Create the pty and start answering.
+
+        :param baudrate: Line rate in baud, 0 disables pacing
+        :param latency: Delay in seconds before each command is answered
+        :param action_latency: Time in seconds between AT+HTTPACTION and its +HTTPACTION result
+        :param error_rate: Probability that a command is answered with ERROR
+        :param http_status: Status code reported for HTTP actions
+        :param response_body: Body returned by AT+HTTPREAD
+        :param speed: Simulated vehicle speed in km/h
+        :param course: Simulated course over ground in degrees
+        :param time_scale: Simulated seconds per real second for the vehicle track
+        :param nmea_rate: NMEA epochs per second after AT+CGNSSTST=1
+        :param echo: Echo commands back like the modem does after ATE1
+        :param seed: Seed for error injection
+        """
+        self.byte_time = 10 / baudrate if baudrate else 0.0
+        self.latency = latency
+        self.action_latency = action_latency
+        self.error_rate = error_rate
+        self.http_status = http_status
+        self.response_body = response_body
+        self.speed = speed
+        self.course = course
+        self.time_scale = time_scale
+        self.nmea_rate = nmea_rate
+        self.nmea = False
+        self.echo = echo
+        self.random = random.Random(seed)
+        self.origin = (12.9716, 77.5946)
+        self.started = time.monotonic()
+        self.fix = True
+        self.pdp_active = True
+        self.coverage = True
+        self.http_active = False
+        self.failures = Counter()
+        self.commands = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+        self.writeLock = threading.Lock()
+
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.slave = slave
+        self.port = os.ttyname(slave)
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="ModemSimulator", daemon=True)
+        self.thread.start()
+        self.nmeaThread = threading.Thread(target=self.__streamNMEA, name="ModemSimulator-nmea", daemon=True)
+        self.nmeaThread.start()
+
+    def inject(self, command: str, count: int = 1):
+        """
+        Answer the next count occurrences of a command with ERROR.
+
+        :param command: Command name, e.g. "AT+HTTPACTION"
+        """
+        self.failures[command] += count
+
+    def setCoverage(self, available: bool):
+        """
+        Enter or leave a dead zone. Without coverage AT+CSQ reports no
+        signal, the PDP context is dropped and can't be activated, and HTTP
+        actions fail with status 706.
+        """
+        self.coverage = available
+        if not available:
+            self.pdp_active = False
+
+    def stats(self):
+        """
+        :return: Dictionary with the command counts, bytes received and sent, and injected errors
+        """
+        return {"commands": dict(self.commands), "round_trips": sum(self.commands.values()),
+                "bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "errors": self.errors}
+
+    def position(self):
+        """
+        :return: Current (latitude, longitude) of the simulated vehicle
+        """
+        distance = self.speed / 3.6 * (time.monotonic() - self.started) * self.time_scale
+        latitude = self.origin[0] + distance * math.cos(math.radians(self.course)) / METRES_PER_DEGREE
+        longitude = self.origin[1] + distance * math.sin(math.radians(self.course)) / (
+            METRES_PER_DEGREE * math.cos(math.radians(self.origin[0])))
+        return latitude, longitude
+
+    def close(self):
+        """
+        Stop answering and close the pty.
+        """
+        self.running = False
+        os.close(self.slave)
+        self.thread.join(1)
+        os.close(self.master)
+
+    def __write(self, data: bytes):
+        with self.writeLock:
+            time.sleep(len(data) * self.byte_time)
+            self.bytes_out += len(data)
+            os.write(self.master, data)
+
+    def __reply(self, *lines: str | bytes):
+        self.__write(b"".join(b"\r\n" + (line if isinstance(line, bytes) else line.encode()) + b"\r\n"
+                              for line in lines))
+
+    def __result(self, line: str):
+        if self.running:
+            self.__reply(line)
+
+    def __run(self):
+        buffer = b""
+        pending = 0
+        while self.running:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            time.sleep(len(data) * self.byte_time)
+            self.bytes_in += len(data)
+            buffer += data
+            while buffer:
+                if pending:
+                    # Body of AT+HTTPDATA
+                    taken = min(pending, len(buffer))
+                    buffer = buffer[taken:]
+                    pending -= taken
+                    if not pending:
+                        self.__reply("OK")
+                    continue
+                if b"\r" not in buffer:
+                    break
+                line, buffer = buffer.split(b"\r", 1)
+                buffer = buffer.lstrip(b"\n")
+                command = line.strip().decode(errors="replace")
+                if command:
+                    pending = self.__command(command)
+
+    def __command(self, command: str):
+        if self.echo:
+            self.__write(command.encode() + b"\r")
+        name = command.split("=")[0].rstrip("?")
+        self.commands[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failures[name]:
+            self.failures[name] -= 1
+            self.errors += 1
+            self.__reply("ERROR")
+            return 0
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            self.__reply("ERROR")
+            return 0
+        argument = command[len(name) + 1:] if "=" in command else ""
+
+        if name == "AT+CGNSSINFO":
+            self.__reply(self.__gnssInfo(), "OK")
+        elif name == "AT+CGNSSPWR":
+            self.__reply("OK")
+            if argument == "1":
+                self.__reply("+CGNSSPWR: READY!")
+        elif name == "AT+CGACT":
+            if command.endswith("?"):
+                self.__reply(f"+CGACT: 1,{int(self.pdp_active)}", "OK")
+            elif argument.startswith("1") and not self.coverage:
+                self.__reply("ERROR")
+            else:
+                self.pdp_active = argument.startswith("1")
+                self.__reply("OK")
+        elif name == "AT+CGNSSTST":
+            self.nmea = argument == "1"
+            self.__reply("OK")
+        elif name == "AT+CSQ":
+            self.__reply("+CSQ: 20,99" if self.coverage else "+CSQ: 99,99", "OK")
+        elif name == "AT+HTTPINIT":
+            self.__reply("ERROR" if self.http_active else "OK")
+            self.http_active = True
+        elif name == "AT+HTTPTERM":
+            self.__reply("OK" if self.http_active else "ERROR")
+            self.http_active = False
+        elif name == "AT+HTTPPARA":
+            self.__reply("OK" if self.http_active else "ERROR")
+        elif name == "AT+HTTPDATA":
+            if not self.http_active:
+                self.__reply("ERROR")
+                return 0
+            self.__reply("DOWNLOAD")
+            return int(argument.split(",")[0])
+        elif name == "AT+HTTPACTION":
+            if not self.http_active:
+                self.__reply("ERROR")
+                return 0
+            self.__reply("OK")
+            status = self.http_status if self.pdp_active else 706
+            length = len(self.response_body) if self.pdp_active else 0
+            # Like the module, other commands are answered while the request is in flight
+            timer = threading.Timer(self.action_latency, self.__result, (f"+HTTPACTION: {argument},{status},{length}",))
+            timer.daemon = True
+            timer.start()
+        elif name == "AT+HTTPREAD":
+            offset, size = (int(value) for value in (["0"] + argument.split(","))[-2:])
+            chunk = self.response_body[offset:offset + size]
+            if chunk:
+                self.__reply("OK", f"+HTTPREAD: {len(chunk)}".encode() + b"\r\n" + chunk, "+HTTPREAD: 0")
+            else:
+                self.__reply("OK", "+HTTPREAD: 0")
+        elif name == "AT+HTTPHEAD":
+            header = f"HTTP/1.1 {self.http_status}\r\ncontent-length: {len(self.response_body)}\r\n".encode()
+            self.__reply(f"+HTTPHEAD: {len(header)}".encode() + b"\r\n" + header, "OK")
+        elif name in ("AT", "ATE0", "ATE1", "AT+CSCLK", "AT+IFC", "AT+CGPSCOLD", "AT+CGPSWARM", "AT+CGPSHOT",
+                      "AT+CGNSSPORTSWITCH"):
+            self.__reply("OK")
+        else:
+            self.__reply("ERROR")
+        return 0
+
+    def __gnssInfo(self):
+        if not self.fix:
+            return "+CGNSSINFO: ,,,,,,,,,,,,,,,,"
+        latitude, longitude = self.position()
+        now = time.gmtime()
+        return (f"+CGNSSINFO: 3,10,4,6,2,{abs(latitude):.7f},{'N' if latitude >= 0 else 'S'},"
+                f"{abs(longitude):.7f},{'E' if longitude >= 0 else 'W'},{time.strftime('%d%m%y', now)},"
+                f"{time.strftime('%H%M%S', now)}.0,920.5,{self.speed / KNOTS_TO_KMH:.2f},{self.course:.1f},"
+                f"1.2,0.8,0.9")
+
+    def __streamNMEA(self):
+        while self.running:
+            time.sleep(1 / self.nmea_rate)
+            if self.nmea and self.running:
+                try:
+                    self.__write(b"".join(self.__nmeaSentences()))
+                except OSError:
+                    break
+
+    def __nmeaSentences(self):
+        now = time.time()
+        utc = time.strftime("%H%M%S", time.gmtime(now)) + f".{int(now * 100) % 100:02d}"
+        date = time.strftime("%d%m%y", time.gmtime(now))
+        knots = self.speed / KNOTS_TO_KMH
+        if self.fix:
+            latitude, longitude = self.position()
+            lat = f"{int(abs(latitude)):02d}{abs(latitude) % 1 * 60:08.5f},{'N' if latitude >= 0 else 'S'}"
+            lon = f"{int(abs(longitude)):03d}{abs(longitude) % 1 * 60:08.5f},{'E' if longitude >= 0 else 'W'}"
+            bodies = (f"GNRMC,{utc},A,{lat},{lon},{knots:.2f},{self.course:.1f},{date},,,A",
+                      f"GNGGA,{utc},{lat},{lon},1,10,0.8,920.5,M,-86.0,M,,",
+                      "GNGSA,A,3,01,03,08,11,14,17,19,22,28,32,,,1.2,0.8,0.9,1",
+                      "GNGSA,A,3,65,66,72,81,,,,,,,,,1.2,0.8,0.9,2",
+                      f"GNVTG,{self.course:.1f},T,,M,{knots:.2f},N,{self.speed:.2f},K,A")
+        else:
+            bodies = (f"GNRMC,{utc},V,,,,,,,{date},,,N",
+                      f"GNGGA,{utc},,,,,0,00,99.9,,,,,,",
+                      "GNGSA,A,1,,,,,,,,,,,,,99.9,99.9,99.9,1")
+        return [f"${body}*{checksum(body.encode()):02X}\r\n".encode() for body in bodies]
@@ -0,0 +1,133 @@
+import os
+import random
+import threading
+import time
+import tty
+from tracker.arduino import ArduinoLink, Status
+
+class NanoSimulator:
+    """
+    Arduino Nano stand-in on a pty, speaking the framed link protocol.
+
+    Commands are answered with an ADDRESS frame until a command with
+    initializedSystem set arrives, then with STATUS frames. Once
+    initialized, the status is streamed on every change made through
+    set() and every stream_period seconds.
+    """
+
+    def __init__(self, baudrate: int = 57600, address: int = 0xFFFFFFFF, stream_period: float = 1.0,
+                 corrupt_rate: float = 0.0, seed: int = None):
+        """
+        Create the pty and start answering.
+
+        :param baudrate: Line rate in baud, 0 disables pacing
+        :param address: FingerprintSensorAddress the reported ADDRESS frames match
+        :param stream_period: Seconds between streamed STATUS frames, 0 disables streaming
+        :param corrupt_rate: Probability that a sent frame has one byte flipped
+        :param seed: Seed for corruption
+        """
+        self.byte_time = 10 / baudrate if baudrate else 0.0
+        self.address = address
+        self.stream_period = stream_period
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+        self.status = {"alcoholValue": 120, "alcoholDetected": 0, "ignitionState": 1, "validFingerprintFound": 1,
+                       "fingerprintVerified": 1, "fuelLevel": 80, "keyState": 1, "error": 0}
+        self.initialized = False
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.slave = slave
+        self.port = os.ttyname(slave)
+        self.running = True
+        self.threads = [threading.Thread(target=self.__run, name="NanoSimulator", daemon=True),
+                        threading.Thread(target=self.__stream, name="NanoSimulator-stream", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def set(self, **fields):
+        """
+        Change status fields, e.g. set(keyState=0). Streams the new status.
+        """
+        with self.lock:
+            self.status.update(fields)
+        self.changed.set()
+
+    def stats(self):
+        """
+        :return: Dictionary with frame and byte counts per direction
+        """
+        return {"frames_in": self.frames_in, "frames_out": self.frames_out,
+                "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+
+    def close(self):
+        """
+        Stop answering and close the pty.
+        """
+        self.running = False
+        self.changed.set()
+        os.close(self.slave)
+        for thread in self.threads:
+            thread.join(1)
+        os.close(self.master)
+
+    def __send(self, type: int, payload: bytes):
+        frame = bytearray(ArduinoLink.frame(type, payload))
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            frame[self.random.randrange(1, len(frame))] ^= 0xFF
+        with self.lock:
+            time.sleep(len(frame) * self.byte_time)
+            self.frames_out += 1
+            self.bytes_out += len(frame)
+            os.write(self.master, frame)
+
+    def __sendStatus(self):
+        with self.lock:
+            payload = Status.FORMAT.pack(*(self.status[name] for name in Status.__slots__))
+        self.__send(ArduinoLink.STATUS, payload)
+
+    def __run(self):
+        buffer = b""
+        while self.running:
+            try:
+                data = os.read(self.master, 64)
+            except OSError:
+                break
+            if not data:
+                break
+            self.bytes_in += len(data)
+            buffer += data
+            while True:
+                start = buffer.find(bytes((ArduinoLink.SOF,)))
+                if start < 0:
+                    buffer = b""
+                    break
+                buffer = buffer[start:]
+                if len(buffer) < 2 or len(buffer) < buffer[1] + 4:
+                    break
+                length = buffer[1]
+                frame, buffer = buffer[:length + 4], buffer[length + 4:]
+                if ArduinoLink.crc8(frame[1:-1]) != frame[-1] or frame[2] != ArduinoLink.COMMAND or length != 3:
+                    continue
+                self.frames_in += 1
+                initializedSystem, _, ignitionState = frame[3:6]
+                if not self.initialized:
+                    self.initialized = bool(initializedSystem)
+                    self.__send(ArduinoLink.ADDRESS, self.address.to_bytes(4, "big"))
+                    continue
+                with self.lock:
+                    self.status["ignitionState"] = ignitionState
+                self.__sendStatus()
+
+    def __stream(self):
+        while self.running:
+            changed = self.changed.wait(self.stream_period or None)
+            self.changed.clear()
+            if self.running and self.initialized and (changed or self.stream_period):
+                self.__sendStatus()
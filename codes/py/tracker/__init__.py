@@ -0,0 +1,12 @@
+from .arduino import ArduinoLink, Status
+from .batching import Batch, BatchBuilder
+from .compress import TrajectoryCompressor
+from .config import VehicleConfig
+from .gateway import Gateway
+from .geofence import CircleZone, Geofence, PolygonZone
+from .live import LiveSync
+from .logger import BufferedLog
+from .scheduler import SamplingScheduler, UploadPolicy
+from .startup import LastFix, Startup
+from .store import Sample, SampleStore
+from .vehicle import VehicleSession
@@ -0,0 +1,218 @@
+import queue
+import struct
+import threading
+import serial
+
+class Status:
+    """
+    Sensor and ignition state reported by the Arduino Nano.
+    """
+
+    __slots__ = ("alcoholValue", "alcoholDetected", "ignitionState", "validFingerprintFound",
+                 "fingerprintVerified", "fuelLevel", "keyState", "error")
+
+    FORMAT = struct.Struct("<hBBBBBBB")
+    EVENTS = {"ignitionState": "ignition", "keyState": "key", "alcoholDetected": "alcohol"}
+
+    def __init__(self, payload: bytes):
+        """
+        :param payload: The 9-byte toRPi structure
+        """
+        (self.alcoholValue, self.alcoholDetected, self.ignitionState, self.validFingerprintFound,
+         self.fingerprintVerified, self.fuelLevel, self.keyState, self.error) = self.FORMAT.unpack(payload)
+
+    def __repr__(self):
+        return "Status(" + ", ".join(f"{name}={getattr(self, name)}" for name in self.__slots__) + ")"
+
+    def events(self, previous):
+        """
+        List the events between a previous status and this one.
+
+        :param previous: Earlier Status or None
+        :return: List of event names ("ignition", "key", "alcohol")
+        """
+        if previous is None:
+            return []
+        return [event for name, event in self.EVENTS.items() if getattr(self, name) != getattr(previous, name)]
+
+class ArduinoLink:
+    """
+    Framed, checksummed link to the Arduino Nano.
+
+    Frame layout: SOF (0xA5), payload length, message type, payload, CRC-8
+    (polynomial 0x07) over length, type and payload. A reader thread decodes
+    frames and puts them on per-type queues. Corrupt or truncated frames are
+    dropped and the decoder resynchronizes on the next start byte.
+
+    The Nano answers every COMMAND with a STATUS (or an ADDRESS while the
+    system is not initialized) and streams a STATUS on its own whenever the
+    state changes and at least once a second.
+    """
+
+    SOF = 0xA5
+    MAX_PAYLOAD = 16
+
+    COMMAND = 0x01
+    STATUS = 0x81
+    ADDRESS = 0x82
+
+    def __init__(self, port: str = "/dev/ttyAMA3", baudrate: int = 57600, queue_size: int = 16):
+        """
+        Open the serial port and start the reader thread.
+
+        :param port: Serial port the Nano is connected to
+        :param baudrate: Baudrate for serial communication
+        :param queue_size: Messages kept per type, the oldest are dropped when full
+        """
+        self.ser = serial.Serial(port, baudrate, timeout=0.1)
+        self.queues = {self.STATUS: queue.Queue(queue_size), self.ADDRESS: queue.Queue(queue_size)}
+        self.subscribers = []
+        self.status = None
+        self.crc_errors = 0
+        self.dropped_bytes = 0
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, name="ArduinoLink-reader", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def crc8(data: bytes, crc: int = 0):
+        """
+        CRC-8 with polynomial 0x07, as computed by the Nano.
+        """
+        for byte in data:
+            crc ^= byte
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        return crc
+
+    @classmethod
+    def frame(cls, type: int, payload: bytes):
+        """
+        Build a frame.
+
+        :param type: Message type
+        :param payload: Message payload
+        :return: Encoded frame
+        """
+        header = bytes((len(payload), type))
+        return bytes((cls.SOF,)) + header + payload + bytes((cls.crc8(header + payload),))
+
+    def __run(self):
+        while self.running:
+            try:
+                data = self.ser.read(max(self.ser.in_waiting, 1))
+            except Exception:
+                if not self.running:
+                    break
+                raise
+            if data:
+                self.feed(data)
+
+    def feed(self, data: bytes):
+        """
+        Decode received bytes into messages.
+
+        :param data: Raw bytes received from the Nano
+        """
+        self.buffer += data
+        while True:
+            start = self.buffer.find(self.SOF)
+            if start < 0:
+                self.dropped_bytes += len(self.buffer)
+                self.buffer.clear()
+                return
+            if start:
+                self.dropped_bytes += start
+                del self.buffer[:start]
+            if len(self.buffer) < 2:
+                return
+            length = self.buffer[1]
+            if length > self.MAX_PAYLOAD:
+                self.__resync()
+                continue
+            if len(self.buffer) < length + 4:
+                return
+            frame = bytes(self.buffer[1:length + 3])
+            if self.crc8(frame) != self.buffer[length + 3]:
+                self.crc_errors += 1
+                self.__resync()
+                continue
+            del self.buffer[:length + 4]
+            self.__dispatch(frame[1], frame[2:])
+
+    def __resync(self):
+        # Drop the start byte only, a real frame may begin inside the bad one
+        self.dropped_bytes += 1
+        del self.buffer[:1]
+
+    def __dispatch(self, type: int, payload: bytes):
+        if type == self.STATUS and len(payload) == Status.FORMAT.size:
+            message = Status(payload)
+            previous, self.status = self.status, message
+            for callback in list(self.subscribers):
+                try:
+                    callback(message, previous)
+                except Exception as e:
+                    print(f"Arduino status handler failed: {e}")
+        elif type == self.ADDRESS and len(payload) == 4:
+            # The Nano sends the address in its own (little endian) memory order, but the
+            # FingerprintSensorAddress values in Firestore are these bytes read as big endian
+            message = struct.unpack(">I", payload)[0]
+        else:
+            return
+        messages = self.queues[type]
+        while True:
+            try:
+                messages.put_nowait(message)
+                break
+            except queue.Full:
+                try:
+                    messages.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def subscribe(self, callback):
+        """
+        Register a callback for every STATUS, including streamed ones.
+
+        :param callback: Called as callback(status, previous) from the reader thread
+        """
+        self.subscribers.append(callback)
+
+    def send(self, initializedSystem: int, validFingerprintID: int, ignitionState: int):
+        """
+        Send a COMMAND frame without waiting for the answer.
+        """
+        with self.lock:
+            self.ser.write(self.frame(self.COMMAND, bytes((initializedSystem, validFingerprintID, ignitionState))))
+
+    def request(self, initializedSystem: int, validFingerprintID: int, ignitionState: int,
+                reply: int = STATUS, timeout: float = 2):
+        """
+        Send a COMMAND frame and wait for the reply.
+
+        :param reply: Expected message type, STATUS or ADDRESS
+        :param timeout: Time to wait for the reply in seconds
+        :return: Status, the sensor address as int, or None on timeout
+        """
+        messages = self.queues[reply]
+        while not messages.empty():
+            try:
+                messages.get_nowait()
+            except queue.Empty:
+                break
+        self.send(initializedSystem, validFingerprintID, ignitionState)
+        try:
+            return messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """
+        Stop the reader thread and close the serial port.
+        """
+        self.running = False
+        self.thread.join(1)
+        self.ser.close()
@@ -0,0 +1,173 @@
+import json
+import time
+from .store import Sample
+
+class Batch:
+    """
+    One Firestore documents:commit request body and the samples it carries.
+    """
+
+    __slots__ = ("body", "samples", "writes", "roots")
+
+    def __init__(self, body: bytes, samples: list, writes: int, roots: list = None):
+        self.body = body
+        self.samples = samples
+        self.writes = writes
+        self.roots = roots
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def lastSeq(self):
+        """
+        :return: Sequence number to commit in the SampleStore once the batch is uploaded
+        """
+        return self.samples[-1].seq
+
+    def lastSeqs(self):
+        """
+        :return: Dictionary of document root to the last sequence number of its samples,
+            for batches built by BatchBuilder.mergedBatches
+        """
+        seqs = {}
+        for root, sample in zip(self.roots or [None] * len(self.samples), self.samples):
+            seqs[root] = max(seqs.get(root, -1), sample.seq)
+        return seqs
+
+    @property
+    def bytesPerSample(self):
+        return len(self.body) / len(self.samples) if self.samples else 0.0
+
+class BatchBuilder:
+    """
+    Split pending samples into Firestore commit requests.
+
+    Every sample is appended to the tracking document of its own day with
+    appendMissingElements, one write per day. A batch is closed when adding
+    the next sample would exceed max_bytes or open more than max_writes
+    writes. Samples are serialized once and cached by sequence number, so
+    retrying a failed batch doesn't encode them again, and a body is built
+    by joining the cached pieces instead of dumping the whole structure.
+
+    mergedBatches() packs the samples of several vehicles (document roots)
+    into the same commits, e.g. for a gateway driving many units.
+    """
+
+    def __init__(self, document_root: str, max_bytes: int = 16384, max_writes: int = 20):
+        """
+        Initialize the batch builder.
+
+        :param document_root: Document path the per-day tracking documents live under,
+            e.g. "projects/<project>/databases/(default)/documents/vehicles/<vehicle>/tracking"
+        :param max_bytes: Target maximum body size in bytes
+        :param max_writes: Maximum number of writes per commit
+        """
+        self.document_root = document_root
+        self.max_bytes = max_bytes
+        self.max_writes = max_writes
+        self.encoded = {}
+        self.sent_bytes = 0
+        self.sent_samples = 0
+
+    HEAD = b'{"writes":['
+    TAIL = b"]}"
+    WRITE_TAIL = b"]}}]}}"
+
+    def __writeHead(self, root: str, date: str):
+        document = f"{root}/{date}"
+        return (b'{"transform":{"document":' + json.dumps(document).encode()
+                + b',"fieldTransforms":[{"fieldPath":"data","appendMissingElements":{"values":[')
+
+    def encode(self, sample: Sample, root: str = None):
+        """
+        :param root: Document root the sample belongs to, defaults to document_root
+        :return: The sample's Firestore value as compact JSON bytes
+        """
+        key = (root or self.document_root, sample.seq)
+        data = self.encoded.get(key)
+        if data is None:
+            data = json.dumps(sample.toFirestore(), separators=(",", ":")).encode()
+            if sample.seq >= 0:
+                self.encoded[key] = data
+        return data
+
+    def release(self, seq: int, root: str = None):
+        """
+        Drop cached encodings up to and including seq, call after a commit.
+
+        :param root: Document root the sequence number belongs to, defaults to document_root
+        """
+        root = root or self.document_root
+        for key in [key for key in self.encoded if key[0] == root and key[1] <= seq]:
+            del self.encoded[key]
+
+    def batches(self, samples: list):
+        """
+        Split samples into batches in sequence order.
+
+        :param samples: Samples as returned by SampleStore.peek
+        :return: Generator of Batch objects
+        """
+        return self.__build((self.document_root, sample) for sample in samples)
+
+    def mergedBatches(self, groups: list):
+        """
+        Split the samples of several vehicles into shared batches.
+
+        :param groups: List of (document root, samples) tuples, samples in sequence order
+        :return: Generator of Batch objects with roots set, see Batch.lastSeqs
+        """
+        return self.__build((root, sample) for root, samples in groups for sample in samples)
+
+    def __build(self, items):
+        parts = []
+        size = len(self.HEAD) + len(self.TAIL)
+        batch = []
+        roots = []
+        document = None
+        writes = 0
+        for root, sample in items:
+            data = self.encode(sample, root)
+            sample_document = (root, time.strftime("%d-%m-%Y", time.localtime(sample.timestamp)))
+            new_write = sample_document != document
+            extra = len(data) + (len(self.__writeHead(*sample_document)) + len(self.WRITE_TAIL) + 1 if new_write else 1)
+            if batch and (size + extra > self.max_bytes or (new_write and writes >= self.max_writes)):
+                yield self.__close(parts, batch, writes, roots)
+                parts, batch, roots, document, writes = [], [], [], None, 0
+                size = len(self.HEAD) + len(self.TAIL)
+                new_write = True
+                extra = len(data) + len(self.__writeHead(*sample_document)) + len(self.WRITE_TAIL) + 1
+            if new_write:
+                if writes:
+                    parts.append(self.WRITE_TAIL + b",")
+                parts.append(self.__writeHead(*sample_document))
+                document = sample_document
+                writes += 1
+            elif batch:
+                parts.append(b",")
+            parts.append(data)
+            batch.append(sample)
+            roots.append(root)
+            size += extra
+        if batch:
+            yield self.__close(parts, batch, writes, roots)
+
+    def __close(self, parts: list, batch: list, writes: int, roots: list):
+        body = self.HEAD + b"".join(parts) + self.WRITE_TAIL + self.TAIL
+        return Batch(body, batch, writes, roots)
+
+    def record(self, batch: Batch):
+        """
+        Account an uploaded batch in the bytes per sample statistics.
+        """
+        self.sent_bytes += len(batch.body)
+        self.sent_samples += len(batch)
+        for root, seq in batch.lastSeqs().items():
+            self.release(seq, root)
+
+    def bytesPerSample(self):
+        """
+        :return: Average body bytes per uploaded sample
+        """
+        return self.sent_bytes / self.sent_samples if self.sent_samples else 0.0
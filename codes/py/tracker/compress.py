@@ -0,0 +1,121 @@
+import math
+from .store import Sample
+
+METRES_PER_DEGREE = 111320.0
+
+class TrajectoryCompressor:
+    """
+    Streaming trajectory simplification in front of the sample store.
+
+    Opening-window variant of Douglas-Peucker: the last kept point is the
+    anchor and incoming points are held back as long as every point seen
+    since the anchor lies within tolerance metres of the line from the
+    anchor to the newest point. When that no longer holds, the previous
+    point is kept and becomes the new anchor. A vehicle standing still or
+    driving straight therefore costs one point per segment instead of one
+    per sample.
+
+    Points are always kept when alcoholDetected, keyState or error change
+    (the last point before the change is kept as well) and at least every
+    max_interval seconds, so parked vehicles still report in.
+
+    The newest point is held back until a later point decides about it.
+    It is kept in memory only, call flush() before uploading.
+    """
+
+    STATE_FIELDS = ("alcoholDetected", "keyState", "error")
+
+    def __init__(self, tolerance: float = 15.0, max_interval: float = 3600, max_window: int = 64):
+        """
+        Initialize the compressor.
+
+        :param tolerance: Maximum distance in metres between a dropped point and the kept track
+        :param max_interval: Maximum time in seconds between kept points
+        :param max_window: Maximum number of points held back for one segment
+        """
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.max_window = max_window
+        self.anchor = None
+        self.pending = None
+        self.window = []
+        self.received = 0
+        self.kept = 0
+
+    def push(self, sample: Sample):
+        """
+        Feed the next sample.
+
+        :param sample: New sample, in time order
+        :return: List of samples to store, possibly empty
+        """
+        self.received += 1
+        if self.anchor is None:
+            return self.__keep([sample])
+
+        last = self.pending or self.anchor
+        if any(getattr(sample, name) != getattr(last, name) for name in self.STATE_FIELDS):
+            return self.__keep([self.pending, sample] if self.pending else [sample])
+
+        if sample.timestamp - self.anchor.timestamp >= self.max_interval:
+            # The points held back must still be within tolerance of the segment that replaces them
+            if self.pending and not self.__fits(self.window + [self.pending], sample):
+                return self.__keep([self.pending, sample])
+            return self.__keep([sample])
+
+        if self.pending is None:
+            self.pending = sample
+            return []
+
+        window = self.window + [self.pending]
+        if len(window) < self.max_window and self.__fits(window, sample):
+            self.window = window
+            self.pending = sample
+            return []
+
+        kept = self.__keep([self.pending])
+        self.pending = sample
+        return kept
+
+    def flush(self):
+        """
+        Keep the point currently held back.
+
+        :return: List with the pending sample, or empty
+        """
+        if self.pending is None:
+            return []
+        return self.__keep([self.pending])
+
+    def __fits(self, points: list, end: Sample):
+        return all(self.__deviation(point, self.anchor, end) <= self.tolerance for point in points)
+
+    def __keep(self, samples: list):
+        self.anchor = samples[-1]
+        self.pending = None
+        self.window = []
+        self.kept += len(samples)
+        return samples
+
+    def ratio(self):
+        """
+        :return: Received samples per kept sample
+        """
+        return self.received / self.kept if self.kept else 1.0
+
+    @staticmethod
+    def __deviation(point: Sample, start: Sample, end: Sample):
+        """
+        Distance in metres from point to the segment start-end, on a local
+        equirectangular projection around start.
+        """
+        scale = math.cos(math.radians(start.latitude)) * METRES_PER_DEGREE
+        px = (point.longitude - start.longitude) * scale
+        py = (point.latitude - start.latitude) * METRES_PER_DEGREE
+        ex = (end.longitude - start.longitude) * scale
+        ey = (end.latitude - start.latitude) * METRES_PER_DEGREE
+        length = ex * ex + ey * ey
+        if length == 0:
+            return math.hypot(px, py)
+        t = max(0.0, min(1.0, (px * ex + py * ey) / length))
+        return math.hypot(px - t * ex, py - t * ey)
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+
+def firestoreValue(value: dict):
+    """
+    Convert a typed Firestore REST value to a plain Python value.
+
+    :param value: e.g. {"integerValue": "3"} or {"mapValue": {"fields": {...}}}
+    :return: int, float, str, bool, None, dict or list
+    """
+    if "integerValue" in value:
+        return int(value["integerValue"])
+    if "doubleValue" in value:
+        return float(value["doubleValue"])
+    if "mapValue" in value:
+        return {name: firestoreValue(field) for name, field in value["mapValue"].get("fields", {}).items()}
+    if "arrayValue" in value:
+        return [firestoreValue(item) for item in value["arrayValue"].get("values", [])]
+    if "nullValue" in value:
+        return None
+    return next(iter(value.values()))
+
+class VehicleConfig:
+    """
+    Persisted copy of the vehicle's settings (the VehicleDetails map of its
+    Firestore document, e.g. assignedTo and FingerprintSensorAddress).
+
+    The settings are stored as plain JSON together with the document's
+    updateTime and the time they were fetched. A cached copy is always
+    usable, so the vehicle starts without coverage; fresh() tells when it
+    is older than ttl seconds and should be revalidated.
+    """
+
+    def __init__(self, path: str = "config.json", ttl: float = 86400):
+        """
+        Load the cached settings, if any.
+
+        :param path: Cache file
+        :param ttl: Seconds after which the settings should be revalidated
+        """
+        self.path = path
+        self.ttl = ttl
+        self.fields = {}
+        self.updateTime = None
+        self.fetched = 0.0
+        try:
+            with open(path) as file:
+                cached = json.load(file)
+            self.fields = cached["fields"]
+            self.updateTime = cached.get("updateTime")
+            self.fetched = cached.get("fetched", 0.0)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def __contains__(self, name: str):
+        return name in self.fields
+
+    def get(self, name: str, default=None):
+        """
+        :param name: Setting name, e.g. "assignedTo"
+        :param default: Returned if the setting isn't cached
+        """
+        return self.fields.get(name, default)
+
+    def fresh(self, now: float = None):
+        """
+        :param now: Current time, defaults to time.time()
+        :return: True if the settings were fetched less than ttl seconds ago
+        """
+        now = time.time() if now is None else now
+        return 0 <= now - self.fetched < self.ttl
+
+    def update(self, document: dict):
+        """
+        Take the settings from a fetched vehicle document and save them.
+
+        :param document: Firestore document as returned by a GET
+        :return: True if the document changed since the cached copy
+        """
+        fields = firestoreValue(document["fields"]["VehicleDetails"])
+        updateTime = document.get("updateTime")
+        changed = fields != self.fields or updateTime != self.updateTime
+        self.fields = fields
+        self.updateTime = updateTime
+        self.fetched = time.time()
+        self.save()
+        return changed
+
+    def save(self):
+        """
+        Write the cache file atomically.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as file:
+            json.dump({"fields": self.fields, "updateTime": self.updateTime, "fetched": self.fetched}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
@@ -0,0 +1,155 @@
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from .batching import BatchBuilder
+from .vehicle import VehicleSession
+
+class Gateway:
+    """
+    Drive many vehicles, each with its own modem and Nano, from one process.
+
+    An asyncio loop supervises the sessions. The blocking serial work of
+    each session (start-up, then its pipeline) runs on a worker thread of a
+    shared pool, so a slow or hanging modem only delays its own vehicle.
+    A session that raises is logged and restarted after RESTART_DELAY.
+
+    Uploads are shared: sessions only mark their Firestore backlog as
+    ready, every upload_interval seconds the gateway packs the backlogs of
+    all ready vehicles into common commit requests and sends each one
+    through the next modem in turn, falling back to the other modems when
+    a request fails.
+    """
+
+    RESTART_DELAY = 30
+
+    def __init__(self, sessions: list, upload_interval: float = 30, batch_samples: int = 500,
+                 max_bytes: int = 16384, max_writes: int = 20):
+        """
+        :param sessions: VehicleSession objects created with shared_upload=True
+        :param upload_interval: Seconds between shared uploads
+        :param batch_samples: Maximum samples taken from each vehicle per upload
+        :param max_bytes: Target maximum body size of a commit
+        :param max_writes: Maximum writes per commit
+        """
+        self.sessions = sessions
+        self.upload_interval = upload_interval
+        self.batch_samples = batch_samples
+        self.batcher = BatchBuilder(None, max_bytes, max_writes)
+        # Every session blocks in its pipeline and the shared upload needs one more
+        self.executor = ThreadPoolExecutor(max_workers=len(sessions) + 1, thread_name_prefix="gateway")
+        self.next_uploader = 0
+        self.stopped = None
+
+    def run(self):
+        """
+        Run all sessions until stop() is called or the process is interrupted, then close them.
+        """
+        try:
+            asyncio.run(self.__main())
+        finally:
+            self.stop()
+            # Queued behind the running pipelines, the sessions power down in parallel
+            list(self.executor.map(self.__close, self.sessions))
+            self.executor.shutdown(wait=True)
+
+    @staticmethod
+    def __close(session: VehicleSession):
+        try:
+            session.close()
+        except Exception as e:
+            print(f"{session.vehicle_id}: Closing failed: {e}")
+
+    def stop(self):
+        """
+        Ask all sessions to finish their current upload and return. Thread safe.
+        """
+        for session in self.sessions:
+            session.stop()
+        if self.stopped and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def __main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        tasks = [asyncio.create_task(self.__drive(session)) for session in self.sessions]
+        tasks.append(asyncio.create_task(self.__upload()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self.stop()
+
+    async def __drive(self, session: VehicleSession):
+        while not session.stopped.is_set():
+            try:
+                if not await self.loop.run_in_executor(self.executor, session.start):
+                    return
+                await self.loop.run_in_executor(self.executor, session.run)
+            except Exception as e:
+                print(f"{session.vehicle_id}: An error occurred: {e}")
+                traceback.print_exc()
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), self.RESTART_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def __upload(self):
+        while not self.stopped.is_set():
+            try:
+                await asyncio.wait_for(self.stopped.wait(), self.upload_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.loop.run_in_executor(self.executor, self.uploadShared)
+            except Exception as e:
+                print(f"Shared upload failed: {e}")
+                traceback.print_exc()
+
+    def uploadShared(self):
+        """
+        Upload the backlogs of all vehicles whose upload is due.
+
+        :return: True if every backlog was uploaded
+        """
+        ready = [session for session in self.sessions if session.uploadReady]
+        projects = {}
+        for session in ready:
+            projects.setdefault(session.firestore_url, []).append(session)
+        done = True
+        for url, sessions in projects.items():
+            done = self.__uploadProject(url, sessions) and done
+        return done
+
+    def __uploadProject(self, url: str, sessions: list):
+        by_root = {session.document_root: session for session in sessions}
+        groups = [(session.document_root, session.store.peek(self.batch_samples)) for session in sessions]
+        for batch in self.batcher.mergedBatches(groups):
+            if not self.__send(url, batch):
+                return False
+            for root, seq in batch.lastSeqs().items():
+                by_root[root].store.commit(seq)
+            self.batcher.record(batch)
+            print(f"Shared Firestore batch: {len(batch)} samples of {len(batch.lastSeqs())} vehicles, "
+                  f"{len(batch.body)} bytes ({self.batcher.bytesPerSample():.1f} bytes/sample average)")
+        for session in sessions:
+            session.uploadReady = False
+            session.uploadPolicy.uploaded()
+        return True
+
+    def __send(self, url: str, batch):
+        # Round robin over all modems, try the others when one fails
+        for _ in range(len(self.sessions)):
+            uploader = self.sessions[self.next_uploader % len(self.sessions)]
+            self.next_uploader += 1
+            if uploader.stopped.is_set() or not uploader.sim.HTTP.Available():
+                continue
+            sim = uploader.sim
+            with sim.HTTP.lock:
+                session = sim.HTTP.Session(idle_timeout=uploader.HTTP_IDLE_TIMEOUT, debug=uploader.debug)
+                with session:
+                    httpResponse = session.SendRequest(url, sim.HTTP.HTTPRequest.POST, batch.body)
+                    if httpResponse:
+                        print(session.ReadResponse(httpResponse[2]))
+            if httpResponse and httpResponse[1] == 200:
+                return True
+            print(f"{uploader.vehicle_id}: Shared Firestore batch failed, trying the next modem")
+        return False
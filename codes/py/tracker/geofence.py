@@ -0,0 +1,178 @@
+import json
+import math
+import threading
+
+METRES_PER_DEGREE = 111320.0
+
+class CircleZone:
+    """
+    Zone within radius metres of a centre point.
+    """
+
+    def __init__(self, name: str, latitude: float, longitude: float, radius: float, kind: str = "zone"):
+        """
+        :param name: Zone name, reported in the events
+        :param latitude: Latitude of the centre in degrees
+        :param longitude: Longitude of the centre in degrees
+        :param radius: Radius in metres
+        :param kind: Free-form zone type, e.g. "depot" or "restricted"
+        """
+        self.name = name
+        self.kind = kind
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius
+        # Equirectangular approximation, exact enough for zones of a few km
+        self.scale = math.cos(math.radians(latitude))
+        self.radius2 = (radius / METRES_PER_DEGREE) ** 2
+
+    def __repr__(self):
+        return f"CircleZone({self.name})"
+
+    def bounds(self):
+        """
+        :return: Tuple of (min latitude, min longitude, max latitude, max longitude)
+        """
+        dlat = self.radius / METRES_PER_DEGREE
+        dlon = dlat / max(self.scale, 1e-6)
+        return self.latitude - dlat, self.longitude - dlon, self.latitude + dlat, self.longitude + dlon
+
+    def contains(self, latitude: float, longitude: float):
+        dlat = latitude - self.latitude
+        dlon = (longitude - self.longitude) * self.scale
+        return dlat * dlat + dlon * dlon <= self.radius2
+
+class PolygonZone:
+    """
+    Zone inside a simple polygon.
+    """
+
+    def __init__(self, name: str, points: list, kind: str = "zone"):
+        """
+        :param name: Zone name, reported in the events
+        :param points: Corners as (latitude, longitude) pairs, the polygon is closed automatically
+        :param kind: Free-form zone type, e.g. "depot" or "restricted"
+        """
+        if len(points) < 3:
+            raise ValueError(f"Polygon {name} needs at least 3 points")
+        self.name = name
+        self.kind = kind
+        self.points = [(float(latitude), float(longitude)) for latitude, longitude in points]
+        # Edges as (lat1, lon1, lat2, dlon/dlat), horizontal edges never cross the ray
+        self.edges = []
+        for (lat1, lon1), (lat2, lon2) in zip(self.points, self.points[1:] + self.points[:1]):
+            if lat1 != lat2:
+                self.edges.append((lat1, lon1, lat2, (lon2 - lon1) / (lat2 - lat1)))
+
+    def __repr__(self):
+        return f"PolygonZone({self.name})"
+
+    def bounds(self):
+        """
+        :return: Tuple of (min latitude, min longitude, max latitude, max longitude)
+        """
+        latitudes = [point[0] for point in self.points]
+        longitudes = [point[1] for point in self.points]
+        return min(latitudes), min(longitudes), max(latitudes), max(longitudes)
+
+    def contains(self, latitude: float, longitude: float):
+        # Even-odd rule with a ray towards increasing longitude
+        inside = False
+        for lat1, lon1, lat2, slope in self.edges:
+            if (lat1 > latitude) != (lat2 > latitude) and longitude < lon1 + (latitude - lat1) * slope:
+                inside = not inside
+        return inside
+
+class Geofence:
+    """
+    Tracks which zones a vehicle is in and reports when it enters or leaves one.
+
+    Zones are indexed in a uniform grid of cell_size degrees: every cell
+    lists the zones whose bounding box overlaps it, so a fix is only tested
+    against the few zones near it, however many zones there are.
+    """
+
+    def __init__(self, zones: list = (), cell_size: float = 0.01):
+        """
+        :param zones: CircleZone and PolygonZone objects
+        :param cell_size: Grid cell size in degrees (0.01 is about 1.1 km)
+        """
+        self.cell_size = cell_size
+        self.zones = []
+        self.grid = {}
+        self.inside = set()
+        self.lock = threading.Lock()
+        for zone in zones:
+            self.add(zone)
+
+    def __len__(self):
+        return len(self.zones)
+
+    @classmethod
+    def load(cls, path: str, cell_size: float = 0.01):
+        """
+        Load zones from a JSON file holding a list of zones, e.g.
+
+            [{"name": "depot", "kind": "depot", "circle": [12.97, 77.59, 300]},
+             {"name": "yard", "polygon": [[12.90, 77.50], [12.91, 77.50], [12.91, 77.52]]}]
+
+        :param path: JSON file
+        :param cell_size: Grid cell size in degrees
+        :return: Geofence
+        """
+        with open(path) as file:
+            items = json.load(file)
+        zones = []
+        for item in items:
+            kind = item.get("kind", "zone")
+            if "circle" in item:
+                zones.append(CircleZone(item["name"], *item["circle"], kind=kind))
+            elif "polygon" in item:
+                zones.append(PolygonZone(item["name"], item["polygon"], kind=kind))
+            else:
+                raise ValueError(f"Zone {item.get('name')} has neither circle nor polygon")
+        return cls(zones, cell_size)
+
+    def __cell(self, latitude: float, longitude: float):
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def add(self, zone):
+        """
+        Add a zone to the index.
+        """
+        minLat, minLon, maxLat, maxLon = zone.bounds()
+        row1, col1 = self.__cell(minLat, minLon)
+        row2, col2 = self.__cell(maxLat, maxLon)
+        for row in range(row1, row2 + 1):
+            for col in range(col1, col2 + 1):
+                self.grid.setdefault((row, col), []).append(zone)
+        self.zones.append(zone)
+
+    def zonesAt(self, latitude: float, longitude: float):
+        """
+        :return: Zones containing the point
+        """
+        return [zone for zone in self.grid.get(self.__cell(latitude, longitude), ())
+                if zone.contains(latitude, longitude)]
+
+    def update(self, latitude: float, longitude: float):
+        """
+        Move the vehicle to a new position. Thread safe.
+
+        :param latitude: Latitude in degrees
+        :param longitude: Longitude in degrees
+        :return: List of ("enter" or "exit", zone) tuples, exits first
+        """
+        with self.lock:
+            current = set(self.zonesAt(latitude, longitude))
+            left = self.inside - current
+            entered = current - self.inside
+            self.inside = current
+        return ([("exit", zone) for zone in sorted(left, key=lambda zone: zone.name)] +
+                [("enter", zone) for zone in sorted(entered, key=lambda zone: zone.name)])
+
+    def names(self):
+        """
+        :return: Sorted names of the zones the vehicle is in
+        """
+        return sorted(zone.name for zone in self.inside)
@@ -0,0 +1,106 @@
+import math
+import threading
+import time
+from .geofence import METRES_PER_DEGREE
+
+class LiveSync:
+    """
+    Live location in the Realtime Database, sent as deltas.
+
+    The state last acknowledged by the server is kept. Only fields that
+    changed beyond their threshold are sent, with a PATCH: the position
+    once it moved more than position_deadband metres, numeric fields once
+    they differ by their entry in deadbands (e.g. fuel level), every other
+    field on any change. The timestamp alone is no reason to send, it goes
+    along with every delta. A heartbeat refreshes the timestamp after
+    heartbeat seconds without an upload. The first upload PUTs the whole
+    state so that the node holds no stale fields.
+    """
+
+    def __init__(self, position_deadband: float = 25, deadbands: dict = None, heartbeat: float = 900):
+        """
+        :param position_deadband: Movement in metres that is sent
+        :param deadbands: Smallest change that is sent per numeric field, e.g. {"fuelLevel": 2, "speed": 5}
+        :param heartbeat: Longest time in seconds between uploads
+        """
+        self.position_deadband = position_deadband
+        self.deadbands = deadbands or {}
+        self.heartbeat = heartbeat
+        self.current = {}
+        self.acked = {}
+        self.sent = None
+        self.lock = threading.Lock()
+        self.uploads = 0
+        self.skipped = 0
+
+    def update(self, data: dict):
+        """
+        Take the latest state. Thread safe.
+
+        :param data: Fields of the live node, e.g. timestamp, latitude, longitude, speed
+        :return: True if the state should be sent now
+        """
+        with self.lock:
+            self.current.update(data)
+            due = bool(self.__changes()) or self.__heartbeatDue()
+            if not due:
+                self.skipped += 1
+            return due
+
+    def delta(self):
+        """
+        Fields to send now. Thread safe.
+
+        :return: Tuple (fields, full), full if the whole state has to be PUT; None if nothing is due
+        """
+        with self.lock:
+            if not self.current:
+                return None
+            if self.sent is None:
+                return dict(self.current), True
+            changes = self.__changes()
+            if not changes:
+                if not self.__heartbeatDue():
+                    return None
+                # The heartbeat also brings the fields held back by their deadband up to date
+                changes = [name for name, value in self.current.items() if self.acked.get(name) != value]
+            fields = {name: self.current[name] for name in changes}
+            if "timestamp" in self.current:
+                fields["timestamp"] = self.current["timestamp"]
+            return fields, False
+
+    def acknowledge(self, fields: dict):
+        """
+        Record fields the server accepted. Thread safe.
+        """
+        with self.lock:
+            self.acked.update(fields)
+            self.sent = time.monotonic()
+            self.uploads += 1
+
+    def __heartbeatDue(self):
+        return self.sent is None or time.monotonic() - self.sent >= self.heartbeat
+
+    def __changes(self):
+        changes = []
+        for name, value in self.current.items():
+            if name in ("timestamp", "latitude", "longitude"):
+                continue
+            if name not in self.acked:
+                changes.append(name)
+            elif name in self.deadbands and isinstance(value, (int, float)) and isinstance(self.acked[name], (int, float)):
+                if abs(value - self.acked[name]) >= self.deadbands[name]:
+                    changes.append(name)
+            elif value != self.acked[name]:
+                changes.append(name)
+        if "latitude" in self.current and self.__moved() >= self.position_deadband:
+            changes += ["latitude", "longitude"]
+        return changes
+
+    def __moved(self):
+        if "latitude" not in self.acked or "longitude" not in self.acked:
+            return math.inf
+        # Equirectangular approximation, exact enough for a deadband of some metres
+        dlat = self.current["latitude"] - self.acked["latitude"]
+        dlon = (self.current["longitude"] - self.acked["longitude"]) * math.cos(math.radians(self.acked["latitude"]))
+        return math.hypot(dlat, dlon) * METRES_PER_DEGREE
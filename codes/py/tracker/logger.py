@@ -0,0 +1,192 @@
+import collections
+import gzip
+import io
+import os
+import shutil
+import sys
+import threading
+import time
+
+class BufferedLog(io.TextIOBase):
+    """
+    Console and daily log file output, used as sys.stdout.
+
+    Text goes to the console right away. Complete lines are timestamped and
+    put on a bounded in-memory queue, a writer thread appends them to
+    <directory>/<dd-mm-YYYY>.txt in one write once flush_bytes are pending
+    or flush_interval seconds have passed. Writing never blocks the caller:
+    debug lines (written through debug()) are dropped once the queue is
+    half full and all lines once it is full, the number of dropped lines is
+    noted in the file. At midnight the writer moves on to the next day's
+    file and compresses the older ones to .txt.gz.
+    """
+
+    def __init__(self, directory: str = "output", max_lines: int = 10000, flush_bytes: int = 65536,
+                 flush_interval: float = 5.0, console=None):
+        """
+        Open the log and start the writer thread.
+
+        :param directory: Directory holding the daily log files
+        :param max_lines: Lines held in memory before new lines are dropped
+        :param flush_bytes: Pending bytes that trigger a write
+        :param flush_interval: Maximum seconds a line waits before it is written
+        :param console: Stream for console output, defaults to sys.__stdout__
+        """
+        super().__init__()
+        self.directory = directory
+        self.max_lines = max_lines
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.console = console or sys.__stdout__
+        self.lines = collections.deque()
+        self.pending = 0
+        self.partial = {False: "", True: ""}
+        self.dropped = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.flushing = False
+        self.file = None
+        self.date = None
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.__run, name="BufferedLog-writer", daemon=True)
+        self.thread.start()
+
+    def writable(self):
+        return True
+
+    def write(self, text: str):
+        """
+        Write text to the console and queue complete lines for the log file.
+        """
+        return self.__write(text, False)
+
+    def debug(self, text: str):
+        """
+        Like write(), but the lines are dropped first when the log falls behind.
+        """
+        return self.__write(text, True)
+
+    def __write(self, text: str, debug: bool):
+        try:
+            self.console.write(text)
+        except (OSError, ValueError):
+            pass
+        # Every thread prints, the incomplete line is taken and put back under the lock
+        with self.cond:
+            line = self.partial[debug] + text
+            end = line.rfind("\n")
+            if end < 0:
+                self.partial[debug] = line
+            else:
+                self.partial[debug] = line[end + 1:]
+                self.__queue(line[:end + 1], debug)
+        return len(text)
+
+    def __queue(self, text: str, debug: bool):
+        now = time.time()
+        prefix = time.ctime(now) + " -> "
+        with self.cond:
+            limit = self.max_lines // 2 if debug else self.max_lines
+            for line in text.splitlines(keepends=True):
+                if len(self.lines) >= limit:
+                    self.dropped += 1
+                    continue
+                self.lines.append((now, prefix + line))
+                self.pending += len(line) + len(prefix)
+            if self.pending >= self.flush_bytes:
+                self.cond.notify()
+
+    def flush(self):
+        """
+        Ask the writer thread to write pending lines now, without waiting for it.
+        """
+        try:
+            self.console.flush()
+        except (OSError, ValueError):
+            pass
+        with self.cond:
+            self.flushing = True
+            self.cond.notify()
+
+    def close(self):
+        """
+        Write everything still pending, including an incomplete last line, and stop the writer thread.
+        """
+        if not self.running:
+            return
+        with self.cond:
+            for debug, text in self.partial.items():
+                if text:
+                    self.__queue(text + "\n", debug)
+            self.partial = {False: "", True: ""}
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        super().close()
+
+    def __run(self):
+        while True:
+            with self.cond:
+                deadline = time.monotonic() + self.flush_interval
+                while self.running and not self.flushing and self.pending < self.flush_bytes:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                lines, self.lines = self.lines, collections.deque()
+                dropped, self.dropped = self.dropped, 0
+                self.pending = 0
+                self.flushing = False
+                running = self.running
+            try:
+                self.__writeLines(lines, dropped)
+            except OSError as e:
+                try:
+                    self.console.write(f"Log write failed: {e}\n")
+                except (OSError, ValueError):
+                    pass
+            if not running:
+                break
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __writeLines(self, lines, dropped: int):
+        if dropped:
+            lines.append((time.time(), f"{time.ctime()} -> {dropped} log lines dropped\n"))
+        chunk = []
+        for timestamp, line in lines:
+            date = time.strftime("%d-%m-%Y", time.localtime(timestamp))
+            if date != self.date:
+                if chunk:
+                    self.file.write("".join(chunk))
+                    chunk = []
+                self.__rotate(date)
+            chunk.append(line)
+        if chunk:
+            self.file.write("".join(chunk))
+        if self.file:
+            self.file.flush()
+
+    def __rotate(self, date: str):
+        if self.file:
+            self.file.close()
+        self.date = date
+        self.file = open(os.path.join(self.directory, f"{date}.txt"), "a")
+        self.compressOld()
+
+    def compressOld(self):
+        """
+        Compress the log files of past days to .txt.gz.
+        """
+        current = f"{self.date}.txt"
+        for name in os.listdir(self.directory):
+            if not name.endswith(".txt") or name == current:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "rb") as source, gzip.open(path + ".gz", "ab") as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(path)
+            except OSError as e:
+                self.console.write(f"Compressing {name} failed: {e}\n")
@@ -0,0 +1,132 @@
+import threading
+import time
+
+class SamplingScheduler:
+    """
+    Decide when to take the next sample.
+
+    While moving the interval is chosen so that consecutive samples are
+    about sample_distance metres apart, a heading change of more than
+    heading_change degrees asks for the next sample after min_interval, and
+    a standing vehicle is sampled every max_interval seconds. Events
+    (ignition, key, alcohol alarm) end the wait immediately.
+    """
+
+    def __init__(self, min_interval: float = 10, max_interval: float = 300, sample_distance: float = 250,
+                 heading_change: float = 30, standstill_speed: float = 3):
+        """
+        Initialize the scheduler.
+
+        :param min_interval: Shortest time between samples in seconds
+        :param max_interval: Longest time between samples in seconds
+        :param sample_distance: Target distance between samples in metres
+        :param heading_change: Heading change in degrees that triggers a quick sample
+        :param standstill_speed: Speed in km/h below which the vehicle counts as standing
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.sample_distance = sample_distance
+        self.heading_change = heading_change
+        self.standstill_speed = standstill_speed
+        self.course = None
+        self.events = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def nextInterval(self, speed: float = 0.0, course: float = None):
+        """
+        Compute the time until the next sample.
+
+        :param speed: Current speed in km/h
+        :param course: Current course over ground in degrees
+        :return: Interval in seconds
+        """
+        interval = self.max_interval
+        if speed >= self.standstill_speed:
+            interval = self.sample_distance / (speed / 3.6)
+            if course is not None and self.course is not None:
+                turn = abs((course - self.course + 180) % 360 - 180)
+                if turn >= self.heading_change:
+                    interval = self.min_interval
+            self.course = course
+        else:
+            self.course = None
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def notify(self, event: str):
+        """
+        Report an event, the current wait ends immediately. Thread safe.
+
+        :param event: Event name, e.g. "ignition", "key" or "alcohol"
+        """
+        with self.lock:
+            self.events.append(event)
+        self.wakeup.set()
+
+    def wait(self, interval: float, poll=None, poll_interval: float = 5):
+        """
+        Sleep until the next sample is due or an event arrives.
+
+        :param interval: Time to wait in seconds
+        :param poll: Optional function returning a list of events, called every poll_interval seconds
+        :param poll_interval: Seconds between poll calls
+        :return: List of events that ended the wait, empty if the interval elapsed
+        """
+        deadline = time.monotonic() + interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.wakeup.wait(min(remaining, poll_interval) if poll else remaining):
+                break
+            if poll:
+                for event in poll():
+                    self.notify(event)
+        self.wakeup.clear()
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+class UploadPolicy:
+    """
+    Decide when the sample backlog is uploaded: once it holds max_depth
+    samples, once its oldest sample is max_age seconds old, or right away
+    after request().
+    """
+
+    def __init__(self, max_depth: int = 50, max_age: float = 3600):
+        """
+        Initialize the upload policy.
+
+        :param max_depth: Number of pending samples that triggers an upload
+        :param max_age: Age in seconds of the oldest pending sample that triggers an upload
+        """
+        self.max_depth = max_depth
+        self.max_age = max_age
+        self.requested = False
+
+    def request(self):
+        """
+        Ask for an upload on the next check.
+        """
+        self.requested = True
+
+    def due(self, depth: int, oldest: float = None, now: float = None):
+        """
+        :param depth: Number of samples waiting for upload
+        :param oldest: Timestamp of the oldest waiting sample
+        :param now: Current time, defaults to time.time()
+        :return: True if the backlog should be uploaded now
+        """
+        if not depth:
+            return False
+        if self.requested or depth >= self.max_depth:
+            return True
+        now = time.time() if now is None else now
+        return oldest is not None and now - oldest >= self.max_age
+
+    def uploaded(self):
+        """
+        Clear a pending request after a successful upload.
+        """
+        self.requested = False
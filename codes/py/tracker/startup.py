@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class LastFix:
+    """
+    Last known position, persisted so the next boot can choose the GNSS
+    start mode. Updates are kept in memory and written at most every
+    save_interval seconds to spare the SD card.
+    """
+
+    def __init__(self, path: str = "state/lastfix.json", save_interval: float = 300):
+        """
+        Load the last fix of the previous run, if any.
+
+        :param path: State file
+        :param save_interval: Minimum seconds between writes
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self.latitude = None
+        self.longitude = None
+        self.timestamp = None
+        self.saved = 0.0
+        self.dirty = False
+        self.lock = threading.Lock()
+        try:
+            with open(path) as file:
+                state = json.load(file)
+            self.latitude = state["latitude"]
+            self.longitude = state["longitude"]
+            self.timestamp = state["timestamp"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def age(self, now: float = None):
+        """
+        :param now: Current time, defaults to time.time()
+        :return: Seconds since the last fix, None if there is none
+        """
+        if self.timestamp is None:
+            return None
+        return (time.time() if now is None else now) - self.timestamp
+
+    def update(self, fix):
+        """
+        Remember a new fix, written to disk once save_interval has passed. Thread safe.
+
+        :param fix: GnssFix
+        """
+        with self.lock:
+            self.latitude = fix.latitude
+            self.longitude = fix.longitude
+            self.timestamp = fix.timestamp or time.time()
+            self.dirty = True
+        if time.monotonic() - self.saved >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """
+        Write the last fix atomically if it changed. Thread safe.
+
+        A failed write (SD card full or read only) is logged and tried again
+        after save_interval, the fix stays in memory.
+
+        :return: True if the state file is up to date
+        """
+        with self.lock:
+            if not self.dirty:
+                return True
+            self.saved = time.monotonic()
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w") as file:
+                    json.dump({"latitude": self.latitude, "longitude": self.longitude, "timestamp": self.timestamp},
+                              file)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"Failed saving the last fix to {self.path}: {e}")
+                return False
+            self.dirty = False
+            return True
+
+class Startup:
+    """
+    Boot sequence of a VehicleSession with the independent steps overlapped.
+
+    GNSS power-up and the PDP attach run on worker threads while this
+    thread does the Arduino handshake and waits for the driver's
+    fingerprint; the modem's AT port is shared between them command by
+    command. The GNSS start mode (COLD/WARM/HOT) follows from the age of
+    the persisted last fix. After power-up a background thread waits for
+    the first fix and asks for a sample as soon as there is one.
+
+    Time to ready (fingerprint verified) and time to first fix are logged
+    and recorded in the modem metrics as boot.ready and boot.ttff.
+    """
+
+    VERIFY_INTERVAL = 5
+    TTFF_POLL = 1
+    TTFF_TIMEOUT = 300
+
+    def __init__(self, vehicle):
+        """
+        :param vehicle: VehicleSession to start
+        """
+        self.vehicle = vehicle
+        self.metrics = vehicle.sim.metrics
+
+    def run(self):
+        """
+        Run the boot sequence.
+
+        :return: False if stop() was called on the vehicle while waiting
+        """
+        vehicle = self.vehicle
+        start = time.perf_counter()
+        age = vehicle.lastFix.age()
+        mode = vehicle.sim.GNSS.chooseStartMode(age)
+        print(f"{vehicle.vehicle_id}: GNSS {mode.rsplit('GPS', 1)[-1]} start, last fix "
+              f"{'unknown' if age is None else f'{age:.0f} s old'}")
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"{vehicle.vehicle_id}-startup") as pool:
+            power = pool.submit(self.__startGNSS, mode, start)
+            attach = pool.submit(vehicle.sim.HTTP.Attach, debug=vehicle.debug)
+            ready = self.__verify()
+            if ready:
+                seconds = time.perf_counter() - start
+                self.metrics.observe("boot.ready", seconds, start=start)
+                print(f"{vehicle.vehicle_id}: Ready after {seconds:.1f} s")
+            if not attach.result():
+                print(f"{vehicle.vehicle_id}: No PDP context, uploads will wait for the network")
+            power.result()
+        return ready
+
+    def __startGNSS(self, mode: str, start: float):
+        vehicle = self.vehicle
+        if not vehicle.sim.GNSS.Initialize(mode, debug=vehicle.debug):
+            print(f"{vehicle.vehicle_id}: GNSS didn't report ready")
+        if vehicle.GNSS_STREAMING:
+            vehicle.sim.GNSS.StartStreaming(vehicle.NMEA_PORT, debug=vehicle.debug)
+        threading.Thread(target=self.__waitFirstFix, args=(start,), name=f"{vehicle.vehicle_id}-ttff",
+                         daemon=True).start()
+
+    def __waitFirstFix(self, start: float):
+        vehicle = self.vehicle
+        deadline = start + self.TTFF_TIMEOUT
+        while time.perf_counter() < deadline:
+            if vehicle.sim.GNSS.getFix(debug=vehicle.debug):
+                seconds = time.perf_counter() - start
+                self.metrics.observe("boot.ttff", seconds, start=start)
+                print(f"{vehicle.vehicle_id}: First fix after {seconds:.1f} s")
+                vehicle.scheduler.notify("fix")
+                return
+            if vehicle.stopped.wait(self.TTFF_POLL):
+                return
+        self.metrics.observe("boot.ttff", self.TTFF_TIMEOUT, timeout=True, start=start)
+        print(f"{vehicle.vehicle_id}: No fix within {self.TTFF_TIMEOUT} s")
+
+    def __verify(self):
+        vehicle = self.vehicle
+        vehicle.validateFingerprintSensor()
+        while True:
+            vehicle.fingerprintFound.clear()
+            if vehicle.verifyFingerprint():
+                return True
+            # A streamed status with a valid fingerprint ends the wait early
+            deadline = time.monotonic() + self.VERIFY_INTERVAL
+            while not vehicle.fingerprintFound.wait(0.25):
+                if vehicle.stopped.is_set():
+                    return False
+                if time.monotonic() >= deadline:
+                    break
+            if vehicle.stopped.is_set():
+                return False
+            # A new driver or a replaced sensor only shows in the vehicle document, the cached
+            # copy alone would keep the vehicle locked
+            if vehicle.refreshConfig():
+                vehicle.initializedSystem = 0
+            if not vehicle.initializedSystem:
+                # No configuration yet or the sensor didn't match, try again
+                vehicle.validateFingerprintSensor()
@@ -0,0 +1,229 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+class Sample:
+    """
+    One tracking sample as uploaded to Firestore.
+    """
+
+    __slots__ = ("seq", "timestamp", "latitude", "longitude", "speed", "alcoholValue",
+                 "alcoholDetected", "fuelLevel", "keyState", "error")
+
+    def __init__(self, timestamp: float, latitude: float = 0.0, longitude: float = 0.0, speed: float = 0.0,
+                 alcoholValue: int = 0, alcoholDetected: int = 0, fuelLevel: int = 0, keyState: int = 0,
+                 error: int = 0, seq: int = -1):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.alcoholValue = alcoholValue
+        self.alcoholDetected = alcoholDetected
+        self.fuelLevel = fuelLevel
+        self.keyState = keyState
+        self.error = error
+
+    def __repr__(self):
+        return (f"Sample(seq={self.seq}, timestamp={self.timestamp}, latitude={self.latitude}, "
+                f"longitude={self.longitude}, speed={self.speed})")
+
+    def timeStamp(self):
+        """
+        :return: Timestamp formatted like the rest of the Firebase data
+        """
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.localtime(self.timestamp))
+
+    def toFirestore(self):
+        """
+        :return: The sample as a Firestore mapValue
+        """
+        return {
+            "mapValue": {
+                "fields": {
+                    "alcoholValue": {"integerValue": self.alcoholValue},
+                    "alcoholDetected": {"integerValue": self.alcoholDetected},
+                    "latitude": {"doubleValue": self.latitude},
+                    "longitude": {"doubleValue": self.longitude},
+                    "speed": {"doubleValue": self.speed},
+                    "fuelLevel": {"integerValue": self.fuelLevel},
+                    "keyState": {"integerValue": self.keyState},
+                    "error": {"integerValue": self.error},
+                    "timestamp": {"timestampValue": self.timeStamp()},
+                }
+            }
+        }
+
+class SampleStore:
+    """
+    Durable append-only queue of samples.
+
+    Samples are fixed-size records in memory-mapped segment files of
+    SEGMENT_RECORDS records each. Every record carries its sequence number
+    and a CRC32, so a record torn by a power cut is detected and the queue
+    resumes after the last good one. The commit cursor (sequence number of
+    the oldest sample not yet uploaded) is kept in its own file and only
+    moves forward through commit().
+
+    Uploaded segments are kept as local history until the store exceeds
+    max_segments, then the oldest segment is deleted, uploaded or not.
+    """
+
+    RECORD = struct.Struct("<QdddfHBBBB2xI")
+    SEGMENT_RECORDS = 4096
+
+    def __init__(self, path: str = "queue", max_segments: int = 32, sync: bool = True):
+        """
+        Open the store, creating it if needed.
+
+        :param path: Directory holding the segment and cursor files
+        :param max_segments: Maximum number of segment files kept on disk
+        :param sync: Flush every appended record to disk
+        """
+        self.path = path
+        self.max_segments = max(2, max_segments)
+        self.sync = sync
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.segments = sorted(int(name[:-4]) for name in os.listdir(path) if name.endswith(".seg"))
+        self.maps = {}
+        self.cursor = self.__readCursor()
+        self.head = self.__recoverHead()
+        if self.segments and self.cursor < self.segments[0]:
+            self.cursor = self.segments[0]
+        self.cursor = min(self.cursor, self.head)
+
+    def __len__(self):
+        """
+        :return: Number of samples waiting for upload
+        """
+        return self.head - self.cursor
+
+    def __segmentPath(self, base: int):
+        return os.path.join(self.path, f"{base:016d}.seg")
+
+    def __map(self, base: int):
+        mm = self.maps.get(base)
+        if mm is None:
+            size = self.RECORD.size * self.SEGMENT_RECORDS
+            with open(self.__segmentPath(base), "a+b") as file:
+                if os.fstat(file.fileno()).st_size < size:
+                    file.truncate(size)
+                mm = mmap.mmap(file.fileno(), size)
+            self.maps[base] = mm
+        return mm
+
+    def __readRecord(self, seq: int):
+        base = seq - seq % self.SEGMENT_RECORDS
+        mm = self.__map(base)
+        offset = (seq - base) * self.RECORD.size
+        record = mm[offset:offset + self.RECORD.size]
+        fields = self.RECORD.unpack(record)
+        if fields[0] != seq or fields[-1] != zlib.crc32(record[:-4]):
+            return None
+        return Sample(*fields[1:-1], seq=fields[0])
+
+    def __recoverHead(self):
+        if not self.segments:
+            return self.cursor
+        base = self.segments[-1]
+        for index in range(self.SEGMENT_RECORDS):
+            if self.__readRecord(base + index) is None:
+                return base + index
+        return base + self.SEGMENT_RECORDS
+
+    def __readCursor(self):
+        try:
+            with open(os.path.join(self.path, "cursor")) as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def __writeCursor(self):
+        temp = os.path.join(self.path, "cursor.tmp")
+        with open(temp, "w") as file:
+            file.write(str(self.cursor))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, os.path.join(self.path, "cursor"))
+
+    def __dropOldest(self):
+        base = self.segments.pop(0)
+        mm = self.maps.pop(base, None)
+        if mm:
+            mm.close()
+        os.remove(self.__segmentPath(base))
+        end = base + self.SEGMENT_RECORDS
+        if self.cursor < end:
+            print(f"Sample store full, dropped {end - self.cursor} samples not uploaded")
+            self.cursor = end
+            self.__writeCursor()
+
+    def append(self, sample: Sample):
+        """
+        Write a sample to the end of the queue.
+
+        :param sample: Sample to store, its seq is set to the assigned sequence number
+        :return: Sequence number of the sample
+        """
+        with self.lock:
+            seq = self.head
+            base = seq - seq % self.SEGMENT_RECORDS
+            if not self.segments or self.segments[-1] != base:
+                self.segments.append(base)
+                while len(self.segments) > self.max_segments:
+                    self.__dropOldest()
+            mm = self.__map(base)
+            record = self.RECORD.pack(seq, sample.timestamp, sample.latitude, sample.longitude, sample.speed,
+                                      sample.alcoholValue, sample.alcoholDetected, sample.fuelLevel,
+                                      sample.keyState, sample.error, 0)
+            record = record[:-4] + struct.pack("<I", zlib.crc32(record[:-4]))
+            offset = (seq - base) * self.RECORD.size
+            mm[offset:offset + self.RECORD.size] = record
+            if self.sync:
+                mm.flush()
+            sample.seq = seq
+            self.head = seq + 1
+            return seq
+
+    def peek(self, count: int):
+        """
+        Read the oldest samples waiting for upload without removing them.
+
+        :param count: Maximum number of samples
+        :return: List of samples in sequence order
+        """
+        with self.lock:
+            samples = []
+            seq = self.cursor
+            while seq < self.head and len(samples) < count:
+                sample = self.__readRecord(seq)
+                if sample is not None:
+                    samples.append(sample)
+                seq += 1
+            return samples
+
+    def commit(self, seq: int):
+        """
+        Mark all samples up to and including seq as uploaded.
+
+        :param seq: Sequence number of the last uploaded sample
+        """
+        with self.lock:
+            cursor = min(seq + 1, self.head)
+            if cursor > self.cursor:
+                self.cursor = cursor
+                self.__writeCursor()
+
+    def close(self):
+        """
+        Flush and unmap all segments.
+        """
+        with self.lock:
+            for mm in self.maps.values():
+                mm.flush()
+                mm.close()
+            self.maps = {}
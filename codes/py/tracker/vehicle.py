@@ -0,0 +1,531 @@
+import json
+import queue
+import threading
+import time
+import traceback
+from SIMA7672S import SIMA7672S, MetricsExporter
+from .arduino import ArduinoLink
+from .batching import BatchBuilder
+from .compress import TrajectoryCompressor
+from .config import VehicleConfig
+from .geofence import Geofence
+from .live import LiveSync
+from .scheduler import SamplingScheduler, UploadPolicy
+from .startup import LastFix, Startup
+from .store import Sample, SampleStore
+
+class VehicleSession:
+    """
+    State and main loop of one tracked vehicle: its modem, its Arduino
+    Nano, the sample queue and the uploads to Firebase.
+
+    run() is a pipeline of four stages, each on its own thread: the
+    Arduino exchange every ARDUINO_PERIOD seconds, the acquisition of a
+    sample when the scheduler asks for one, the compression of the samples
+    into the on-disk queue and the uploads. The stages are decoupled by
+    bounded buffers that never block the producer: a queue of
+    SAMPLE_QUEUE samples (the oldest is dropped when it is full), the live
+    location (only the latest state is kept, see LiveSync) and the on-disk
+    queue, which keeps QUEUE_SEGMENTS segments. A slow or hanging cellular
+    link only delays the upload stage, and while the link monitor finds no
+    coverage or the HTTP breaker is open an upload pass returns at once.
+
+    The tunables below are class attributes and can be overridden per
+    session through keyword arguments, e.g. VehicleSession(...,
+    UPLOAD_DEPTH=10).
+
+    With shared_upload the session doesn't upload its Firestore backlog
+    itself, it only marks it as ready (uploadReady) for a Gateway that
+    batches the backlogs of all its vehicles.
+    """
+
+    NUMBER_OF_DAYS = 100
+    HTTP_IDLE_TIMEOUT = 30
+    QUEUE_SEGMENTS = 32
+    FIRESTORE_BATCH = 500
+    FIRESTORE_BATCH_BYTES = 16384
+    FIRESTORE_BATCH_WRITES = 20
+    TRACK_TOLERANCE = 15
+    TRACK_MAX_INTERVAL = 3600
+    MIN_SAMPLE_INTERVAL = 10
+    MAX_SAMPLE_INTERVAL = 300
+    SAMPLE_DISTANCE = 250
+    HEADING_CHANGE = 30
+    ARDUINO_TIMEOUT = 2
+    ARDUINO_PERIOD = 1
+    SAMPLE_QUEUE = 256
+    UPLOAD_POLL = 5
+    LINK_INTERVAL = 30
+    MIN_SIGNAL = 5
+    LIVE_DEADBAND = 25
+    LIVE_SPEED_DEADBAND = 5
+    LIVE_FUEL_DEADBAND = 2
+    LIVE_HEARTBEAT = 900
+    UPLOAD_DEPTH = 50
+    UPLOAD_AGE = 3600
+    METRICS_INTERVAL = 60
+    GNSS_STREAMING = False
+    NMEA_PORT = None
+    GEOFENCE_FILE = None
+    CONFIG_FILE = "config.json"
+    CONFIG_TTL = 86400
+    CONFIG_RETRY = 30
+    LAST_FIX_FILE = "state/lastfix.json"
+    RTDB_URL = "https://smart-vehicle-tracking-s-dbf99-default-rtdb.firebaseio.com/VehicleLocation/{vehicle_id}.json"
+
+    def __init__(self, vehicle_id: str, project_id: str, modem_port: str = "/dev/ttyS0",
+                 arduino_port: str = "/dev/ttyAMA3", modem_baudrate: int = 115200, arduino_baudrate: int = 57600,
+                 database_name: str = "(default)", collection_name: str = "vehicles", queue_path: str = "queue",
+                 metrics_file: str = None, shared_upload: bool = False, debug: bool = True, **settings):
+        """
+        Open the modem and the Arduino link and the vehicle's sample queue.
+
+        :param vehicle_id: Document ID of the vehicle in the collection
+        :param project_id: Firebase project ID
+        :param modem_port: Serial port of the SIMA7672S
+        :param arduino_port: Serial port of the Arduino Nano
+        :param queue_path: Directory of the sample queue
+        :param metrics_file: Export modem metrics to this file, None to disable
+        :param shared_upload: Leave the Firestore upload to a Gateway
+        :param debug: Echo the modem traffic
+        :param settings: Overrides for the class attribute tunables
+        """
+        for name, value in settings.items():
+            if not name.isupper() or not hasattr(type(self), name):
+                raise TypeError(f"Unknown setting {name}")
+            setattr(self, name, value)
+        self.vehicle_id = vehicle_id
+        self.project_id = project_id
+        self.debug = debug
+        self.shared_upload = shared_upload
+
+        documents = f"projects/{project_id}/databases/{database_name}/documents"
+        self.document_root = f"{documents}/{collection_name}/{vehicle_id}/tracking"
+        self.firestore_url = f"https://firestore.googleapis.com/v1/{documents}:commit"
+        self.rtdb_url = self.RTDB_URL.format(vehicle_id=vehicle_id)
+        # Only the settings map, the rest of the vehicle document isn't needed on the device
+        self.fingerprint_url = (f"https://firestore.googleapis.com/v1/{documents}/{collection_name}/{vehicle_id}"
+                                f"?mask.fieldPaths=VehicleDetails")
+        self.retention_url = f"https://firestore.googleapis.com/v1beta1/{self.document_root}/{{date}}"
+
+        self.initializedSystem = 0
+        self.validFingerprintID = 0
+        self.ignitionState = 1 #1 is OFF and 0 is ON
+        self.alcoholValue = 0
+        self.alcoholDetected = 0
+        self.validFingerprintFound = 0
+        self.fingerprintVerified = 0
+        self.fuelLevel = 0
+        self.keyState = 0
+        self.error = 0
+
+        self.sim = SIMA7672S(modem_port, modem_baudrate)
+        self.arduino = ArduinoLink(arduino_port, arduino_baudrate)
+        self.metricsExporter = None
+        if metrics_file:
+            self.metricsExporter = MetricsExporter(self.sim.metrics, metrics_file, self.METRICS_INTERVAL)
+            self.metricsExporter.start()
+        self.scheduler = SamplingScheduler(self.MIN_SAMPLE_INTERVAL, self.MAX_SAMPLE_INTERVAL,
+                                           self.SAMPLE_DISTANCE, self.HEADING_CHANGE)
+        self.uploadPolicy = UploadPolicy(self.UPLOAD_DEPTH, self.UPLOAD_AGE)
+        self.uploadReady = False
+        self.retentionDate = None
+        self.store = SampleStore(queue_path, max_segments=self.QUEUE_SEGMENTS)
+        self.batcher = BatchBuilder(self.document_root, self.FIRESTORE_BATCH_BYTES, self.FIRESTORE_BATCH_WRITES)
+        self.compressor = TrajectoryCompressor(self.TRACK_TOLERANCE, self.TRACK_MAX_INTERVAL)
+        self.compressorLock = threading.Lock()
+        self.live = LiveSync(self.LIVE_DEADBAND, {"speed": self.LIVE_SPEED_DEADBAND, "fuelLevel": self.LIVE_FUEL_DEADBAND},
+                             self.LIVE_HEARTBEAT)
+        self.samples = queue.Queue(self.SAMPLE_QUEUE)
+        self.dropped = 0
+        self.uploadWake = threading.Event()
+        self.halt = threading.Event()
+        self.failure = None
+        self.config = VehicleConfig(self.CONFIG_FILE, self.CONFIG_TTL)
+        self.configAttempt = None
+        self.stopped = threading.Event()
+        self.arduino.subscribe(self.onArduinoStatus)
+        self.geofence = Geofence.load(self.GEOFENCE_FILE) if self.GEOFENCE_FILE else None
+        self.lastFix = LastFix(self.LAST_FIX_FILE)
+        self.fingerprintFound = threading.Event()
+        self.sim.GNSS.onFix = self.onFix
+
+    def __repr__(self):
+        return f"VehicleSession({self.vehicle_id})"
+
+    def readArduino(self):
+        status = self.arduino.request(self.initializedSystem, self.validFingerprintID, self.ignitionState,
+                                      timeout=self.ARDUINO_TIMEOUT)
+        if status is None:
+            print(f"{self.vehicle_id}: No status from Arduino, keeping the last values")
+            return False
+
+        self.alcoholValue = status.alcoholValue
+        self.alcoholDetected = status.alcoholDetected
+        self.ignitionState = status.ignitionState
+        self.validFingerprintFound = status.validFingerprintFound
+        self.fingerprintVerified = status.fingerprintVerified
+        self.fuelLevel = status.fuelLevel
+        self.keyState = status.keyState
+        self.error = status.error
+        return True
+
+    def onArduinoStatus(self, status, previous):
+        # Called from the link's reader thread for every status, streamed ones included
+        for event in status.events(previous):
+            self.scheduler.notify(event)
+        if status.validFingerprintFound:
+            self.fingerprintFound.set()
+
+    def onFix(self, fix):
+        # Called for every new fix, from the NMEA reader thread while streaming
+        self.lastFix.update(fix)
+        if not self.geofence:
+            return
+        latitude, longitude = self.sim.GNSS.getFormattedLatLon(fix)
+        for event, zone in self.geofence.update(latitude, longitude):
+            print(f"{self.vehicle_id}: Geofence {event} {zone.name} ({zone.kind})")
+            self.uploadPolicy.request()
+            self.scheduler.notify(f"{event} {zone.name}")
+
+    def updateDATA(self, debug=False):
+        fix = self.sim.GNSS.getFix(debug=debug)
+        LatLog = self.sim.GNSS.getFormattedLatLon(fix)
+        speed = fix.speed if fix else 0.0
+        now = time.time()
+        time_stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.localtime(now))
+
+        # The Arduino values are kept current by the Arduino stage
+        sample = Sample(now, LatLog[0], LatLog[1], speed, self.alcoholValue, self.alcoholDetected,
+                        self.fuelLevel, self.keyState, self.error)
+        self.enqueue(sample)
+        print(sample, end="\n\n")
+
+        data = {
+            "timestamp":time_stamp,
+            "latitude":LatLog[0],
+            "longitude":LatLog[1],
+            "speed": speed,
+            "fuelLevel":self.fuelLevel,
+            "keyState": self.keyState
+            }
+        if self.geofence:
+            data["zones"] = self.geofence.names()
+        # Changes below the deadbands don't wake the upload stage
+        if self.live.update(data):
+            self.uploadWake.set()
+        return fix
+
+    def enqueue(self, sample: Sample):
+        """
+        Hand a sample to the compression stage without blocking, the oldest
+        waiting sample is dropped if the queue is full.
+        """
+        while True:
+            try:
+                self.samples.put_nowait(sample)
+                return
+            except queue.Full:
+                try:
+                    self.samples.get_nowait()
+                    self.dropped += 1
+                    print(f"{self.vehicle_id}: Sample queue full, dropped the oldest sample ({self.dropped} so far)")
+                except queue.Empty:
+                    pass
+
+    def flushTrack(self):
+        """
+        Move the point held back by the compressor into the queue.
+        """
+        with self.compressorLock:
+            for kept in self.compressor.flush():
+                self.store.append(kept)
+            print(f"{self.vehicle_id}: Track compression: {self.compressor.received} samples, "
+                  f"{self.compressor.kept} kept, ratio {self.compressor.ratio():.2f}")
+
+    def uploadFirestore(self, session):
+        self.flushTrack()
+        # Send the backlog batch by batch, a failed batch stops the upload and is the only one retried next time
+        for batch in self.batcher.batches(self.store.peek(self.FIRESTORE_BATCH)):
+            httpResponse = session.SendRequest(self.firestore_url, self.sim.HTTP.HTTPRequest.POST, batch.body)
+            if httpResponse and httpResponse[1] == 200:
+                self.store.commit(batch.lastSeq)
+                self.batcher.record(batch)
+                print(f"Firestore batch: {len(batch)} samples, {len(batch.body)} bytes, {batch.bytesPerSample:.1f} bytes/sample "
+                      f"({self.batcher.bytesPerSample():.1f} average)")
+                print(session.ReadResponse(httpResponse[2]))
+            else:
+                if httpResponse:
+                    print("Failed sending data to firestore")
+                    print(session.ReadResponse(httpResponse[2]))
+                return False
+        return True
+
+    def fetchConfig(self, session):
+        """
+        Fetch the vehicle document and update the cached configuration.
+
+        :return: True if the configuration was fetched
+        """
+        httpResponse = session.SendRequest(self.fingerprint_url)
+        if not httpResponse or httpResponse[1] != 200:
+            if httpResponse:
+                print("Failed fetching the vehicle configuration")
+                print(session.ReadResponse(httpResponse[2]))
+            return False
+        try:
+            changed = self.config.update(json.load(session.OpenResponse(httpResponse[2])))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Invalid vehicle configuration: {e}")
+            return False
+        print(f"{self.vehicle_id}: Vehicle configuration {'updated' if changed else 'unchanged'}")
+        if "assignedTo" in self.config:
+            self.validFingerprintID = int(self.config.get("assignedTo"))
+        return True
+
+    def refreshConfig(self):
+        """
+        Fetch the vehicle configuration during boot, at most every CONFIG_RETRY seconds.
+
+        :return: True if the configuration changed
+        """
+        if not self.__configRetryDue():
+            return False
+        self.configAttempt = time.monotonic()
+        before = (dict(self.config.fields), self.config.updateTime)
+        with self.sim.HTTP.Session(idle_timeout=self.HTTP_IDLE_TIMEOUT, debug=self.debug) as session:
+            self.fetchConfig(session)
+        return (self.config.fields, self.config.updateTime) != before
+
+    def __configRetryDue(self):
+        # At most one fetch every CONFIG_RETRY seconds, also when the last one failed
+        return self.configAttempt is None or time.monotonic() - self.configAttempt >= self.CONFIG_RETRY
+
+    def validateFingerprintSensor(self):
+        # A fresh cached configuration is used without the network, an expired one is fetched
+        # again first and kept if that fails
+        try:
+            if ("assignedTo" not in self.config or "FingerprintSensorAddress" not in self.config
+                    or not self.config.fresh()):
+                self.refreshConfig()
+
+            if "assignedTo" in self.config and "FingerprintSensorAddress" in self.config:
+                self.validFingerprintID = int(self.config.get("assignedTo"))
+
+                print("validateFingerprintSensor")
+                address = self.arduino.request(self.initializedSystem, self.validFingerprintID, self.ignitionState,
+                                               self.arduino.ADDRESS, self.ARDUINO_TIMEOUT)
+                print("receiverd" if address is not None else "No sensor address from Arduino")
+                if address == int(self.config.get("FingerprintSensorAddress")):
+                    print("verified")
+                    self.initializedSystem = 1
+                    self.ignitionState = 0
+                    self.arduino.request(self.initializedSystem, self.validFingerprintID, self.ignitionState,
+                                         self.arduino.ADDRESS, self.ARDUINO_TIMEOUT)
+            else :
+                self.initializedSystem = 0
+                self.arduino.request(self.initializedSystem, self.validFingerprintID, self.ignitionState,
+                                     self.arduino.ADDRESS, self.ARDUINO_TIMEOUT)
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+    def verifyFingerprint(self):
+        print("verifyFingerprint")
+        status = self.arduino.request(self.initializedSystem, self.validFingerprintID, self.ignitionState,
+                                      timeout=self.ARDUINO_TIMEOUT)
+        print(status)
+        if status is None:
+            return False
+        self.validFingerprintFound = status.validFingerprintFound
+        self.fingerprintVerified = status.fingerprintVerified
+        if self.validFingerprintFound == 1:
+            return True
+        else:
+            return False
+
+    def start(self):
+        """
+        Power up GNSS, validate the fingerprint sensor and wait for the driver's fingerprint.
+
+        The steps run concurrently, see Startup.
+
+        :return: False if stop() was called while waiting
+        """
+        return Startup(self).run()
+
+    def upload(self):
+        """
+        Do the uploads that are due: the changes of the live location, the
+        configuration refresh, the Firestore backlog and the retention delete.
+
+        :return: True if anything was due
+        """
+        live = self.live.delta()
+        oldest = self.store.peek(1)
+        due = self.uploadPolicy.due(len(self.store), oldest[0].timestamp if oldest else None)
+        today = time.strftime("%d-%m-%Y", time.localtime(time.time()))
+        if due and self.shared_upload:
+            # Any modem of the Gateway can take it, also while this one has no link
+            self.flushTrack()
+            self.uploadReady = True
+            due = False
+        # A failed fetch (HTTP error or an invalid document) leaves the configuration stale, it is retried
+        # every CONFIG_RETRY seconds
+        refetch = not self.config.fresh() and self.__configRetryDue()
+        if not live and not due and not refetch and self.retentionDate == today:
+            return False
+        if not self.sim.HTTP.Available():
+            # No link or backing off, everything due stays queued for a later pass
+            return True
+
+        self.sim.metrics.startCycle()
+        # The HTTP lock keeps the Gateway's shared upload off this modem until the pass is done
+        with self.sim.HTTP.lock, self.sim.HTTP.Session(idle_timeout=self.HTTP_IDLE_TIMEOUT, debug=self.debug) as session:
+            if live:
+                fields, full = live
+                # The modem can't send PATCH, the Realtime Database takes it as a method override
+                if full:
+                    httpResponse = session.SendRequest(self.rtdb_url, self.sim.HTTP.HTTPRequest.PUT, json.dumps(fields))
+                else:
+                    httpResponse = session.SendRequest(f"{self.rtdb_url}?x-http-method-override=PATCH",
+                                                       self.sim.HTTP.HTTPRequest.POST, json.dumps(fields))
+                if httpResponse and httpResponse[1] == 200:
+                    self.live.acknowledge(fields)
+                    print(session.ReadResponse(httpResponse[2]))
+                elif httpResponse:
+                    print("Failed sending data to Firebase")
+                    print(session.ReadResponse(httpResponse[2]))
+
+            if refetch:
+                # Changes reach the Arduino with the next status request
+                self.configAttempt = time.monotonic()
+                self.fetchConfig(session)
+
+            if due and self.uploadFirestore(session):
+                self.uploadPolicy.uploaded()
+
+            if self.retentionDate != today:
+                DATE = time.strftime("%d-%m-%Y", time.localtime(time.time() - 86400*self.NUMBER_OF_DAYS))
+
+                httpResponse = session.SendRequest(self.retention_url.format(date=DATE), self.sim.HTTP.HTTPRequest.DELETE)
+                if httpResponse and httpResponse[1] == 200:
+                    self.retentionDate = today
+                    print(session.ReadResponse(httpResponse[2]))
+                elif httpResponse:
+                    print("Failed sending data to firestore")
+                    print(session.ReadResponse(httpResponse[2]))
+
+        self.sim.metrics.endCycle()
+        return True
+
+    def wait(self, interval: float):
+        """
+        Sleep until the next sample is due, an Arduino event arrives or the pipeline stops.
+        """
+        events = self.scheduler.wait(interval)
+        if events and not self.halt.is_set():
+            print(f"{self.vehicle_id}: Sampling early on {', '.join(events)}")
+            self.uploadPolicy.request()
+            self.uploadWake.set()
+
+    def arduinoLoop(self):
+        # Ignition and alcohol state go to the Nano at a fixed rate, whatever the modem is doing
+        while not self.halt.is_set():
+            self.readArduino()
+            self.halt.wait(self.ARDUINO_PERIOD)
+
+    def acquireLoop(self):
+        while not self.halt.is_set():
+            fix = self.updateDATA(debug=self.debug)
+            if self.halt.is_set():
+                break
+            self.wait(self.scheduler.nextInterval(fix.speed, fix.course) if fix else self.MAX_SAMPLE_INTERVAL)
+
+    def encodeLoop(self):
+        # Ends with the None put behind the last sample by run()
+        while (sample := self.samples.get()) is not None:
+            with self.compressorLock:
+                for kept in self.compressor.push(sample):
+                    self.store.append(kept)
+
+    def uploadLoop(self):
+        while not self.halt.is_set():
+            self.uploadWake.wait(self.UPLOAD_POLL)
+            self.uploadWake.clear()
+            if self.halt.is_set():
+                break
+            try:
+                self.upload()
+            except Exception as e:
+                # The link is retried on the next pass, sampling goes on meanwhile
+                print(f"{self.vehicle_id}: Upload failed: {e}")
+                traceback.print_exc()
+
+    def __stage(self, target):
+        try:
+            target()
+        except BaseException as e:
+            if self.failure is None:
+                self.failure = e
+            self.__halt()
+
+    def __halt(self):
+        self.halt.set()
+        self.scheduler.notify("halt")
+        self.uploadWake.set()
+
+    def run(self):
+        """
+        Run the pipeline until stop() is called or a stage fails.
+
+        The upload in progress is finished first and the sample held back
+        by the compressor is stored. The exception of a failed stage is
+        raised again.
+        """
+        if self.stopped.is_set():
+            return
+        self.halt.clear()
+        self.failure = None
+        self.sim.HTTP.StartMonitor(self.LINK_INTERVAL, self.MIN_SIGNAL, self.debug)
+        threads = {name: threading.Thread(target=self.__stage, args=(target,), name=f"{self.vehicle_id}-{name}", daemon=True)
+                   for name, target in (("arduino", self.arduinoLoop), ("acquire", self.acquireLoop),
+                                        ("encode", self.encodeLoop), ("upload", self.uploadLoop))}
+        for thread in threads.values():
+            thread.start()
+        try:
+            self.halt.wait()
+        finally:
+            self.__halt()
+            threads["arduino"].join()
+            threads["acquire"].join()
+            # Everything sampled so far reaches the on-disk queue
+            if threads["encode"].is_alive():
+                self.samples.put(None)
+            threads["encode"].join()
+            threads["upload"].join()
+            # The point held back by the compressor, for a parked vehicle where it stands
+            self.flushTrack()
+        if self.failure:
+            raise self.failure
+
+    def stop(self):
+        """
+        Make run() and start() return, the upload in progress is finished first.
+        """
+        self.stopped.set()
+        self.__halt()
+
+    def close(self):
+        """
+        End the HTTP service, power down GNSS and release the ports and the queue.
+        """
+        self.sim.HTTP.StopMonitor()
+        self.sim.HTTP.terminateHTTP(debug=self.debug)
+        self.sim.GNSS.Shutdown(debug=self.debug)
+        self.lastFix.save()
+        self.sim.Close()
+        self.arduino.close()
+        self.store.close()
+        if self.metricsExporter:
+            self.metricsExporter.stop()